@@ -1,2 +1,4 @@
 from .alpacaLimitTrader import alpacaLimitTrader
 from .alpacaMarketTrader import alpacaMarketTrader
+from .broker import brokerAPI
+from .simulated_broker import simulatedBroker
@@ -1,7 +1,10 @@
-from typing import Dict, List, Union
-import pandas as pd
-from .order import Order
+from typing import Dict, List, Optional, Union, TYPE_CHECKING
+from .order import Order, OrderBatch
 from .alpacaTrader import alpacaTrader
+from .planner import plan_orders
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class alpacaMarketTrader(alpacaTrader):
@@ -15,75 +18,56 @@ class alpacaMarketTrader(alpacaTrader):
         Returns:
             bool: Returns True if all appropriate positions were taken.
         """
-        self._add_current_positions(portfolio_dict)
-        df = self._get_position_equity_df(portfolio_dict)
-        orders = self._determine_orders(df)
-        order_results = self._submit_orders(orders)
-        ticker_results = {
-            ticker: result for ticker, result 
-            in zip(df['ticker'], order_results)
-        }
+        snapshot = self._start_rebalance()
+        self._add_current_positions(portfolio_dict, snapshot)
+        closed, snapshot = self._liquidate(portfolio_dict, snapshot)
+        df = self._get_position_equity_df(portfolio_dict, snapshot)
+        ticker_results = {ticker: True for ticker in df['ticker']}
+        ticker_results.update(closed)
+        df = self._select_rebalance_rows(df, snapshot)
+        if self.validator.asset_cache is not None:
+            df = self._validate_rows(df, ticker_results, notional=True)
+
+        orders = self._determine_orders(df, snapshot.account_equity)
+        order_results = self._submit_orders(orders, self._pipeline_cash(snapshot))
+        ticker_results.update(zip(orders.ticker, order_results))
+        self._save_rebalance_state(portfolio_dict, snapshot, df, ticker_results)
+        self._finish_rebalance(portfolio_dict)
         return ticker_results
 
-    def _determine_orders(self, df: pd.DataFrame) -> List[Union[Order, None]]:
-        """For a given DataFrame, get a list of notional market orders 
+    def _determine_orders(self, df: 'pd.DataFrame', account_equity: float) -> OrderBatch:
+        """For a given DataFrame, get the batch of notional market orders 
         to be submitted so that afterwards, the portfolio is in the desired state.
 
         Args:
             df (pd.DataFrame): position equity df
+            account_equity (float): account equity the df was computed with
 
         Returns:
-            List[order]: List of independently executed orders to be submitted.
-        """
-        orders = [
-            self.get_order(
-                row['ticker'],
-                row['current_position_equity'],
-                row['desired_position_equity']
-            )
-            for _, row in df.iterrows()
-        ]
-        return orders
-
-    def get_order(self, ticker, cur_equity: float, des_equity: float) -> Union[Order, None]:
-        """Get the order object necessary to achieve the corresponding position
-        such that <portfolio_pct> of the account is <ticker> shares.
-
-        This can mean either buying or selling of the security.
-
-        Args:
-            ticker (_type_): _description_
-            cur_equity (float): _description_
-            des_equity (float): _description_
-
-        Returns:
-            Union[Order, None]: Returns an order if there is a valid order to place.
-            None otherwise.
+            OrderBatch: independently executed orders to be submitted, in df order,
+            with the quote each was planned at.
         """
-        if des_equity < cur_equity:
-            order_equity = float(cur_equity - des_equity)
-            close_position = des_equity == 0
-            order = Order(ticker, 'sell', equity=order_equity, close_position=close_position)
-        elif des_equity > cur_equity:
-            order_equity = float(des_equity - cur_equity)
-            order = Order(ticker, 'buy', equity=order_equity)
-        else:
-            order = None
-        return order
+        return plan_orders(
+            df['ticker'].to_numpy(),
+            df['current_position_equity'].to_numpy(),
+            df['portfolio_pct'].to_numpy(),
+            account_equity,
+            planned_prices=self._planning_prices(df['ticker'])
+        )
 
-    def _submit_orders(self, orders: List[Union[Order, None]]) -> List[bool]:
-        """Submit a list of orders using an input list of order objects.
+    def _submit_orders(self, orders: Union[OrderBatch, List[Union[Order, None]]],
+                       cash: Optional[float] = None) -> List[bool]:
+        """Submit a batch or list of orders.
         (closes position if so dictated)
 
         Args:
-            orders (List[order]): list of order objects that indicate
+            orders (Union[OrderBatch, List[Order]]): orders that indicate
             whether to buy/sell a stock and how much (only used notional orders)
+            cash (float, optional): cash before the sells, to pipeline the buys
+            against. Defaults to None (buys after every sell).
 
         Returns:
             List[bool]: returns true if the order was accepted
         """
-        order_results = [
-            self.order_filler.fill_order(order) if order is not None else True
-            for order in orders
-        ]
+        order_results = self._fill_orders(orders, cash)
         return order_results
@@ -1,19 +1,192 @@
 
-from alpaca_trade_api.rest import REST
 from abc import ABC, abstractmethod
-from typing import Dict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union, TYPE_CHECKING
+from .analytics import FillRecord, analyze_fills, rebalanceLog
+from .broker import brokerAPI, get_shared_api
+from .instrumentation import instrument, nullSink
+from .journal import nullJournal
+from .order import Order, OrderBatch
 from .order_filling import orderFiller
-import pandas as pd
+from .order_updates import FINAL_STATUSES, orderStatusTracker
+from .quotes import quoteCache
+from .rate_limit import rateLimitedAPI
+from .rebalance_state import rebalanceState
+from .schedule import MarketClosedError, marketCalendar
+from .slicing import sliceScheduler
+from .snapshot import PortfolioSnapshot
+from .validation import Rejection, assetCache, preTradeValidator
+import logging
+import math
+import time
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+logger = logging.getLogger(__name__)
 
 
 class alpacaTrader(ABC):
 
-    def __init__(self):
-        self.api = REST()
-        self.order_filler = orderFiller(self.api)
+    def __init__(self, max_workers: int = 1, trade_update_stream: Any = None,
+                 api: Optional[brokerAPI] = None, sink: Any = None,
+                 rebalance_state: Optional[rebalanceState] = None,
+                 requests_per_minute: Optional[float] = None,
+                 rebalance_log: Optional[rebalanceLog] = None,
+                 journal: Any = None,
+                 pipeline: bool = False,
+                 asset_cache_path: Optional[str] = None,
+                 calendar: Optional[marketCalendar] = None,
+                 warm_snapshot_ttl: float = 120.0,
+                 slicer: Any = None,
+                 slice_tick: float = 1.0,
+                 bulk_liquidation: bool = True,
+                 liquidation_workers: int = 8,
+                 cancel_all_open_orders: bool = False,
+                 max_quote_age: Optional[float] = 60 * 60):
+        """Set up the trader. No broker call is made until the account or
+        positions are first needed.
+
+        Args:
+            max_workers (int, optional): max orders filled concurrently within
+            a phase (sells, then buys). Defaults to 1, filling orders one at a time.
+            trade_update_stream (Any, optional): trade_updates stream used to detect
+            fills as they happen (alpaca_trade_api.stream.Stream). Defaults to None,
+            in which case order statuses are polled.
+            api (brokerAPI, optional): broker backend, e.g. a simulatedBroker.
+            Defaults to the alpaca REST api shared by all traders.
+            sink (Any, optional): instrumentation sink recording broker call latencies,
+            time to fill and reprice steps (histogramSink, jsonLinesSink).
+            Defaults to nullSink, which records nothing.
+            rebalance_state (rebalanceState, optional): persisted state of the last
+            rebalance. If given, only tickers whose target changed or whose position
+            drifted past the state's tolerance are rebalanced. Defaults to None.
+            requests_per_minute (float, optional): broker request budget. If given,
+            calls are scheduled through a rateLimitedAPI. Defaults to None.
+            rebalance_log (rebalanceLog, optional): log the targets, post-trade
+            snapshot and fill records of every rebalance are appended to, for
+            batch analytics. Defaults to None.
+            journal (Any, optional): executionJournal the order events are written
+            to. A rebalance interrupted part way is resumed from it by the next
+            have_portfolio. Defaults to None (no journal).
+            pipeline (bool, optional): release each buy as soon as the cash plus
+            the proceeds of the sells filled so far covers it, instead of after
+            every sell (see orderFiller.fill_orders_pipelined). Only used when
+            max_workers > 1. Defaults to False.
+            asset_cache_path (str, optional): json file asset metadata is cached in,
+            refreshed daily. If given, tickers are also validated as tradable,
+            fractionable for notional orders and shortable for shorts before
+            planning. Defaults to None.
+            calendar (marketCalendar, optional): cached market calendar. If given,
+            have_portfolio raises MarketClosedError outside a market session,
+            without a broker call. Defaults to None (no check).
+            warm_snapshot_ttl (float, optional): seconds the snapshot loaded by
+            warm_up is used for the next rebalance. Defaults to 120.
+            slicer (Any, optional): twapSlicer or participationSlicer. If given,
+            orders are filled as sliced child orders by a sliceScheduler, instead
+            of one order per ticker. Defaults to None.
+            slice_tick (float, optional): seconds per tick of the sliceScheduler.
+            Defaults to 1.
+            bulk_liquidation (bool, optional): start each rebalance by cancelling the
+            open orders of its tickers and closing every position with a 0 target
+            together, before any other order (see orderFiller.liquidate). Defaults
+            to True. If False, open orders are left alone and the closes are filled
+            with the sells.
+            liquidation_workers (int, optional): max positions closed or orders
+            cancelled at once. Defaults to 8.
+            cancel_all_open_orders (bool, optional): have the liquidation cancel every
+            open order of the account, with one cancel_all_orders call, instead of
+            only those of the rebalance's tickers. Defaults to False.
+            max_quote_age (float, optional): seconds since a ticker's latest quote
+            past which validation rejects it as stale (see preTradeValidator).
+            Defaults to an hour.
+        """
+        self.sink = sink if sink is not None else nullSink()
+        self.api = instrument(api if api is not None else get_shared_api(), self.sink)
+        if requests_per_minute is not None:
+            self.api = rateLimitedAPI(
+                self.api, requests_per_minute, sink=self.sink)
+        self.status_tracker = orderStatusTracker(self.api, trade_update_stream)
+        self.status_tracker.start()
+        self.quote_cache = quoteCache(self.api)
+        self.validator = preTradeValidator(
+            self.quote_cache,
+            assetCache(self.api, asset_cache_path) if asset_cache_path is not None else None,
+            max_quote_age)
+        self.rejections: List[Rejection] = []
+        self.journal = journal if journal is not None else nullJournal()
+        self.order_filler = orderFiller(
+            self.api, self.status_tracker, self.quote_cache, self.sink, self.journal)
+        self.max_workers = max_workers
+        self.rebalance_state = rebalance_state
+        self.rebalance_log = rebalance_log
+        self.pipeline = pipeline
+        self.fill_records: List[FillRecord] = []
+        self.calendar = calendar
+        self.warm_snapshot_ttl = warm_snapshot_ttl
+        self.slicer = slicer
+        self.slice_tick = slice_tick
+        self.bulk_liquidation = bulk_liquidation
+        self.liquidation_workers = liquidation_workers
+        self.cancel_all_open_orders = cancel_all_open_orders
+        self.current_phase = 'plan'
+        self._account: Any = None
+        self._warm_snapshot: Optional[PortfolioSnapshot] = None
+        self._warm_snapshot_at = 0.0
+
+    @contextmanager
+    def phase(self, name: str):
+        """Mark a phase of the rebalance, 'liquidate' or 'fill', in current_phase
+        ('plan' outside of them), and record its duration as 'rebalance.phase_time'.
+        """
+        self.current_phase = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.current_phase = 'plan'
+            self.sink.record('rebalance.phase_time', time.perf_counter() - start, phase=name)
+
+    @property
+    def account(self) -> Any:
+        """The account, fetched on first use. See refresh_account."""
+        if self._account is None:
+            self.refresh_account()
+        return self._account
+
+    def refresh_account(self) -> Any:
+        """Fetch the account from the api.
+
+        Returns:
+            Any: the account entity.
+        """
+        self._account = self.api.get_account()
+        logger.info("account status: %s", self._account.status)
+        return self._account
+
+    def warm_up(self, tickers: Optional[Iterable[str]] = None):
+        """Do the broker calls of a rebalance that do not depend on its targets
+        ahead of it: load the account snapshot (used by the next rebalance if
+        within warm_snapshot_ttl), the asset metadata and the quotes of <tickers>.
+        This also opens the api's connections and imports pandas, so the first
+        order of the rebalance goes out without a connection setup or an import.
 
-        account = self.api.get_account()
-        print(account.status)
+        Args:
+            tickers (Iterable[str], optional): tickers the rebalance will trade.
+            Defaults to None (no quotes are prefetched).
+        """
+        import pandas  # noqa: F401
+
+        start = time.time()
+        self._warm_snapshot = PortfolioSnapshot.from_entities(
+            self.api.list_positions(), self.refresh_account())
+        self._warm_snapshot_at = time.time()
+        if self.validator.asset_cache is not None:
+            self.validator.asset_cache.get_assets()
+        if tickers is not None:
+            self.quote_cache.prefetch(tickers)
+        logger.info("warmed up in %.3fs", time.time() - start)
 
     @abstractmethod
     def have_portfolio(self, portfolio_dict: Dict[str, float]) -> Dict[str, bool]:
@@ -25,30 +198,216 @@ class alpacaTrader(ABC):
         Returns:
             bool: Returns True if all orders were successfuly submitted
             (should probably change this to if portfolio state reflects input.)
+
+        Raises:
+            MarketClosedError: if a calendar is set and the market is not in
+            session. No order is submitted.
         """
-        # add a check to make sure this is called during market hours
         pass
 
-    def _add_current_positions(self, portfolio_dict: dict):
+    def _load_snapshot(self) -> PortfolioSnapshot:
+        """Load the account and positions once for the current rebalance.
+        (the snapshot of a warm_up is used while fresh, then the saved account
+        equity of the rebalance state with the current positions)
+
+        Returns:
+            PortfolioSnapshot: account equity and current position equities.
+        """
+        warm_snapshot, self._warm_snapshot = self._warm_snapshot, None
+        if warm_snapshot is not None and \
+                time.time() - self._warm_snapshot_at <= self.warm_snapshot_ttl:
+            return warm_snapshot
+        if self.rebalance_state is None:
+            return PortfolioSnapshot.load(self.api)
+        positions = self.api.list_positions()
+        snapshot = self.rebalance_state.cached_snapshot(positions)
+        if snapshot is not None:
+            return snapshot
+        return PortfolioSnapshot.from_entities(positions, self.refresh_account())
+
+    def _start_rebalance(self) -> PortfolioSnapshot:
+        """Check the market is open, settle the orders of an interrupted rebalance,
+        if the journal has one, mark the start of this rebalance, and load its snapshot.
+
+        Raises:
+            MarketClosedError: if a calendar is set and the market is not in session.
+
+        Returns:
+            PortfolioSnapshot: account equity and current position equities,
+            loaded from the api after resuming.
+        """
+        if self.calendar is not None and not self.calendar.is_open():
+            raise MarketClosedError("market is closed, not rebalancing")
+        resuming = self.journal.interrupted()
+        if resuming:
+            self.order_filler.resume(self.journal.in_flight())
+        self.journal.begin()
+        return PortfolioSnapshot.load(self.api) if resuming else self._load_snapshot()
+
+    def _liquidate(self, portfolio_dict: Dict[str, float],
+                   snapshot: PortfolioSnapshot) -> Tuple[Dict[str, bool], PortfolioSnapshot]:
+        """Cancel the open orders of the rebalance's tickers and close every position
+        with a 0 target, using close_all_positions when every position is closing.
+        The closes are confirmed with one refresh of the positions and account.
+
+        Args:
+            portfolio_dict (Dict[str, float]): ticker to equity %, with the current
+            positions added (see _add_current_positions). Tickers whose close is
+            still working are removed from it.
+            snapshot (PortfolioSnapshot): snapshot of the rebalance
+
+        Returns:
+            Tuple[Dict[str, bool], PortfolioSnapshot]: ticker to True if its position
+            is closed, and the snapshot after the closes (the given one if nothing
+            was closed). Positions whose close failed are left to the sells. Those
+            whose close is still working are not, as a sell could oversell them.
+        """
+        if not self.bulk_liquidation:
+            return {}, snapshot
+        with self.phase('liquidate'):
+            closing = [ticker for ticker in snapshot.tickers if not portfolio_dict.get(ticker)]
+            close_all = bool(closing) and len(closing) == len(snapshot.position_equity)
+            statuses = self.order_filler.liquidate(
+                closing, close_all, self.liquidation_workers,
+                cancel_tickers=None if self.cancel_all_open_orders else list(portfolio_dict))
+            if not closing:
+                return {}, snapshot
+
+            working = [ticker for ticker, status in statuses.items()
+                       if status is not None and status not in FINAL_STATUSES]
+            for ticker in working:
+                del portfolio_dict[ticker]
+            snapshot = PortfolioSnapshot.from_entities(
+                self.api.list_positions(), self.refresh_account())
+            return {ticker: ticker not in working and ticker not in snapshot.position_equity
+                    for ticker in closing}, snapshot
+
+    def _pipeline_cash(self, snapshot: PortfolioSnapshot) -> Optional[float]:
+        """Get the cash the buys can be pipelined against, None if not pipelining."""
+        return snapshot.cash if self.pipeline else None
+
+    def _fill_orders(self, orders: Union[OrderBatch, List[Union[Order, None]]],
+                     cash: Optional[float] = None) -> List[bool]:
+        """Fill the orders of a rebalance, sliced if a slicer is set.
+
+        Args:
+            orders (Union[OrderBatch, List[Union[Order, None]]]): orders to fill
+            cash (float, optional): cash before the sells, to pipeline the buys
+            against. Defaults to None (buys after every sell). Not used when slicing.
+
+        Returns:
+            List[bool]: True for each order that was filled (or None).
+        """
+        with self.phase('fill'):
+            if self.slicer is not None:
+                scheduler = sliceScheduler(self.order_filler, self.slicer, self.slice_tick)
+                return scheduler.fill_orders(orders)
+            return self.order_filler.fill_orders(orders, self.max_workers, cash)
+
+    def _planning_prices(self, tickers: Iterable[str]) -> List[float]:
+        """Get the quote of each ticker to plan at, loading the ones not cached
+        with one snapshot request. nan for tickers without a quote.
+        """
+        tickers = list(tickers)
+        missing = [ticker for ticker in tickers if self.quote_cache.peek(ticker) is None]
+        if missing:
+            self.quote_cache.prefetch(missing)
+        prices = [self.quote_cache.peek(ticker) for ticker in tickers]
+        return [math.nan if price is None else price for price in prices]
+
+    def _select_rebalance_rows(self, df: 'pd.DataFrame',
+                               snapshot: PortfolioSnapshot) -> 'pd.DataFrame':
+        """Get the rows of the position equity df to rebalance. All of them,
+        unless incremental rebalancing is on.
+        """
+        if self.rebalance_state is None:
+            return df
+        return self.rebalance_state.select(df, snapshot.account_equity)
+
+    def _validate_rows(self, df: 'pd.DataFrame', ticker_results: Dict[str, bool],
+                       notional: bool) -> 'pd.DataFrame':
+        """Validate the tickers of the rows to rebalance at once. Rejected tickers
+        are kept in self.rejections, set to False in ticker_results and dropped.
+
+        Args:
+            df (pd.DataFrame): rows of the position equity df to rebalance
+            ticker_results (Dict[str, bool]): results of the rebalance, updated in place
+            notional (bool): whether the orders are notional (except closes)
+
+        Returns:
+            pd.DataFrame: the rows of the tickers that passed.
+        """
+        is_close = df['desired_position_equity'] == 0
+        self.rejections = self.validator.validate(
+            df['ticker'],
+            notional=(~is_close).to_numpy() if notional else None,
+            short=(df['portfolio_pct'] < 0).to_numpy())
+        if not self.rejections:
+            return df
+
+        logger.warning("rejected tickers: %s", self.rejections)
+        rejected = [rejection.ticker for rejection in self.rejections]
+        ticker_results.update(dict.fromkeys(rejected, False))
+        return df[~df['ticker'].isin(rejected)]
+
+    def _save_rebalance_state(self, portfolio_dict: Dict[str, float],
+                              snapshot: PortfolioSnapshot, df: 'pd.DataFrame',
+                              ticker_results: Dict[str, bool]):
+        if self.rebalance_state is not None:
+            self.rebalance_state.save(portfolio_dict, snapshot, df, ticker_results)
+
+    def _finish_rebalance(self, portfolio_dict: Dict[str, float]):
+        """Mark the end of the rebalance in the journal, keep its fill records, and
+        log it (with a fresh snapshot) if there is a rebalance log.
+        """
+        self.journal.end()
+        self.fill_records = self.order_filler.take_fill_records()
+        if self.rebalance_log is not None:
+            self.rebalance_log.append(
+                portfolio_dict, PortfolioSnapshot.load(self.api), self.fill_records)
+
+    def analyze_fills(self, portfolio_dict: Dict[str, float],
+                      snapshot: Optional[PortfolioSnapshot] = None) -> 'pd.DataFrame':
+        """Analyze the fills of the last rebalance: slippage against the planning
+        quote, post-trade weight error against the target, and fill latency.
+
+        Args:
+            portfolio_dict (Dict[str, float]): ticker to equity % dictionary
+            snapshot (PortfolioSnapshot, optional): post-trade snapshot.
+            Loaded from the api if not given.
+
+        Returns:
+            pd.DataFrame: one row per order, see analytics.add_metrics.
+        """
+        if snapshot is None:
+            snapshot = PortfolioSnapshot.load(self.api)
+        return analyze_fills(self.fill_records, snapshot, portfolio_dict)
+
+    def _add_current_positions(self, portfolio_dict: dict,
+                               snapshot: Optional[PortfolioSnapshot] = None):
         """For current positions that are not listed in the portfolio_dict,
         set their value to 0 as it is assumed they will be closed.
 
         Args:
-            portfolio_dict (dict): _description_
+            portfolio_dict (dict): ticker to equity % dictionary
+            snapshot (PortfolioSnapshot, optional): snapshot to read positions from.
+            Loaded from the api if not given.
         """
-        positions = self.api.list_positions()
-        for p in positions:
-            ticker = p.symbol
-            assert isinstance(ticker, str)
+        if snapshot is None:
+            snapshot = self._load_snapshot()
+        for ticker in snapshot.tickers:
             if ticker not in portfolio_dict:
                 portfolio_dict[ticker] = 0
 
-    def _get_position_equity_df(self, portfolio_dict: Dict[str, float]) -> pd.DataFrame:
+    def _get_position_equity_df(self, portfolio_dict: Dict[str, float],
+                                snapshot: Optional[PortfolioSnapshot] = None) -> 'pd.DataFrame':
         """Get the dataframe that lists the tickers and the equity values for:
         how much is currently held, how much is desired to be held.
 
         Args:
             portfolio_dict (Dict[str, float]): ticker to equity % dictionary
+            snapshot (PortfolioSnapshot, optional): snapshot to compute equities from.
+            Loaded from the api if not given.
 
         Returns:
             pd.DataFrame:
@@ -60,16 +419,19 @@ class alpacaTrader(ABC):
 
             checks to make sure proportions total to 1
         """
+        import pandas as pd
+
         df = pd.DataFrame({'ticker': portfolio_dict.keys(),
                            'portfolio_pct': portfolio_dict.values()})
 
         rounded_total_proportion = round(df['portfolio_pct'].sum(), 5)
         assert rounded_total_proportion == 1, "sum(portfolio percent) != 1"
 
-        df['current_position_equity'] = df['ticker'].apply(
-            lambda ticker: self.get_position_equity(ticker))
-        df['desired_position_equity'] = df['portfolio_pct'].apply(
-            lambda f: self.calculate_desired_position_equity(f))
+        if snapshot is None:
+            snapshot = self._load_snapshot()
+        df['current_position_equity'] = df['ticker'].map(
+            snapshot.position_equity).fillna(0.0).astype(float)
+        df['desired_position_equity'] = df['portfolio_pct'] * snapshot.account_equity
 
         df['equity_diff'] = df['desired_position_equity'] - \
             df['current_position_equity']
@@ -118,47 +480,58 @@ class alpacaTrader(ABC):
     def get_portfolio_results_comparison(
             self,
             portfolio_dict: Dict[str, float],
-            ticker_results: Dict[str, bool]) -> pd.DataFrame:
-        """_summary_
+            ticker_results: Dict[str, bool],
+            snapshot: Optional[PortfolioSnapshot] = None) -> 'pd.DataFrame':
+        """Compare the desired percent of each filled ticker with its current
+        position equity, read from one snapshot.
 
         Args:
-            portfolio_dict (Dict[str, float]): _description_
-            ticker_results (Dict[str, float]): _description_
+            portfolio_dict (Dict[str, float]): ticker to equity % dictionary
+            ticker_results (Dict[str, float]): results of the rebalance
+            snapshot (PortfolioSnapshot, optional): post-trade snapshot.
+            Loaded from the api if not given.
 
         Returns:
-            pd.DataFrame: _description_
-        """
-        data_df = pd.DataFrame(data=[
-            {'ticker': ticker,
-             'desired_pct': pct,
-             'position_filled': ticker_results[ticker]}
-            for ticker, pct in portfolio_dict.items()
-        ])
-        data_df = data_df[data_df['position_filled'] == True]
-        data_df['current_pct'] = data_df['ticker'].apply(
-            lambda ticker: self.get_position_equity(ticker)) 
+            pd.DataFrame: 'ticker', 'desired_pct', 'position_filled' and
+            'current_pct' (the current position equity) of the filled tickers.
+        """
+        import pandas as pd
+
+        data_df = pd.DataFrame({'ticker': list(portfolio_dict.keys()),
+                                'desired_pct': list(portfolio_dict.values())})
+        data_df['position_filled'] = data_df['ticker'].map(ticker_results)
+        data_df = data_df[data_df['position_filled'] == True].copy()
+        if snapshot is None:
+            snapshot = PortfolioSnapshot.load(self.api)
+        data_df['current_pct'] = data_df['ticker'].map(
+            snapshot.position_equity).fillna(0.0)
         return data_df
 
-    def get_slippage(self, ticker_results: Dict[str, bool]) -> pd.DataFrame:
-        data_df = pd.DataFrame(data=[
-            {'ticker': ticker,
-             'position_filled': filled}
-            for ticker, filled in ticker_results.items()
-        ])
-        data_df = data_df[data_df['position_filled'] == True]
-        positions_df = pd.DataFrame(
-            data=[p.__dict__['_raw'] for p in self.api.list_positions()]
-        )
-        merge_df = pd.merge(
-            data_df, positions_df,
-            left_on='ticker', right_on='symbol'
-        )
-
-        assert len(merge_df) == len(merge_df.drop_duplicates('ticker'))
-        return merge_df[['ticker', 'cost_basis', 'market_value', 'unrealized_intraday_plpc']]
+    def get_slippage(self, ticker_results: Dict[str, bool],
+                     snapshot: Optional[PortfolioSnapshot] = None) -> 'pd.DataFrame':
+        """Get the slippage of the filled orders of the last rebalance, for the
+        tickers whose position was filled (see analyze_fills).
+
+        Args:
+            ticker_results (Dict[str, bool]): results of the rebalance
+            snapshot (PortfolioSnapshot, optional): post-trade snapshot.
+            Loaded from the api if not given.
+
+        Returns:
+            pd.DataFrame: one row per filled order, with 'ticker', 'side',
+            'order_type', 'planned_price', 'fill_price', 'filled_quantity',
+            'slippage' and 'slippage_cost'.
+        """
+        if snapshot is None:
+            snapshot = PortfolioSnapshot.load(self.api)
+        records = [record for record in self.fill_records
+                   if record.filled and ticker_results.get(record.ticker)]
+        df = analyze_fills(records, snapshot, {})
+        return df[['ticker', 'side', 'order_type', 'planned_price', 'fill_price',
+                   'filled_quantity', 'slippage', 'slippage_cost']]
 
     def get_account_equity(self) -> float:
-        account = self.api.get_account()
+        account = self.refresh_account()
         assert isinstance(account.equity, str)
         account_equity = float(account.equity)
         return account_equity
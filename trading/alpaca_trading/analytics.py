@@ -0,0 +1,223 @@
+from .snapshot import PortfolioSnapshot
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+import json
+import math
+import threading
+import time
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+@dataclass(slots=True)
+class FillRecord:
+    """Execution of one base order, collected by orderFiller while filling.
+
+    Prices and quantities are nan when unknown, e.g. the planned price of a
+    market order planned without a quote, or the fill price of an order whose
+    final state was not seen.
+    """
+    ticker: str
+    side: str
+    order_type: str  # 'market', 'limit' or 'close'
+    planned_price: float
+    fill_price: float
+    filled_quantity: float
+    requested_equity: float
+    requested_quantity: float
+    latency: float  # seconds from submission to fill, nan if not filled
+    filled: bool
+    reprice_steps: int = 0
+    submitted_at: float = 0.0  # time.time() of the submission
+
+
+def _to_float(value: Any) -> float:
+    return math.nan if value is None else float(value)
+
+
+def entity_fill(order_entity: Any) -> Tuple[float, float]:
+    """Get the (filled quantity, average fill price) of an order entity.
+
+    Args:
+        order_entity (Any): alpaca order entity, or None
+
+    Returns:
+        Tuple[float, float]: nan for what the entity does not have.
+    """
+    return (_to_float(getattr(order_entity, 'filled_qty', None)),
+            _to_float(getattr(order_entity, 'filled_avg_price', None)))
+
+
+def fills_frame(records: Iterable[FillRecord]) -> 'pd.DataFrame':
+    """Get fill records as a DataFrame, one row per record."""
+    import pandas as pd
+
+    return pd.DataFrame([asdict(record) for record in records],
+                        columns=list(FillRecord.__dataclass_fields__))
+
+
+def weights_frame(snapshot: PortfolioSnapshot, targets: Dict[str, float]) -> 'pd.DataFrame':
+    """Get the current and target weight of every ticker that is held or targeted.
+
+    Args:
+        snapshot (PortfolioSnapshot): positions after the rebalance
+        targets (Dict[str, float]): ticker to target equity %
+
+    Returns:
+        pd.DataFrame: 'ticker', 'current_weight' and 'target_weight'.
+    """
+    import pandas as pd
+
+    tickers = list(dict.fromkeys([*targets, *snapshot.position_equity]))
+    df = pd.DataFrame({'ticker': tickers})
+    df['current_weight'] = df['ticker'].map(snapshot.position_equity).fillna(0.0) \
+        / snapshot.account_equity
+    df['target_weight'] = df['ticker'].map(targets).fillna(0.0).astype(float)
+    return df
+
+
+def add_metrics(fills: 'pd.DataFrame', weights: 'pd.DataFrame',
+                on: List[str]) -> 'pd.DataFrame':
+    """Join fills with the post-trade weights and compute every metric in one
+    vectorized pass.
+
+    Args:
+        fills (pd.DataFrame): fills_frame rows
+        weights (pd.DataFrame): weights_frame rows
+        on (List[str]): columns to join on, 'ticker' plus any rebalance key
+
+    Returns:
+        pd.DataFrame: the fills with
+        'slippage': fill price vs planned price as a proportion, positive when
+        the fill was worse than planned (bought higher or sold lower).
+        'slippage_cost': slippage in dollars over the filled quantity.
+        'weight_error': post-trade weight minus target weight of the ticker.
+        'fill_latency': seconds from submission to fill.
+    """
+    import numpy as np
+
+    # tickers neither held nor targeted after the rebalance have no weights row.
+    df = fills.merge(weights, on=on, how='left')
+    df[['current_weight', 'target_weight']] = \
+        df[['current_weight', 'target_weight']].fillna(0.0)
+    sign = np.where(df['side'] == 'buy', 1.0, -1.0)
+    df['slippage'] = sign * (df['fill_price'] - df['planned_price']) / df['planned_price']
+    df['slippage_cost'] = df['slippage'] * df['planned_price'] * df['filled_quantity']
+    df['weight_error'] = df['current_weight'] - df['target_weight']
+    df['fill_latency'] = df['latency']
+    return df
+
+
+def analyze_fills(records: Iterable[FillRecord], snapshot: PortfolioSnapshot,
+                  targets: Dict[str, float]) -> 'pd.DataFrame':
+    """Analyze the fills of one rebalance against one post-trade snapshot.
+
+    Args:
+        records (Iterable[FillRecord]): fill records of the rebalance
+        snapshot (PortfolioSnapshot): positions after the rebalance
+        targets (Dict[str, float]): ticker to target equity %
+
+    Returns:
+        pd.DataFrame: one row per order, see add_metrics.
+    """
+    return add_metrics(fills_frame(records), weights_frame(snapshot, targets), ['ticker'])
+
+
+def summarize(df: 'pd.DataFrame', by: str = 'rebalance') -> 'pd.DataFrame':
+    """Summarize analyzed fills per rebalance (or any other column).
+
+    Returns:
+        pd.DataFrame: order count, fill rate, notional weighted slippage, total
+        slippage cost, p50/p90 fill latency and max |weight error|.
+    """
+    df = df.assign(
+        notional=df['fill_price'] * df['filled_quantity'],
+        weighted_slippage=df['slippage'] * df['fill_price'] * df['filled_quantity'],
+        abs_weight_error=df['weight_error'].abs())
+    grouped = df.groupby(by)
+    summary = grouped.agg(
+        orders=('ticker', 'size'),
+        fill_rate=('filled', 'mean'),
+        slippage_cost=('slippage_cost', 'sum'),
+        latency_p50=('fill_latency', 'median'),
+        latency_p90=('fill_latency', lambda s: s.quantile(0.9)),
+        max_weight_error=('abs_weight_error', 'max'))
+    summary['slippage'] = grouped['weighted_slippage'].sum() / grouped['notional'].sum()
+    return summary
+
+
+class rebalanceLog:
+    """Append-only JSON lines log of rebalances: the targets, the post-trade
+    snapshot and the fill records of each, for analyzing many rebalances at once.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, targets: Dict[str, float], snapshot: PortfolioSnapshot,
+               records: Iterable[FillRecord], timestamp: Optional[float] = None):
+        """Log one rebalance.
+
+        Args:
+            targets (Dict[str, float]): ticker to target equity %
+            snapshot (PortfolioSnapshot): positions after the rebalance
+            records (Iterable[FillRecord]): fill records of the rebalance
+            timestamp (float, optional): time.time() of the rebalance. Defaults to now.
+        """
+        line = json.dumps({
+            'time': time.time() if timestamp is None else timestamp,
+            'targets': {ticker: float(pct) for ticker, pct in targets.items()},
+            'snapshot': asdict(snapshot),
+            'fills': [asdict(record) for record in records],
+        })
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+    def load(self, since: Optional[float] = None,
+             until: Optional[float] = None) -> Tuple['pd.DataFrame', 'pd.DataFrame']:
+        """Load the logged rebalances within [since, until).
+
+        Returns:
+            Tuple[pd.DataFrame, pd.DataFrame]: fills and weights of every rebalance,
+            each with a 'rebalance' column holding the rebalance time.
+        """
+        import pandas as pd
+
+        fills: List[Dict[str, Any]] = []
+        weights: Dict[str, list] = {'rebalance': [], 'ticker': [],
+                                    'current_weight': [], 'target_weight': []}
+        with open(self.path) as f:
+            for line in f:
+                entry = json.loads(line)
+                rebalance = entry['time']
+                if (since is not None and rebalance < since) or \
+                        (until is not None and rebalance >= until):
+                    continue
+                for record in entry['fills']:
+                    record['rebalance'] = rebalance
+                    fills.append(record)
+                snapshot = entry['snapshot']
+                targets = entry['targets']
+                for ticker in dict.fromkeys([*targets, *snapshot['position_equity']]):
+                    weights['rebalance'].append(rebalance)
+                    weights['ticker'].append(ticker)
+                    weights['current_weight'].append(
+                        snapshot['position_equity'].get(ticker, 0.0)
+                        / snapshot['account_equity'])
+                    weights['target_weight'].append(targets.get(ticker, 0.0))
+
+        columns = ['rebalance', *FillRecord.__dataclass_fields__]
+        return pd.DataFrame(fills, columns=columns), pd.DataFrame(weights)
+
+    def analyze(self, since: Optional[float] = None,
+                until: Optional[float] = None) -> 'pd.DataFrame':
+        """Analyze every logged rebalance within [since, until) in one pass.
+
+        Returns:
+            pd.DataFrame: one row per order, see add_metrics, with a 'rebalance' column.
+        """
+        fills, weights = self.load(since, until)
+        return add_metrics(fills, weights, ['rebalance', 'ticker'])
@@ -0,0 +1,396 @@
+from .order import Order, OrderBatch
+from .order_filling import limit_from_last
+from .order_updates import FINAL_STATUSES
+from .planner import plan_orders
+from .repricing import limitRepricer
+from .snapshot import PortfolioSnapshot
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, TYPE_CHECKING
+import asyncio
+import logging
+import numpy as np
+import os
+
+if TYPE_CHECKING:
+    from alpaca_trade_api.entity import Account, Order as orderEntity, Position
+    import aiohttp
+
+
+logger = logging.getLogger(__name__)
+
+
+class asyncAPIError(Exception):
+    """Error response from the alpaca api, str() is the api's message."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class asyncREST:
+    """Non-blocking client for the alpaca trading and market data apis,
+    returning the same entities as alpaca_trade_api.rest.REST.
+    Credentials are read from the same environment variables.
+    Requires aiohttp, which is imported when the first session is opened.
+    """
+
+    def __init__(self, key_id: Optional[str] = None,
+                 secret_key: Optional[str] = None,
+                 base_url: Optional[str] = None,
+                 data_url: Optional[str] = None,
+                 session: Optional['aiohttp.ClientSession'] = None):
+        self.key_id = key_id or os.environ.get('APCA_API_KEY_ID')
+        self.secret_key = secret_key or os.environ.get('APCA_API_SECRET_KEY')
+        self.base_url = (base_url or os.environ.get(
+            'APCA_API_BASE_URL', 'https://api.alpaca.markets')).rstrip('/')
+        self.data_url = (data_url or os.environ.get(
+            'APCA_API_DATA_URL', 'https://data.alpaca.markets')).rstrip('/')
+        self._session = session
+
+    @property
+    def session(self) -> 'aiohttp.ClientSession':
+        if self._session is None or self._session.closed:
+            import aiohttp
+
+            self._session = aiohttp.ClientSession(headers={
+                'APCA-API-KEY-ID': self.key_id or '',
+                'APCA-API-SECRET-KEY': self.secret_key or '',
+            })
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def _request(self, method: str, path: str, base_url: Optional[str] = None,
+                       params: Optional[Dict[str, Any]] = None,
+                       data: Optional[Dict[str, Any]] = None) -> Any:
+        url = f'{base_url or self.base_url}{path}'
+        async with self.session.request(method, url, params=params, json=data) as response:
+            body = await response.json(content_type=None) if response.content_length != 0 else None
+            if response.status >= 400:
+                message = body.get('message', str(body)) if isinstance(body, dict) else str(body)
+                raise asyncAPIError(message, response.status)
+            return body
+
+    async def get_account(self) -> 'Account':
+        from alpaca_trade_api.entity import Account
+
+        return Account(await self._request('GET', '/v2/account'))
+
+    async def list_positions(self) -> List['Position']:
+        from alpaca_trade_api.entity import Position
+
+        return [Position(p) for p in await self._request('GET', '/v2/positions')]
+
+    async def get_position(self, symbol: str) -> 'Position':
+        from alpaca_trade_api.entity import Position
+
+        return Position(await self._request('GET', f'/v2/positions/{symbol}'))
+
+    async def submit_order(self, symbol: str, qty=None, side=None, type='market',
+                           time_in_force='day', limit_price=None, notional=None,
+                           **kwargs) -> 'orderEntity':
+        from alpaca_trade_api.entity import Order as orderEntity
+
+        data = {'symbol': symbol, 'side': side, 'type': type,
+                'time_in_force': time_in_force, **kwargs}
+        if qty is not None:
+            data['qty'] = str(qty)
+        if notional is not None:
+            data['notional'] = str(notional)
+        if limit_price is not None:
+            data['limit_price'] = str(limit_price)
+        return orderEntity(await self._request('POST', '/v2/orders', data=data))
+
+    async def replace_order(self, order_id: str, qty=None, limit_price=None,
+                            **kwargs) -> 'orderEntity':
+        from alpaca_trade_api.entity import Order as orderEntity
+
+        data = dict(kwargs)
+        if qty is not None:
+            data['qty'] = str(qty)
+        if limit_price is not None:
+            data['limit_price'] = str(limit_price)
+        return orderEntity(await self._request('PATCH', f'/v2/orders/{order_id}', data=data))
+
+    async def get_order(self, order_id: str) -> 'orderEntity':
+        from alpaca_trade_api.entity import Order as orderEntity
+
+        return orderEntity(await self._request('GET', f'/v2/orders/{order_id}'))
+
+    async def list_orders(self, status=None, limit=None, direction=None,
+                          **kwargs) -> List['orderEntity']:
+        from alpaca_trade_api.entity import Order as orderEntity
+
+        params = {k: v for k, v in dict(
+            status=status, limit=limit, direction=direction, **kwargs).items()
+            if v is not None}
+        return [orderEntity(o) for o in await self._request('GET', '/v2/orders', params=params)]
+
+    async def cancel_order(self, order_id: str):
+        await self._request('DELETE', f'/v2/orders/{order_id}')
+
+    async def close_position(self, symbol: str, **kwargs) -> 'orderEntity':
+        from alpaca_trade_api.entity import Order as orderEntity
+
+        return orderEntity(await self._request(
+            'DELETE', f'/v2/positions/{symbol}', params=kwargs or None))
+
+    async def get_snapshots(self, symbols: Iterable[str]) -> Dict[str, Any]:
+        snapshots = await self._request(
+            'GET', '/v2/stocks/snapshots', base_url=self.data_url,
+            params={'symbols': ','.join(symbols)})
+        return {
+            symbol: SimpleNamespace(minute_bar=SimpleNamespace(**s['minuteBar']))
+            if s and s.get('minuteBar') else None
+            for symbol, s in snapshots.items()
+        }
+
+
+class asyncAPIAdapter:
+    """Run a synchronous broker api (e.g. simulatedBroker) from asyncio,
+    each call in a worker thread.
+    """
+
+    def __init__(self, api: Any):
+        self._api = api
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+        return call
+
+
+class asyncOrderFiller:
+    """asyncio counterpart of orderFiller. Fills are detected by one polling task
+    per filler, refreshing every order being waited on with one list_orders call.
+    """
+
+    def __init__(self, api: Any, max_concurrency: int = 16, poll_interval: float = 0.5):
+        """Create the filler.
+
+        Args:
+            api (Any): async broker api (asyncREST or asyncAPIAdapter)
+            max_concurrency (int, optional): max orders worked at once. Defaults to 16.
+            poll_interval (float, optional): seconds between status polls. Defaults to 0.5.
+        """
+        self.api = api
+        self.max_concurrency = max_concurrency
+        self.poll_interval = poll_interval
+        self.last_closes: Dict[str, float] = {}
+
+        self._statuses: Dict[str, str] = {}
+        self._waiters: Dict[str, asyncio.Future] = {}
+        self._poller: Optional[asyncio.Task] = None
+
+    async def wait(self, order_id: str, timeout: float) -> Optional[str]:
+        """Wait for an order to reach a final status, or for the timeout to pass.
+
+        Returns:
+            Optional[str]: latest known status of the order.
+        """
+        future = self._waiters.get(order_id)
+        if future is None:
+            future = self._waiters[order_id] = asyncio.get_running_loop().create_future()
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll())
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return self._statuses.get(order_id)
+        finally:
+            # nobody waits on the order any more, stop polling for it.
+            if self._waiters.get(order_id) is future:
+                del self._waiters[order_id]
+
+    def _update(self, order_entity: 'orderEntity'):
+        self._statuses[order_entity.id] = order_entity.status  # type: ignore
+        future = self._waiters.get(order_entity.id)  # type: ignore
+        if future is not None and order_entity.status in FINAL_STATUSES and not future.done():
+            future.set_result(order_entity.status)
+
+    async def _poll(self):
+        """Refresh the orders being waited on with one list_orders call, fetching
+        the ones not in the recent orders individually, like orderStatusTracker.poll.
+        """
+        while self._waiters:
+            pending = set(self._waiters)
+            for order_entity in await self.api.list_orders(
+                    status='all', limit=500, direction='desc'):
+                if order_entity.id in pending:
+                    self._update(order_entity)
+                    pending.discard(order_entity.id)
+            if pending:
+                for order_entity in await asyncio.gather(
+                        *(self.api.get_order(order_id) for order_id in pending)):
+                    self._update(order_entity)
+            await asyncio.sleep(self.poll_interval)
+
+    async def fill_orders(self, orders: OrderBatch) -> List[bool]:
+        """Fill orders in two phases, closes/sells and then buys, each phase
+        filled concurrently.
+
+        Args:
+            orders (OrderBatch): orders to fill
+
+        Returns:
+            List[bool]: True for each order that was filled.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def fill(order: Order) -> bool:
+            async with semaphore:
+                return await self.fill_order(order)
+
+        orders.validate()
+        results = [True] * len(orders)
+        sells = np.flatnonzero(orders.phase_mask('closes', 'sells')).tolist()
+        buys = np.flatnonzero(orders.phase_mask('buys')).tolist()
+        for phase in (sells, buys):
+            phase_results = await asyncio.gather(*(fill(orders[i]) for i in phase))
+            for i, result in zip(phase, phase_results):
+                results[i] = result
+        return results
+
+    async def fill_order(self, order: Order) -> bool:
+        if order.equity is not None:
+            return await self.fill_market_order(order)
+        elif order.quantity is not None:
+            return await self.fill_limit_order(order)
+        raise Exception(f"invalid order type: {order}")
+
+    async def fill_market_order(self, order: Order) -> bool:
+        if order.close_position:
+            await self.api.close_position(order.ticker)
+            return True
+        order_entity = await self.api.submit_order(
+            symbol=order.ticker,
+            notional=order.equity,
+            side=order.side,
+            type='market',
+            time_in_force='day'
+        )
+        return await self.wait(order_entity.id, timeout=8) == 'filled'
+
+    async def fill_limit_order(self, order: Order,
+                               max_limit_scaler: float = 0.04,
+                               increase_increment: float = 0.005,
+                               jitter: float = 10,
+                               cancel_on_fail: bool = True) -> bool:
+        """Submit a limit order and reprice it until it fills, with the rules of
+        limitRepricer, as orderFiller.fill_limit_order does.
+        """
+        last = self.last_closes.get(order.ticker)
+        if last is None:
+            snapshots = await self.api.get_snapshots([order.ticker])
+            last = float(snapshots[order.ticker].minute_bar.c)
+        order_entity = await self.api.submit_order(
+            symbol=order.ticker,
+            time_in_force='day',
+            side=order.side,
+            type='limit',
+            limit_price=str(limit_from_last(last, order.side)),
+            qty=order.quantity
+        )
+        status = await self.wait(order_entity.id, timeout=10)
+
+        # the repricer only decides, its calls are awaited here instead.
+        repricer = limitRepricer(None, max_limit_scaler, increase_increment, jitter,  # type: ignore
+                                 cancel_on_fail=cancel_on_fail)
+        repricer.add(order_entity)
+        w = repricer.working[order_entity.id]
+        while True:
+            action = repricer.next_action(w, status)
+            if action == 'filled':
+                return True
+            if action == 'canceled':
+                return False
+            if action == 'give_up':
+                if cancel_on_fail:
+                    try:
+                        await self.api.cancel_order(w.order_entity.id)
+                    except Exception as e:
+                        if 'order is not open' not in str(e):
+                            raise e
+                        return (await self.api.get_order(w.order_entity.id)).status == 'filled'
+                return False
+
+            new_limit_price = repricer.next_limit_price(w)
+            try:
+                replacement = await self.api.replace_order(
+                    order_id=w.order_entity.id, limit_price=new_limit_price)
+            except Exception as e:
+                if 'order is not open' in str(e):
+                    return True
+                raise e
+            repricer.replaced(w, replacement, new_limit_price)
+            status = await self.wait(replacement.id, timeout=jitter)
+
+
+class asyncAlpacaTrader:
+    """asyncio trader. Many rebalances and their fill monitoring can share one
+    event loop, each awaiting the broker instead of blocking a thread.
+    """
+
+    def __init__(self, api: Any = None, order_type: str = 'market',
+                 max_concurrency: int = 16, poll_interval: float = 0.5):
+        """Create the trader.
+
+        Args:
+            api (Any, optional): async broker api. Defaults to asyncREST().
+            order_type (str, optional): 'market' for notional market orders as
+            alpacaMarketTrader places, 'limit' for share quantity limit orders
+            as alpacaLimitTrader places. Defaults to 'market'.
+            max_concurrency (int, optional): max orders worked at once. Defaults to 16.
+            poll_interval (float, optional): seconds between status polls. Defaults to 0.5.
+        """
+        assert order_type in ('market', 'limit')
+        self.api = api if api is not None else asyncREST()
+        self.order_type = order_type
+        self.order_filler = asyncOrderFiller(self.api, max_concurrency, poll_interval)
+
+    async def load_snapshot(self) -> PortfolioSnapshot:
+        positions, account = await asyncio.gather(
+            self.api.list_positions(), self.api.get_account())
+        return PortfolioSnapshot.from_entities(positions, account)
+
+    async def have_portfolio(self, portfolio_dict: Dict[str, float]) -> Dict[str, bool]:
+        """Change the state of the portfolio to reflect the given portfolio dict.
+
+        Args:
+            portfolio_dict (Dict[str, float]): ticker to equity % dictionary
+
+        Returns:
+            Dict[str, bool]: ticker to True if its position was taken.
+        """
+        snapshot = await self.load_snapshot()
+        for ticker in snapshot.tickers:
+            portfolio_dict.setdefault(ticker, 0)
+        assert round(sum(portfolio_dict.values()), 5) == 1, "sum(portfolio percent) != 1"
+
+        tickers = list(portfolio_dict)
+        prices = None
+        if self.order_type == 'limit':
+            snapshots = await self.api.get_snapshots(tickers)
+            missing = [t for t in tickers if snapshots.get(t) is None]
+            assert not missing, f"no last close for {missing}"
+            self.order_filler.last_closes = {
+                t: float(snapshots[t].minute_bar.c) for t in tickers}
+            prices = [self.order_filler.last_closes[t] for t in tickers]
+
+        orders = plan_orders(
+            tickers,
+            [snapshot.get_position_equity(t) for t in tickers],
+            [portfolio_dict[t] for t in tickers],
+            snapshot.account_equity,
+            prices=prices
+        )
+        order_results = await self.order_filler.fill_orders(orders)
+        ticker_results = {ticker: True for ticker in tickers}
+        ticker_results.update(zip(orders.ticker, order_results))
+        return ticker_results
@@ -0,0 +1,81 @@
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+import threading
+
+
+class brokerAPI(ABC):
+    """Broker calls made by the traders and the order filler.
+
+    Any class with these methods, like alpaca_trade_api.rest.REST, counts as
+    an implementation, so objects with the same methods (e.g. simulatedBroker)
+    can stand in for it.
+    """
+
+    @classmethod
+    def __subclasshook__(cls, C):
+        if cls is brokerAPI:
+            return all(any(name in B.__dict__ for B in C.__mro__)
+                       for name in cls.__abstractmethods__) or NotImplemented
+        return NotImplemented
+
+    @abstractmethod
+    def get_account(self): ...
+
+    @abstractmethod
+    def list_positions(self): ...
+
+    @abstractmethod
+    def get_position(self, symbol: str): ...
+
+    @abstractmethod
+    def submit_order(self, symbol: str, qty=None, side=None, type=None,
+                     time_in_force=None, limit_price=None, notional=None, **kwargs): ...
+
+    @abstractmethod
+    def replace_order(self, order_id: str, qty=None, limit_price=None, **kwargs): ...
+
+    @abstractmethod
+    def get_order(self, order_id: str): ...
+
+    @abstractmethod
+    def list_orders(self, status=None, limit=None, **kwargs): ...
+
+    @abstractmethod
+    def cancel_order(self, order_id: str): ...
+
+    @abstractmethod
+    def close_position(self, symbol: str, **kwargs): ...
+
+    @abstractmethod
+    def cancel_all_orders(self): ...
+
+    @abstractmethod
+    def close_all_positions(self): ...
+
+    @abstractmethod
+    def get_latest_bar(self, symbol: str): ...
+
+    @abstractmethod
+    def get_snapshots(self, symbols): ...
+
+    @abstractmethod
+    def list_assets(self, status=None, asset_class=None): ...
+
+    @abstractmethod
+    def get_calendar(self, start=None, end=None): ...
+
+
+_shared_api: Optional[Any] = None
+_shared_api_lock = threading.Lock()
+
+
+def get_shared_api() -> Any:
+    """Get the alpaca REST api (and its http session) shared by every trader
+    created without an api, created from the environment on first use.
+    """
+    global _shared_api
+    with _shared_api_lock:
+        if _shared_api is None:
+            from alpaca_trade_api.rest import REST
+            _shared_api = REST()
+        return _shared_api
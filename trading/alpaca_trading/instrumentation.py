@@ -0,0 +1,101 @@
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+import json
+import threading
+import time
+
+
+class nullSink:
+    """Sink that drops every measurement. Apis are not wrapped when it is used."""
+    enabled = False
+
+    def record(self, metric: str, value: float, **tags):
+        pass
+
+
+class histogramSink:
+    """Sink that keeps every measurement in memory, per metric and tags."""
+    enabled = True
+
+    def __init__(self):
+        self.values: Dict[Tuple, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, metric: str, value: float, **tags):
+        key = (metric,) + tuple(sorted(tags.items()))
+        with self._lock:
+            self.values[key].append(value)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Get the count, total and percentiles of each metric.
+
+        Returns:
+            Dict[str, Dict[str, float]]: 'metric{tag=value,...}' to its statistics.
+        """
+        summary = {}
+        with self._lock:
+            items = [(key, sorted(values)) for key, values in self.values.items()]
+        for (metric, *tags), values in items:
+            name = metric if not tags else \
+                metric + '{' + ','.join(f'{k}={v}' for k, v in tags) + '}'
+            n = len(values)
+            summary[name] = {
+                'count': n,
+                'total': sum(values),
+                'mean': sum(values) / n,
+                'p50': values[int(0.5 * (n - 1))],
+                'p90': values[int(0.9 * (n - 1))],
+                'p99': values[int(0.99 * (n - 1))],
+                'max': values[-1],
+            }
+        return summary
+
+
+class jsonLinesSink:
+    """Sink that appends each measurement to a JSON lines file."""
+    enabled = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+
+    def record(self, metric: str, value: float, **tags):
+        line = json.dumps({'time': time.time(), 'metric': metric, 'value': value, **tags})
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class instrumentedAPI:
+    """Proxy over a broker api recording the latency of every call as
+    'rest.latency' and failed calls as 'rest.errors', tagged with the endpoint.
+    """
+
+    def __init__(self, api: Any, sink: Any):
+        self._api = api
+        self._sink = sink
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            except Exception:
+                self._sink.record('rest.errors', 1, endpoint=name)
+                raise
+            finally:
+                self._sink.record('rest.latency', time.perf_counter() - start, endpoint=name)
+        return timed
+
+
+def instrument(api: Any, sink: Any) -> Any:
+    """Wrap an api to record its calls to <sink>, unless the sink is disabled."""
+    return instrumentedAPI(api, sink) if sink.enabled else api
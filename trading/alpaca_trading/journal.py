@@ -0,0 +1,244 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import math
+import mmap
+import numpy as np
+import os
+import struct
+import threading
+import time
+
+
+EVENTS = {'begin': 1, 'submit': 2, 'replace': 3, 'cancel': 4, 'fill': 5, 'end': 6}
+SIDES = {'': 0, 'buy': 1, 'sell': 2}
+ORDER_TYPES = {'': 0, 'market': 1, 'limit': 2, 'close': 3}
+
+_MAGIC = b'TTJRNL01'
+_HEADER = struct.Struct('<8sI4x')
+# time, event, side, order type, ticker, order id, replaced order id, quantity, notional, price
+_RECORD = struct.Struct('<dBBB5x16s40s40sddd')
+RECORD_DTYPE = np.dtype([
+    ('time', '<f8'), ('event', 'u1'), ('side', 'u1'), ('order_type', 'u1'), ('_pad', 'V5'),
+    ('ticker', 'S16'), ('order_id', 'S40'), ('ref_id', 'S40'),
+    ('quantity', '<f8'), ('notional', '<f8'), ('price', '<f8')])
+assert RECORD_DTYPE.itemsize == _RECORD.size
+
+
+@dataclass(slots=True)
+class journaledOrder:
+    """A submitted order as rebuilt from the journal. <order_id> is the id of
+    the latest replacement.
+    """
+    order_id: str
+    ticker: str
+    side: str
+    order_type: str
+    quantity: float
+    notional: float
+    price: float
+
+
+class nullJournal:
+    """Journal that writes nothing. Used when no journal is configured."""
+    enabled = False
+
+    def begin(self):
+        pass
+
+    def end(self):
+        pass
+
+    def submit(self, order_id: str, ticker: str, side: str, order_type: str,
+               quantity: float = math.nan, notional: float = math.nan,
+               price: float = math.nan):
+        pass
+
+    def replace(self, order_id: str, ref_id: str, price: float):
+        pass
+
+    def cancel(self, order_id: str):
+        pass
+
+    def fill(self, order_id: str, quantity: float, price: float):
+        pass
+
+    def interrupted(self) -> bool:
+        return False
+
+    def in_flight(self) -> List[journaledOrder]:
+        return []
+
+
+class executionJournal:
+    """Append-only, memory-mapped binary journal of the order events of each
+    rebalance: begin, submit, replace, cancel, fill and end.
+
+    Records are fixed size, so appending is one struct.pack_into into the
+    mapped file, and the whole journal can be read at once as a numpy
+    structured array. Written records survive the process dying without a
+    flush. Pass fsync=True to also flush each record to disk.
+    """
+    enabled = True
+
+    def __init__(self, path: str, chunk_records: int = 4096, fsync: bool = False):
+        """Open the journal at <path>, creating it if needed. New records are
+        appended after the existing ones.
+
+        Args:
+            path (str): journal file
+            chunk_records (int, optional): records the file grows by when full.
+            Defaults to 4096.
+            fsync (bool, optional): flush every record to disk. Defaults to False.
+        """
+        self.path = path
+        self.chunk_records = chunk_records
+        self.fsync = fsync
+        self._lock = threading.Lock()
+
+        if not os.path.exists(path) or os.path.getsize(path) < _HEADER.size:
+            with open(path, 'wb') as f:
+                f.write(_HEADER.pack(_MAGIC, _RECORD.size))
+                f.truncate(_HEADER.size + chunk_records * _RECORD.size)
+        self._file = open(path, 'r+b')
+        magic, record_size = _HEADER.unpack(self._file.read(_HEADER.size))
+        if magic != _MAGIC or record_size != _RECORD.size:
+            raise ValueError(f"{path} is not an execution journal")
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        self._capacity = (len(self._mm) - _HEADER.size) // _RECORD.size
+        # records are only appended, so the written ones are the ones before the first empty one.
+        events = np.frombuffer(self._mm, dtype=RECORD_DTYPE, count=self._capacity,
+                               offset=_HEADER.size)['event']
+        empty = np.flatnonzero(events == 0)
+        self._count = int(empty[0]) if len(empty) else self._capacity
+        begins = np.flatnonzero(events[:self._count] == EVENTS['begin'])
+        self._last_begin = int(begins[-1]) if len(begins) else -1
+        self._ended = self._last_begin < 0 or \
+            bool((events[self._last_begin:self._count] == EVENTS['end']).any())
+        del events, empty, begins
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _grow(self):
+        self._mm.close()
+        self._capacity += self.chunk_records
+        self._file.truncate(_HEADER.size + self._capacity * _RECORD.size)
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+
+    def _append(self, event: str, side: str = '', order_type: str = '', ticker: str = '',
+                order_id: str = '', ref_id: str = '', quantity: float = math.nan,
+                notional: float = math.nan, price: float = math.nan):
+        record = (time.time(), EVENTS[event], SIDES[side], ORDER_TYPES[order_type],
+                  ticker.encode(), order_id.encode(), ref_id.encode(),
+                  quantity, notional, price)
+        with self._lock:
+            if self._count == self._capacity:
+                self._grow()
+            offset = _HEADER.size + self._count * _RECORD.size
+            _RECORD.pack_into(self._mm, offset, *record)
+            if event == 'begin':
+                self._last_begin, self._ended = self._count, False
+            elif event == 'end':
+                self._ended = True
+            self._count += 1
+            if self.fsync:
+                self._mm.flush()
+
+    def begin(self):
+        """Mark the start of a rebalance."""
+        self._append('begin')
+
+    def end(self):
+        """Mark the end of a rebalance. Its orders are no longer in flight."""
+        self._append('end')
+
+    def submit(self, order_id: str, ticker: str, side: str, order_type: str,
+               quantity: float = math.nan, notional: float = math.nan,
+               price: float = math.nan):
+        self._append('submit', side, order_type, ticker, order_id,
+                     quantity=quantity, notional=notional, price=price)
+
+    def replace(self, order_id: str, ref_id: str, price: float):
+        """Record that order <ref_id> was replaced by <order_id> at a new limit price."""
+        self._append('replace', order_id=order_id, ref_id=ref_id, price=price)
+
+    def cancel(self, order_id: str):
+        self._append('cancel', order_id=order_id)
+
+    def fill(self, order_id: str, quantity: float, price: float):
+        self._append('fill', order_id=order_id, quantity=quantity, price=price)
+
+    def read(self, start: int = 0) -> np.ndarray:
+        """Get a copy of the written records from index <start>, as a RECORD_DTYPE array."""
+        with self._lock:
+            return np.frombuffer(self._mm, dtype=RECORD_DTYPE, count=self._count - start,
+                                 offset=_HEADER.size + start * _RECORD.size).copy()
+
+    def interrupted(self) -> bool:
+        """Whether the last rebalance began but never ended."""
+        return not self._ended
+
+    def in_flight(self) -> List[journaledOrder]:
+        """Replay the last rebalance to get its orders that were neither filled
+        nor cancelled. Empty if the last rebalance ended.
+        """
+        if not self.interrupted():
+            return []
+        return replay(self.read(self._last_begin))
+
+    def close(self):
+        with self._lock:
+            self._mm.flush()
+            self._mm.close()
+            self._file.close()
+
+
+def read_journal(path: str) -> np.ndarray:
+    """Read every record of a journal file in bulk, e.g. for analytics.
+
+    Returns:
+        np.ndarray: RECORD_DTYPE array, with ticker and id columns as bytes.
+    """
+    records = np.fromfile(path, dtype=RECORD_DTYPE, offset=_HEADER.size)
+    empty = np.flatnonzero(records['event'] == 0)
+    return records[:empty[0]] if len(empty) else records
+
+
+def replay(records: np.ndarray) -> List[journaledOrder]:
+    """Rebuild the orders still in flight after the last 'begin' record.
+
+    Args:
+        records (np.ndarray): journal records, in order
+
+    Returns:
+        List[journaledOrder]: orders neither filled nor cancelled, in submission
+        order. Empty if the last rebalance has an 'end' record.
+    """
+    events = records['event']
+    begins = np.flatnonzero(events == EVENTS['begin'])
+    if len(begins) == 0:
+        return []
+    records = records[begins[-1]:]
+    if (records['event'] == EVENTS['end']).any():
+        return []
+
+    sides = {code: side for side, code in SIDES.items()}
+    order_types = {code: order_type for order_type, code in ORDER_TYPES.items()}
+    orders: Dict[str, journaledOrder] = {}
+    for record in records:
+        event = record['event']
+        order_id = record['order_id'].decode()
+        if event == EVENTS['submit']:
+            orders[order_id] = journaledOrder(
+                order_id, record['ticker'].decode(), sides[record['side']],
+                order_types[record['order_type']], float(record['quantity']),
+                float(record['notional']), float(record['price']))
+        elif event == EVENTS['replace']:
+            order: Optional[journaledOrder] = orders.pop(record['ref_id'].decode(), None)
+            if order is not None:
+                order.order_id = order_id
+                order.price = float(record['price'])
+                orders[order_id] = order
+        elif event in (EVENTS['cancel'], EVENTS['fill']):
+            orders.pop(order_id, None)
+    return list(orders.values())
@@ -0,0 +1,142 @@
+from .alpacaMarketTrader import alpacaMarketTrader
+from .alpacaTrader import alpacaTrader
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Type
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AccountCredentials:
+    """Credentials of one (sub-)account. <name> defaults to the key id."""
+    key_id: str
+    secret_key: str
+    base_url: Optional[str] = None
+    name: Optional[str] = None
+
+    def __post_init__(self):
+        if self.name is None:
+            self.name = self.key_id
+
+
+@dataclass
+class MultiAccountResult:
+    """Per account results of a multi-account rebalance."""
+    ticker_results: Dict[str, Dict[str, bool]] = field(default_factory=dict)
+    timings: Dict[str, float] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    wall_time: float = 0.0
+
+    @property
+    def total_account_time(self) -> float:
+        """Time the rebalances would have taken one account after another."""
+        return sum(self.timings.values())
+
+
+# trader arguments holding the state of one account, which must not be shared
+# between accounts rebalancing at once. Give them with trader_kwargs_factory.
+ACCOUNT_KWARGS = ('journal', 'rebalance_state', 'rebalance_log', 'trade_update_stream',
+                  'calendar')
+
+
+def rest_api_factory(credentials: AccountCredentials) -> Any:
+    from alpaca_trade_api.rest import REST
+    return REST(credentials.key_id, credentials.secret_key, credentials.base_url)
+
+
+class multiAccountRebalancer:
+    """Rebalance many accounts to the same target at once.
+
+    Each account is planned from its own snapshot by its own trader, and the
+    accounts are rebalanced in parallel, at most <max_workers> at a time.
+    A trader's journal, rebalance state and log, trade update stream and
+    calendar are per account (see ACCOUNT_KWARGS), built by <trader_kwargs_factory>.
+    """
+
+    def __init__(self, credentials: List[AccountCredentials],
+                 trader_cls: Type[alpacaTrader] = alpacaMarketTrader,
+                 max_workers: int = 8,
+                 api_factory: Callable[[AccountCredentials], Any] = rest_api_factory,
+                 trader_kwargs_factory: Optional[
+                     Callable[[AccountCredentials], Dict[str, Any]]] = None,
+                 **trader_kwargs):
+        """Create the rebalancer. Traders are created on the first rebalance.
+
+        Args:
+            credentials (List[AccountCredentials]): accounts to rebalance.
+            trader_cls (Type[alpacaTrader], optional): trader used for every account.
+            Defaults to alpacaMarketTrader.
+            max_workers (int, optional): max accounts rebalanced at once. Defaults to 8.
+            api_factory (Callable, optional): builds the broker api of an account.
+            Defaults to alpaca REST with the account's credentials.
+            trader_kwargs_factory (Callable, optional): builds the trader arguments of
+            an account, e.g. its own journal and rebalance state. Called once per
+            account, on its first rebalance. Defaults to None.
+            **trader_kwargs: passed to every trader, e.g. max_workers for orders.
+            The objects are shared by every account, so a sink must be thread safe
+            (histogramSink and jsonLinesSink are).
+
+        Raises:
+            ValueError: if a per account argument (ACCOUNT_KWARGS) is in trader_kwargs.
+        """
+        names = [c.name for c in credentials]
+        assert len(set(names)) == len(names), "account names must be unique"
+        shared = [name for name in ACCOUNT_KWARGS if trader_kwargs.get(name) is not None]
+        if shared:
+            raise ValueError(
+                f"{shared} would be shared by every account, give them with trader_kwargs_factory")
+        self.credentials = credentials
+        self.trader_cls = trader_cls
+        self.max_workers = max_workers
+        self.api_factory = api_factory
+        self.trader_kwargs = trader_kwargs
+        self.trader_kwargs_factory = trader_kwargs_factory
+        self.traders: Dict[str, alpacaTrader] = {}
+        self._lock = threading.Lock()
+
+    def get_trader(self, credentials: AccountCredentials) -> alpacaTrader:
+        with self._lock:
+            trader = self.traders.get(credentials.name)  # type: ignore
+        if trader is None:
+            kwargs = dict(self.trader_kwargs)
+            if self.trader_kwargs_factory is not None:
+                kwargs.update(self.trader_kwargs_factory(credentials))
+            trader = self.trader_cls(  # type: ignore
+                api=self.api_factory(credentials), **kwargs)
+            with self._lock:
+                self.traders[credentials.name] = trader  # type: ignore
+        return trader
+
+    def have_portfolio(self, portfolio_dict: Dict[str, float]) -> MultiAccountResult:
+        """Change the state of every account's portfolio to reflect the given portfolio dict.
+
+        Args:
+            portfolio_dict (Dict[str, float]): ticker to equity % dictionary
+
+        Returns:
+            MultiAccountResult: ticker_results and time taken for each account,
+            and the error of each account that failed.
+        """
+        result = MultiAccountResult()
+
+        def rebalance(credentials: AccountCredentials):
+            start = time.perf_counter()
+            try:
+                trader = self.get_trader(credentials)
+                ticker_results = trader.have_portfolio(dict(portfolio_dict))
+                result.ticker_results[credentials.name] = ticker_results  # type: ignore
+            except Exception as e:
+                logger.exception("rebalance of %s failed", credentials.name)
+                result.errors[credentials.name] = repr(e)  # type: ignore
+            result.timings[credentials.name] = time.perf_counter() - start  # type: ignore
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(rebalance, self.credentials))
+        result.wall_time = time.perf_counter() - start
+        return result
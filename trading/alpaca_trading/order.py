@@ -1,18 +1,163 @@
-from typing import Union
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
 from dataclasses import dataclass
+import numpy as np
 
 
-@dataclass
+# phases in the order they are filled. closes and sells free up buying power for buys.
+PHASES = ('closes', 'sells', 'buys')
+
+
+@dataclass(slots=True)
 class Order:
     """Base order to store basic order information. 
     Equity for market orders, quantity for limit orders.
+    Price is the quote the order was planned at, if known.
     """
     ticker: str
     side: str
     equity: Union[float, None] = None
     quantity: Union[float, None] = None
     close_position: bool = False
+    price: Union[float, None] = None
 
     def __post_init__(self):
-        print(self)
         assert self.equity is not None or self.quantity is not None
+
+
+@dataclass(slots=True)
+class OrderBatch:
+    """Columnar batch of base orders, one row per order.
+    Equity is nan for quantity orders and quantity nan for equity orders.
+    Price, the quote each order was planned at, is nan when unknown.
+
+    Indexing with an int gives the Order of that row, and iterating gives the
+    Order of each row as it is reached, so a batch can be filled like a list of
+    orders without building one.
+    """
+    ticker: np.ndarray
+    side: np.ndarray
+    equity: np.ndarray
+    quantity: np.ndarray
+    close_position: np.ndarray
+    price: Optional[np.ndarray] = None
+
+    def __post_init__(self):
+        if self.price is None:
+            self.price = np.full(len(self.ticker), np.nan)
+
+    @classmethod
+    def from_orders(cls, orders: Iterable[Optional[Order]]) -> 'OrderBatch':
+        """Build a batch from Order objects, skipping None."""
+        orders = [order for order in orders if order is not None]
+        return cls(
+            ticker=np.array([order.ticker for order in orders], dtype=object),
+            side=np.array([order.side for order in orders], dtype=object),
+            equity=np.array([np.nan if order.equity is None else order.equity
+                             for order in orders], dtype=float),
+            quantity=np.array([np.nan if order.quantity is None else order.quantity
+                               for order in orders], dtype=float),
+            close_position=np.array([order.close_position for order in orders], dtype=bool),
+            price=np.array([np.nan if order.price is None else order.price
+                            for order in orders], dtype=float)
+        )
+
+    def __len__(self) -> int:
+        return len(self.ticker)
+
+    def __getitem__(self, i: int) -> Order:
+        equity = self.equity[i]
+        quantity = self.quantity[i]
+        price = self.price[i]  # type: ignore
+        return Order(
+            str(self.ticker[i]), str(self.side[i]),
+            equity=None if np.isnan(equity) else float(equity),
+            quantity=None if np.isnan(quantity) else float(quantity),
+            close_position=bool(self.close_position[i]),
+            price=None if np.isnan(price) else float(price))
+
+    def __iter__(self) -> Iterator[Order]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def rows(self) -> Iterator[Tuple[str, str, float, float, bool]]:
+        """Iterate over the (ticker, side, equity, quantity, close_position) rows
+        straight from the columns, without creating Order objects.
+        """
+        return zip(self.ticker, self.side, self.equity, self.quantity, self.close_position)
+
+    def to_orders(self) -> List[Order]:
+        """Get the batch as a list of Order objects, in row order."""
+        return list(self)
+
+    def take(self, rows: Union[slice, np.ndarray]) -> 'OrderBatch':
+        """Get the batch of the given rows. A slice gives views of the columns."""
+        return OrderBatch(self.ticker[rows], self.side[rows], self.equity[rows],
+                          self.quantity[rows], self.close_position[rows],
+                          self.price[rows])  # type: ignore
+
+    def phase_mask(self, *phases: str) -> np.ndarray:
+        """Get the mask of the rows in any of the given phases.
+
+        Args:
+            *phases (str): 'closes', 'sells' (sells that do not close the
+            position) and/or 'buys'.
+
+        Returns:
+            np.ndarray: bool mask, one value per row.
+        """
+        is_sell = self.side == 'sell'
+        masks = {
+            'closes': self.close_position,
+            'sells': is_sell & ~self.close_position,
+            'buys': self.side == 'buy',
+        }
+        mask = np.zeros(len(self), dtype=bool)
+        for phase in phases:
+            mask |= masks[phase]
+        return mask
+
+    def phase(self, *phases: str) -> 'OrderBatch':
+        """Get the orders of the given phases, in row order. When the rows are
+        contiguous, as they are for the planned batches (sells before buys),
+        the columns of the result are views and nothing is copied.
+
+        Args:
+            *phases (str): 'closes', 'sells' and/or 'buys'.
+
+        Returns:
+            OrderBatch: orders of the phases.
+        """
+        rows = np.flatnonzero(self.phase_mask(*phases))
+        if len(rows) == 0 or rows[-1] - rows[0] + 1 == len(rows):
+            start = int(rows[0]) if len(rows) else 0
+            return self.take(slice(start, start + len(rows)))
+        return self.take(rows)
+
+    def invalid_mask(self) -> np.ndarray:
+        """Get the mask of the rows that are not valid orders: an unknown side,
+        not exactly one of equity and quantity, a non positive amount (a 0 quantity
+        is allowed for closes), or a close on a buy.
+
+        Returns:
+            np.ndarray: bool mask, one value per row.
+        """
+        has_equity = ~np.isnan(self.equity)
+        has_quantity = ~np.isnan(self.quantity)
+        is_sell = self.side == 'sell'
+        with np.errstate(invalid='ignore'):
+            bad_amount = (has_equity & ~(self.equity > 0)) | \
+                (has_quantity & ~((self.quantity > 0) | (self.close_position & (self.quantity == 0))))
+        return ~(is_sell | (self.side == 'buy')) \
+            | (has_equity == has_quantity) \
+            | bad_amount \
+            | (self.close_position & ~is_sell)
+
+    def validate(self):
+        """Check every row is a valid order.
+
+        Raises:
+            ValueError: listing the tickers of the invalid orders.
+        """
+        invalid = self.invalid_mask()
+        if invalid.any():
+            raise ValueError(f"invalid orders: {list(self.ticker[invalid])}")
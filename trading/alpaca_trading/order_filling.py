@@ -1,21 +1,52 @@
-from alpaca_trade_api.rest import REST
-from alpaca_trade_api.entity import Order as orderEntity
-from TinyTitans.src.trading.alpaca_trading.order import Order
-from TinyTitans.src.trading.utils import alpaca_get_last_close
+from TinyTitans.src.trading.alpaca_trading.analytics import FillRecord, entity_fill
+from TinyTitans.src.trading.alpaca_trading.instrumentation import nullSink
+from TinyTitans.src.trading.alpaca_trading.journal import journaledOrder, nullJournal
+from TinyTitans.src.trading.alpaca_trading.order import Order, OrderBatch
+from TinyTitans.src.trading.alpaca_trading.order_updates import FINAL_STATUSES, orderStatusTracker
+from TinyTitans.src.trading.alpaca_trading.quotes import quoteCache
+from TinyTitans.src.trading.alpaca_trading.repricing import limitRepricer, get_new_limit_price
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union, TYPE_CHECKING
+import logging
+import math
+import numpy as np
+import threading
 import time
 
+if TYPE_CHECKING:
+    from alpaca_trade_api.entity import Order as orderEntity
+    from alpaca_trade_api.rest import REST
 
-def get_limit(ticker: str, side: str, api: REST) -> float:
+
+logger = logging.getLogger(__name__)
+
+
+def get_limit(ticker: str, side: str, quote_cache: quoteCache) -> float:
     """Get the limit price for a buy or sell limit order
 
     Args:
         ticker (str): ticker symbol
+        side (str): 'buy' or 'sell'
+        quote_cache (quoteCache): cache to get the last close from
 
     Returns:
         float: limit price
     """
     # modify to get the bid instead, perhaps.
-    last = alpaca_get_last_close(ticker, api)
+    last = quote_cache.get_last_close(ticker)
+    return limit_from_last(last, side)
+
+
+def limit_from_last(last: float, side: str) -> float:
+    """Get the limit price for a buy or sell limit order from the last close
+
+    Args:
+        last (float): last close
+        side (str): 'buy' or 'sell'
+
+    Returns:
+        float: limit price
+    """
     scaler = 0.015
     delta = (last*scaler) if side == 'buy' else -(last*scaler)
     limit = round(last + delta, 2)
@@ -24,8 +55,193 @@ def get_limit(ticker: str, side: str, api: REST) -> float:
 
 class orderFiller:
 
-    def __init__(self, api: REST):
+    def __init__(self, api: 'REST',
+                 status_tracker: Optional[orderStatusTracker] = None,
+                 quote_cache: Optional[quoteCache] = None,
+                 sink: Any = None,
+                 journal: Any = None):
         self.api = api
+        self.sink = sink if sink is not None else nullSink()
+        self.journal = journal if journal is not None else nullJournal()
+        self.status_tracker = status_tracker if status_tracker is not None \
+            else orderStatusTracker(api)
+        self.quote_cache = quote_cache if quote_cache is not None \
+            else quoteCache(api)
+        self.fill_records: List[FillRecord] = []
+        self._records_lock = threading.Lock()
+
+    def take_fill_records(self) -> List[FillRecord]:
+        """Get the fill records collected since the last call, and clear them."""
+        with self._records_lock:
+            records, self.fill_records = self.fill_records, []
+        return records
+
+    def _planned_price(self, order: Order) -> float:
+        """Get the price an order is measured against: its planned price, or the
+        cached quote when it is submitted if it was planned without one.
+        """
+        if order.price is not None:
+            return order.price
+        price = self.quote_cache.peek(order.ticker)
+        return math.nan if price is None else price
+
+    def _record_fill(self, order: Order, order_id: str, order_type: str, submitted_at: float,
+                     filled: bool, fill: Tuple[float, float],
+                     latency: Optional[float] = None, reprice_steps: int = 0,
+                     journal: bool = True, planned_price: Optional[float] = None):
+        """Collect the fill record of a base order, and journal the fill.
+
+        Args:
+            order (Order): base order
+            order_id (str): id of the last order entity of the base order
+            order_type (str): 'market', 'limit' or 'close'
+            submitted_at (float): time.time() of the submission
+            filled (bool): whether the order filled
+            fill (Tuple[float, float]): filled quantity and average fill price
+            latency (float, optional): seconds to fill. Defaults to None (unknown).
+            reprice_steps (int, optional): replacements made. Defaults to 0.
+            journal (bool, optional): journal the fill. Defaults to True, False when
+            the fills of the child orders were journaled instead.
+            planned_price (float, optional): price the fill is measured against.
+            Defaults to the order's price.
+        """
+        if planned_price is None:
+            planned_price = order.price
+        record = FillRecord(
+            ticker=order.ticker,
+            side=order.side,
+            order_type=order_type,
+            planned_price=math.nan if planned_price is None else planned_price,
+            fill_price=fill[1],
+            filled_quantity=fill[0],
+            requested_equity=math.nan if order.equity is None else order.equity,
+            requested_quantity=math.nan if order.quantity is None else order.quantity,
+            latency=latency if filled and latency is not None else math.nan,
+            filled=filled,
+            reprice_steps=reprice_steps,
+            submitted_at=submitted_at)
+        with self._records_lock:
+            self.fill_records.append(record)
+        if filled and journal:
+            self.journal.fill(order_id, fill[0], fill[1])
+
+    def fill_orders(self, orders: Union[OrderBatch, List[Union[Order, None]]],
+                    max_workers: int = 1, cash: Optional[float] = None) -> List[bool]:
+        """Fill orders in two phases, closes/sells and then buys, so that
+        the proceeds of the sells are available to the buys. Orders within a phase
+        are submitted together and tracked in parallel when max_workers > 1.
+        The limit orders of a phase are always submitted together and repriced
+        by one limitRepricer (see fill_limit_orders).
+
+        Args:
+            orders (Union[OrderBatch, List[Union[Order, None]]]): orders to fill,
+            as a batch (validated first) or a list with None for no order.
+            max_workers (int, optional): max orders filled at once. Defaults to 1,
+            which fills the other orders one at a time in list order.
+            cash (float, optional): cash available before the sells. If given (and
+            max_workers > 1), the phases are pipelined with fill_orders_pipelined
+            instead. Ignored when max_workers <= 1: every sell is then done before
+            the first buy, so there is no buying power to gate on. Defaults to None.
+
+        Returns:
+            List[bool]: True for each order that was filled (or None).
+        """
+        results = [True] * len(orders)
+        if isinstance(orders, OrderBatch):
+            orders.validate()
+            sells = np.flatnonzero(orders.phase_mask('closes', 'sells')).tolist()
+            buys = np.flatnonzero(orders.phase_mask('buys')).tolist()
+        else:
+            sells = [i for i, order in enumerate(orders)
+                     if order is not None and order.side == 'sell']
+            buys = [i for i, order in enumerate(orders)
+                    if order is not None and order.side != 'sell']
+
+        if max_workers > 1 and cash is not None:
+            return self.fill_orders_pipelined(orders, sells, buys, max_workers, cash)
+
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            for phase in (sells, buys):
+                # limit orders of the phase are worked together by one repricer.
+                limits = [i for i in phase if orders[i].equity is None]  # type: ignore
+                others = [i for i in phase if orders[i].equity is not None]  # type: ignore
+
+                futures = {}
+                if max_workers > 1:
+                    futures = {i: executor.submit(self.fill_order, orders[i]) for i in others}
+                else:
+                    for i in others:
+                        results[i] = self.fill_order(orders[i])  # type: ignore
+                if limits:
+                    limit_results = self.fill_limit_orders([orders[i] for i in limits])  # type: ignore
+                    for i, result in zip(limits, limit_results):
+                        results[i] = result
+                for i, future in futures.items():
+                    results[i] = future.result()
+        return results
+
+    def fill_orders_pipelined(self, orders: Union[OrderBatch, List[Union[Order, None]]],
+                              sells: List[int], buys: List[int],
+                              max_workers: int, cash: float) -> List[bool]:
+        """Fill the sells and buys at once, releasing each buy as soon as the
+        buying power covers its cost: the cash plus the proceeds of the sells
+        filled so far, less the cost of the buys already released. Buys that
+        the cash covers start with the sells. Once every sell is done, the
+        remaining buys are released regardless, as in the two phase fill.
+
+        Proceeds and costs are estimated from the planned orders: the notional,
+        or the quantity at the last close for sells and at the limit price for buys.
+        Limit orders are repriced by a limitRepricer of their own (see fill_limit_order).
+
+        Args:
+            orders (Union[OrderBatch, List[Union[Order, None]]]): orders to fill
+            sells (List[int]): indices of the closes/sells
+            buys (List[int]): indices of the buys, released in this order when
+            there is enough buying power, smaller buys going ahead of larger ones.
+            max_workers (int): max orders filled at once.
+            cash (float): cash available before the sells, nan if unknown.
+
+        Returns:
+            List[bool]: True for each order that was filled (or None).
+        """
+        results = [True] * len(orders)
+        available = 0.0 if math.isnan(cash) else max(cash, 0.0)
+        waiting = [(i, self._order_value(orders[i])) for i in buys]  # type: ignore
+        sells_left = len(sells)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self.fill_order, orders[i]): i  # type: ignore
+                       for i in sells}
+            while True:
+                released = []
+                for i, cost in waiting:
+                    if sells_left == 0 or cost <= available:
+                        available -= cost
+                        released.append(i)
+                        futures[executor.submit(self.fill_order, orders[i])] = i  # type: ignore
+                if released:
+                    waiting = [(i, cost) for i, cost in waiting if i not in released]
+                    self.sink.record('pipeline.released_buys', len(released),
+                                     sells_left=sells_left)
+                if not futures:
+                    break
+
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = futures.pop(future)
+                    results[i] = future.result()
+                    if orders[i].side == 'sell':  # type: ignore
+                        sells_left -= 1
+                        if results[i]:
+                            available += self._order_value(orders[i])  # type: ignore
+        return results
+
+    def _order_value(self, order: Order) -> float:
+        if order.equity is not None:
+            return order.equity
+        price = get_limit(order.ticker, 'buy', self.quote_cache) if order.side == 'buy' \
+            else self.quote_cache.get_last_close(order.ticker)
+        return order.quantity * price  # type: ignore
 
     def fill_order(self, order: Order) -> bool:
         """ Fill base order object
@@ -58,29 +274,56 @@ class orderFiller:
         Returns:
             bool: True if order is filled.
         """
+        planned_price = self._planned_price(order)
         if order.close_position == True:
-            self.api.close_position(order.ticker)
+            submitted_at = time.time()
+            order_entity = self.api.close_position(order.ticker)
+            self.journal.submit(order_entity.id, order.ticker, order.side, 'close')  # type: ignore
+            self._record_fill(order, order_entity.id, 'close', submitted_at, True,  # type: ignore
+                              entity_fill(order_entity), planned_price=planned_price)
             return True
         else:
             # Using notional market orders
             assert order.equity is not None
-            order_entity = self.api.submit_order(
-                symbol=order.ticker,
+            submitted_at = time.time()
+            start = time.perf_counter()
+            order_entity = self._submit_order(
+                order,
                 notional=order.equity,
-                side=order.side,
-                type='market',
-                time_in_force='day'
+                type='market'
             )
-            time.sleep(8)
-            order_entity = self.api.get_order(order_entity.id)  # type: ignore
-            assert order_entity is not None
-            return order_entity.status == "filled"
+            if order_entity is None:
+                return False
+            self.journal.submit(order_entity.id, order.ticker, order.side, 'market',  # type: ignore
+                                notional=order.equity)
+            status = self.status_tracker.wait(order_entity.id, timeout=8)  # type: ignore
+            latency = time.perf_counter() - start
+            if status == "filled":
+                self.sink.record('order.time_to_fill', latency, type='market')
+            self._record_fill(order, order_entity.id, 'market', submitted_at,  # type: ignore
+                              status == "filled",
+                              self.status_tracker.get_fill(order_entity.id), latency,  # type: ignore
+                              planned_price=planned_price)
+            return status == "filled"
+
+    def _submit_order(self, order: Order, **kwargs) -> Optional['orderEntity']:
+        """Submit a day order for <order>, None if the broker rejects a buy
+        for lack of buying power (e.g. the sells funding it have not filled).
+        """
+        try:
+            return self.api.submit_order(symbol=order.ticker, side=order.side,
+                                         time_in_force='day', **kwargs)
+        except Exception as e:
+            if 'insufficient buying power' not in str(e):
+                raise e
+            logger.warning("%s of %s rejected: %s", order.side, order.ticker, e)
+            return None
 
     def fill_limit_order(self, order: Order) -> bool:
         """Fill a limit base order using limit quantity orders from alpaca.
         Assumes it's possible a limit order might not be filled, and attempts
-        to fill the order if initially unsuccessful.
-
+        to fill the order if initially unsuccessful, as a batch of one
+        (see fill_limit_orders).
 
         Args:
             order (Order): Order object
@@ -88,32 +331,99 @@ class orderFiller:
         Returns:
             bool: True if order is filled.
         """
-        assert order.quantity is not None
-        print(f"initial order received: {order}")
-        order_entity = self.api.submit_order(
-            symbol=order.ticker,
-            time_in_force='day',
-            side=order.side,
-            type='limit',
-            limit_price=str(get_limit(order.ticker, order.side, self.api)),
-            qty=order.quantity
-        )
-        time.sleep(10)
-        order_entity = self.api.get_order(order_entity.id)  # type: ignore
-        assert order_entity is not None
-        if order_entity.status != 'filled':
-            return self.attempt_to_fill_limit_order(order_entity)
-        else:
-            return True
+        return self.fill_limit_orders([order])[0]
+
+    def fill_limit_orders(self, orders: List[Order],
+                          max_limit_scaler: float = 0.04,
+                          increase_increment: float = 0.005,
+                          jitter: float = 10,
+                          timeout: Optional[float] = None,
+                          cancel_on_fail: bool = True) -> List[bool]:
+        """Fill many limit base orders at once. All the orders are submitted together,
+        and the ones not filled within the first wait are repriced together
+        by a limitRepricer.
+
+        Args:
+            orders (List[Order]): limit Order objects
+            max_limit_scaler (float, optional): max increase to the limit price
+            while attempting to fill, before giving up. Defaults to 0.04.
+            increase_increment (float, optional): proportion by which to
+            incrementally increase the limit. Defaults to 0.005.
+            jitter (float, optional): Time between repricing steps. Defaults to 10.
+            timeout (float, optional): seconds each order is repriced for before
+            giving up. Defaults to None (until max_limit_scaler is reached).
+            cancel_on_fail (bool, optional): Cancel order if unsuccessful in filling.
+            Defaults to True.
 
-    def attempt_to_fill_limit_order(self, order_entity: orderEntity,
+        Returns:
+            List[bool]: True for each order that is filled.
+        """
+        submitted_at = time.time()
+        start = time.perf_counter()
+        order_entities = []
+        planned_prices = []
+        submitted = []
+        for i, order in enumerate(orders):
+            assert order.quantity is not None
+            planned_price = self._planned_price(order)
+            limit_price = get_limit(order.ticker, order.side, self.quote_cache)
+            order_entity = self._submit_order(
+                order,
+                type='limit',
+                limit_price=str(limit_price),
+                qty=order.quantity
+            )
+            if order_entity is None:
+                continue
+            self.journal.submit(order_entity.id, order.ticker, order.side, 'limit',  # type: ignore
+                                quantity=order.quantity, price=limit_price)
+            order_entities.append(order_entity)
+            planned_prices.append(planned_price)
+            submitted.append(i)
+        order_by_id = {order_entity.id: orders[i]
+                       for order_entity, i in zip(order_entities, submitted)}
+        planned_by_id = {order_entity.id: price
+                         for order_entity, price in zip(order_entities, planned_prices)}
+
+        repricer = limitRepricer(self.api, max_limit_scaler, increase_increment,
+                                 jitter, timeout, cancel_on_fail, self.sink, self.journal)
+        deadline = time.monotonic() + 10
+        results = {}
+        for order_entity in order_entities:
+            remaining = max(deadline - time.monotonic(), 0)
+            status = self.status_tracker.wait(order_entity.id, timeout=remaining)  # type: ignore
+            if status == 'filled':
+                results[order_entity.id] = True
+                latency = time.perf_counter() - start
+                self.sink.record('order.time_to_fill', latency, type='limit')
+                self._record_fill(order_by_id[order_entity.id], order_entity.id,  # type: ignore
+                                  'limit', submitted_at, True,
+                                  self.status_tracker.get_fill(order_entity.id), latency,  # type: ignore
+                                  planned_price=planned_by_id[order_entity.id])
+            else:
+                repricer.add(order_entity, submitted=start)
+
+        results.update(repricer.run())
+        for order_id, w in repricer.working.items():
+            latency = None if w.filled_at is None else w.filled_at - start
+            self._record_fill(order_by_id[order_id], w.order_entity.id,  # type: ignore
+                              'limit', submitted_at, bool(w.is_filled),
+                              entity_fill(w.order_entity), latency, w.reprice_steps,
+                              planned_price=planned_by_id[order_id])
+        # orders rejected on submission are not filled.
+        filled = [False] * len(orders)
+        for i, order_entity in zip(submitted, order_entities):
+            filled[i] = results[order_entity.id]
+        return filled
+
+    def attempt_to_fill_limit_order(self, order_entity: 'orderEntity',
                                     max_limit_scaler: float = 0.04,
                                     increase_increment: float = 0.005,
                                     jitter: float = 10,
                                     cancel_on_fail: bool = True) -> bool:
         """For a given limit order, attempt to adjust the limit price incrementally
         so as to hopefully fill the order, replacing as necessary, until the order fills
-        or the limit threshold is met.
+        or the limit threshold is met. The order is worked by a limitRepricer.
 
         Args:
             order_entity (orderEntity): _description_
@@ -121,7 +431,7 @@ class orderFiller:
             while attempting to fill, before giving up. Defaults to 0.04.
             increase_increment (float, optional): proportion by which to 
             incrementally increase the limit. Defaults to 0.005.
-            jitter (float, optional): Time to wait for the order to fill 
+            jitter (float, optional): Max time to wait for the order to fill 
             before adjusting limit price.. Defaults to 10.
             cancel_on_fail (bool, optional): Cancel order if unsuccessful in filling. Defaults to True.
 
@@ -131,58 +441,198 @@ class orderFiller:
         Returns:
             bool: True if order is successfully filled following the attempt.
         """
-        print(f"attempting to fill order: {order_entity}")
-        # assumed input is the initial order for the desired position
-        print(f"desired quantity: {order_entity.qty}")
-
-        order_entity = self.api.get_order(order_entity.id)  # type: ignore
-        if order_entity.status != 'filled':
-            print(
-                f"desired qty < current_qty: {order_entity.qty}, {order_entity.filled_qty}")
-
-            attempting_to_fill = True
-            is_filled = False
-            current_scaler = 0
-
-            while attempting_to_fill:
-                current_scaler += increase_increment
-                new_limit_price = self._get_new_limit_price(
-                    order_entity, current_scaler)
-
-                if new_limit_price == order_entity.limit_price:
-                    # continue if increase resulted in no change to limit.
-                    continue
-
-                try:
-                    order_entity = self.api.replace_order(
-                        order_id=order_entity.id,  # type: ignore
-                        limit_price=new_limit_price
-                    )
-                except Exception as e:
-                    if 'order is not open' in str(e):
-                        is_filled = True
-                        break
-                    else:
-                        raise e
+        repricer = limitRepricer(self.api, max_limit_scaler, increase_increment, jitter,
+                                 cancel_on_fail=cancel_on_fail, sink=self.sink,
+                                 journal=self.journal)
+        repricer.add(order_entity)
+        return repricer.run()[order_entity.id]  # type: ignore
+
+    def cancel_open_orders(self, tickers: Optional[Iterable[str]] = None,
+                           max_workers: int = 8):
+        """Cancel the open orders of <tickers>, found with one list_orders call
+        and cancelled in parallel. Without tickers, every open order of the
+        account is cancelled with one cancel_all_orders call.
 
-                print(f"new order: {order_entity}")
-                time.sleep(jitter)
+        Args:
+            tickers (Iterable[str], optional): tickers whose open orders are cancelled.
+            Defaults to None (every open order).
+            max_workers (int, optional): max cancel_order calls at once. Defaults to 8.
+        """
+        if tickers is None:
+            self.api.cancel_all_orders()
+            return
+        tickers = set(tickers)
+        order_ids = [order_entity.id
+                     for order_entity in self.api.list_orders(status='open', limit=500)
+                     if order_entity.symbol in tickers]
+        if not order_ids:
+            return
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(self._cancel_open_order, order_ids))
+
+    def _cancel_open_order(self, order_id: str):
+        try:
+            self.api.cancel_order(order_id)
+            self.journal.cancel(order_id)
+        except Exception as e:
+            if 'order is not open' not in str(e):
+                raise e
+
+    def liquidate(self, tickers: List[str], close_all: bool = False,
+                  max_workers: int = 8, timeout: float = 10,
+                  cancel_tickers: Optional[Iterable[str]] = None) -> Dict[str, Optional[str]]:
+        """Cancel the open orders of <cancel_tickers> (see cancel_open_orders), then
+        close the positions of <tickers> together: with one close_all_positions call
+        if <close_all>, else with close_position calls in parallel. Then wait for
+        the close orders to fill.
 
-                print(f"filled qty: {order_entity.filled_qty}")
-                is_filled = order_entity.status == 'filled'
+        Args:
+            tickers (List[str]): tickers whose positions are closed
+            close_all (bool, optional): <tickers> are every position, close them
+            with one call. Defaults to False.
+            max_workers (int, optional): max close_position calls at once. Defaults to 8.
+            timeout (float, optional): seconds to wait for the closes to fill.
+            Defaults to 10.
+            cancel_tickers (Iterable[str], optional): tickers whose open orders are
+            cancelled first. Defaults to None, which cancels every open order.
 
-                print(f" is filled: {is_filled}")
-                attempting_to_fill = not is_filled and current_scaler <= max_limit_scaler
+        Returns:
+            Dict[str, Optional[str]]: ticker to the status of its close order when
+            the wait ended, None if no close order was submitted. A close that is
+            not in a final status is still working, and may yet fill. It gets no
+            fill record.
+        """
+        self.cancel_open_orders(cancel_tickers, max_workers)
+        if not tickers:
+            return {}
+
+        quotes = {ticker: self.quote_cache.peek(ticker) for ticker in tickers}
+        submitted_at = time.time()
+        start = time.perf_counter()
+        closes: Dict[str, Tuple[str, str, Any]] = {}  # ticker to order id, side and quantity
+        if close_all:
+            for response in self.api.close_all_positions():
+                body = getattr(response, 'body', None) or {}
+                if 'id' not in body:
+                    logger.warning("failed to close %s: %s", response.symbol, body)
+                    continue
+                self.status_tracker.update(body['id'], body.get('status', 'new'),
+                                           body.get('filled_qty'), body.get('filled_avg_price'))
+                closes[response.symbol] = (body['id'], body.get('side', 'sell'), body.get('qty'))
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                order_entities = list(executor.map(self._close_position, tickers))
+            for ticker, order_entity in zip(tickers, order_entities):
+                if order_entity is None:
+                    continue
+                self.status_tracker.track(order_entity)
+                closes[ticker] = (order_entity.id, order_entity.side, order_entity.qty)  # type: ignore
+
+        for ticker, (order_id, side, _) in closes.items():
+            self.journal.submit(order_id, ticker, side, 'close')
+
+        deadline = time.monotonic() + timeout
+        results: Dict[str, Optional[str]] = {ticker: None for ticker in tickers}
+        for ticker, (order_id, side, qty) in closes.items():
+            remaining = max(deadline - time.monotonic(), 0)
+            status = self.status_tracker.wait(order_id, timeout=remaining)
+            latency = time.perf_counter() - start
+            results[ticker] = status or 'new'
+            if status not in FINAL_STATUSES:
+                logger.warning("close of %s still working after %ss", ticker, timeout)
+                continue
+            if status == 'filled':
+                self.sink.record('order.time_to_fill', latency, type='close')
+            order = Order(ticker, side, quantity=math.nan if qty is None else float(qty),
+                          close_position=True)
+            self._record_fill(order, order_id, 'close', submitted_at, status == 'filled',
+                              self.status_tracker.get_fill(order_id), latency,
+                              planned_price=quotes.get(ticker))
+        return results
+
+    def _close_position(self, ticker: str, attempts: int = 3,
+                        delay: float = 0.5) -> Optional['orderEntity']:
+        """Close a position, retrying while the cancels of its open orders have
+        not released the held quantity yet. None if it could not be closed.
+        """
+        for attempt in range(attempts):
+            try:
+                return self.api.close_position(ticker)
+            except Exception as e:
+                if 'position does not exist' in str(e) or attempt == attempts - 1:
+                    logger.warning("failed to close %s: %s", ticker, e)
+                    return None
+                time.sleep(delay)
+        return None
+
+    def resume(self, in_flight: List[journaledOrder],
+               jitter: float = 10, timeout: Optional[float] = None) -> Dict[str, bool]:
+        """Settle the orders an interrupted rebalance left working, as replayed
+        from the journal. Filled orders are journaled as filled, open limit orders
+        are repriced as usual, and open market orders are waited on, then cancelled.
 
-            if cancel_on_fail and not is_filled:
-                self.api.cancel_order(order_entity.id)  # type: ignore
+        Args:
+            in_flight (List[journaledOrder]): orders from executionJournal.in_flight()
+            jitter (float, optional): Time between repricing steps. Defaults to 10.
+            timeout (float, optional): seconds each limit order is repriced for
+            before giving up. Defaults to None (until the max limit is reached).
 
-            return is_filled
-        else:
-            return True
+        Returns:
+            Dict[str, bool]: ticker to True if its order filled.
+        """
+        by_id = {order.order_id: order for order in in_flight}
+        entities = {order_entity.id: order_entity for order_entity in self.api.list_orders(
+            status='all', limit=500, direction='desc') if order_entity.id in by_id}
+        for order_id in by_id.keys() - entities.keys():
+            entities[order_id] = self.api.get_order(order_id)
+
+        repricer = limitRepricer(self.api, jitter=jitter, timeout=timeout,
+                                 sink=self.sink, journal=self.journal)
+        results = {}
+        for order_id, order in by_id.items():
+            order_entity = entities[order_id]
+            # a replacement made right before the interruption may not be journaled.
+            while order_entity.status == 'replaced' and \
+                    getattr(order_entity, 'replaced_by', None):
+                replaced_id = order_entity.id
+                order_entity = self.api.get_order(order_entity.replaced_by)
+                self.journal.replace(order_entity.id, replaced_id,  # type: ignore
+                                     float(order_entity.limit_price or 'nan'))
+
+            if order_entity.status == 'filled':
+                self.journal.fill(order_entity.id, *entity_fill(order_entity))  # type: ignore
+                results[order.ticker] = True
+            elif order_entity.status in FINAL_STATUSES:
+                self.journal.cancel(order_entity.id)  # type: ignore
+                results[order.ticker] = False
+            elif order.order_type == 'limit':
+                repricer.add(order_entity, order_id=order_id)
+            else:
+                status = self.status_tracker.wait(order_entity.id, timeout=8)  # type: ignore
+                if status != 'filled':
+                    try:
+                        self.api.cancel_order(order_entity.id)  # type: ignore
+                    except Exception as e:
+                        if 'order is not open' not in str(e):
+                            raise e
+                        status = self.api.get_order(order_entity.id).status  # type: ignore
+                if status == 'filled':
+                    self.journal.fill(order_entity.id,  # type: ignore
+                                      *self.status_tracker.get_fill(order_entity.id))  # type: ignore
+                else:
+                    self.journal.cancel(order_entity.id)  # type: ignore
+                results[order.ticker] = status == 'filled'
+
+        for order_id, is_filled in repricer.run().items():
+            order_entity = repricer.working[order_id].order_entity
+            if is_filled:
+                self.journal.fill(order_entity.id, *entity_fill(order_entity))  # type: ignore
+            results[by_id[order_id].ticker] = is_filled
+        logger.info("resumed %d in flight orders: %s", len(in_flight), results)
+        return results
 
     @staticmethod
-    def _get_new_limit_price(order_entity: orderEntity, current_scaler: float) -> str:
+    def _get_new_limit_price(order_entity: 'orderEntity', current_scaler: float) -> str:
         """Get an adjusted limit price for an order entity, increased or decreased depending
         on the order side.
 
@@ -193,13 +643,4 @@ class orderFiller:
         Returns:
             str: a string of the new limit price
         """
-        limit_price = float(order_entity.limit_price)
-        
-        delta = (
-            limit_price * current_scaler  # type: ignore
-            if order_entity.side == 'buy'
-            else - limit_price * current_scaler  # type: ignore
-        )
-
-        new_limit_price = str(round(limit_price + delta, 2))  # type: ignore
-        return new_limit_price
+        return get_new_limit_price(order_entity, current_scaler)
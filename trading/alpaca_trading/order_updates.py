@@ -0,0 +1,276 @@
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, Dict, Optional, Tuple, TYPE_CHECKING
+import asyncio
+import logging
+import math
+import threading
+import time
+
+if TYPE_CHECKING:
+    from alpaca_trade_api.rest import REST
+
+
+logger = logging.getLogger(__name__)
+
+
+# statuses after which an order will not fill any further.
+FINAL_STATUSES = {'filled', 'canceled', 'expired', 'rejected',
+                  'replaced', 'done_for_day', 'stopped', 'suspended'}
+
+
+class orderStatusTracker:
+    """Track the status of submitted orders from the trade_updates stream,
+    waking up waiters as soon as an order reaches a final status.
+
+    While the stream is not connected, statuses are refreshed by polling,
+    with one list_orders call shared by every order being waited on. The
+    stream only counts as connected while it reports the orders being tracked,
+    so a stream stuck connecting or quietly dropped falls back to polling.
+
+    Orders that reached a final status are kept for their fills to be read,
+    and evicted once more than <keep_final> final orders are kept.
+    """
+
+    def __init__(self, api: 'REST', stream: Any = None, poll_interval: float = 1.0,
+                 stream_grace: float = 2.0, keep_final: int = 1000):
+        """Create the tracker. Call start() to begin consuming the stream.
+
+        Args:
+            api (REST): alpaca api, used for polling.
+            stream (Any, optional): trade update stream, alpaca_trade_api.stream.Stream
+            or localTradeUpdateStream. Defaults to None (polling only).
+            poll_interval (float, optional): min seconds between polls. Defaults to 1.0.
+            stream_grace (float, optional): seconds the stream has to report an order
+            being tracked before it is no longer trusted and the tracker polls.
+            Defaults to 2.0.
+            keep_final (int, optional): orders in a final status kept before the
+            oldest are evicted. Defaults to 1000.
+        """
+        self.api = api
+        self.stream = stream
+        self.poll_interval = poll_interval
+        self.stream_grace = stream_grace
+        self.keep_final = keep_final
+
+        self._tracked_since: Dict[str, float] = {}  # pending order id to time.monotonic()
+        self._streamed = set()  # ids of the orders the stream reported
+        self._final: 'OrderedDict[str, None]' = OrderedDict()
+        self._statuses: Dict[str, str] = {}
+        self._fills: Dict[str, Tuple[Any, Any]] = {}
+        self._events: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._last_poll = 0.0
+        self._polled = set()
+        self._stream_thread: Optional[threading.Thread] = None
+        self._stream_running = False
+
+    @property
+    def stream_connected(self) -> bool:
+        """Whether the stream is running and has reported every pending order
+        tracked for longer than stream_grace.
+        """
+        if not self._stream_running:
+            return False
+        cutoff = time.monotonic() - self.stream_grace
+        with self._lock:
+            return all(order_id in self._streamed
+                       for order_id, since in self._tracked_since.items() if since < cutoff)
+
+    def start(self):
+        """Subscribe to trade updates and run the stream in a background thread."""
+        if self.stream is None or self._stream_running:
+            return
+        self.stream.subscribe_trade_updates(self._on_trade_update)
+        self._stream_running = True
+        self._stream_thread = threading.Thread(target=self._run_stream, daemon=True)
+        self._stream_thread.start()
+
+    def stop(self):
+        if self.stream is not None and self._stream_running:
+            self.stream.stop()
+        self._stream_running = False
+
+    def _run_stream(self):
+        try:
+            self.stream.run()  # type: ignore
+        except Exception as e:
+            logger.warning("trade update stream stopped, polling instead: %s", e)
+        finally:
+            self._stream_running = False
+
+    async def _on_trade_update(self, data):
+        with self._lock:
+            self._streamed.add(data.order['id'])
+        self.update(data.order['id'], data.order['status'],
+                    data.order.get('filled_qty'), data.order.get('filled_avg_price'))
+
+    def update(self, order_id: str, status: str,
+               filled_qty: Any = None, filled_avg_price: Any = None):
+        """Record the latest status of an order, waking any waiters
+        if the status is final.
+
+        Args:
+            order_id (str): order id
+            status (str): order status
+            filled_qty (Any, optional): filled quantity, if known.
+            filled_avg_price (Any, optional): average fill price, if known.
+        """
+        with self._lock:
+            self._statuses[order_id] = status
+            if filled_qty is not None:
+                self._fills[order_id] = (filled_qty, filled_avg_price)
+            event = self._events.setdefault(order_id, threading.Event())
+            if status in FINAL_STATUSES:
+                self._tracked_since.pop(order_id, None)
+                self._final[order_id] = None
+                self._final.move_to_end(order_id)
+                while len(self._final) > self.keep_final:
+                    self._evict(self._final.popitem(last=False)[0])
+            else:
+                self._tracked_since.setdefault(order_id, time.monotonic())
+        if status in FINAL_STATUSES:
+            event.set()
+
+    def _evict(self, order_id: str):
+        self._statuses.pop(order_id, None)
+        self._fills.pop(order_id, None)
+        self._events.pop(order_id, None)
+        self._tracked_since.pop(order_id, None)
+        self._streamed.discard(order_id)
+
+    def track(self, order_entity: Any):
+        """Track a submitted order without waiting on it. Its status is then
+        refreshed by the stream, or by poll() along with the waited on orders.
+        """
+        self._update_from_entity(order_entity)
+
+    def forget(self, order_id: str):
+        with self._lock:
+            self._evict(order_id)
+            self._final.pop(order_id, None)
+
+    def get_status(self, order_id: str) -> Optional[str]:
+        return self._statuses.get(order_id)
+
+    def get_fill(self, order_id: str) -> Tuple[float, float]:
+        """Get the latest known (filled quantity, average fill price) of an order,
+        nan when unknown.
+        """
+        filled_qty, filled_avg_price = self._fills.get(order_id, (None, None))
+        return (math.nan if filled_qty is None else float(filled_qty),
+                math.nan if filled_avg_price is None else float(filled_avg_price))
+
+    def wait(self, order_id: str, timeout: float) -> Optional[str]:
+        """Wait for an order to reach a final status, or for the timeout to pass.
+
+        Args:
+            order_id (str): order id
+            timeout (float): max seconds to wait
+
+        Returns:
+            Optional[str]: latest known status of the order.
+        """
+        with self._lock:
+            event = self._events.setdefault(order_id, threading.Event())
+            if order_id not in self._final:
+                self._tracked_since.setdefault(order_id, time.monotonic())
+
+        deadline = time.monotonic() + timeout
+        while not event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not self.stream_connected:
+                self.poll()
+            # the stream is checked again each interval, in case it stops reporting.
+            event.wait(min(remaining, self.poll_interval))
+
+        if not event.is_set():
+            self.poll(force=True)
+        return self.get_status(order_id)
+
+    def poll(self, force: bool = False):
+        """Refresh the status of every order being waited on with one
+        list_orders call. Orders not in the recent order list are fetched
+        individually.
+
+        Args:
+            force (bool, optional): poll even if the last poll was within
+            the poll interval. Defaults to False. Orders that have not been
+            polled yet are always polled for.
+        """
+        with self._poll_lock:
+            with self._lock:
+                pending = {order_id for order_id, event in self._events.items()
+                           if not event.is_set()}
+            if not pending:
+                return
+            recently_polled = time.monotonic() - self._last_poll < self.poll_interval
+            if not force and recently_polled and pending <= self._polled:
+                return
+            self._last_poll = time.monotonic()
+            self._polled = set(pending)
+
+            for order_entity in self.api.list_orders(status='all', limit=500, direction='desc'):
+                if order_entity.id in pending:
+                    self._update_from_entity(order_entity)
+                    pending.discard(order_entity.id)
+
+            for order_id in pending:
+                self._update_from_entity(self.api.get_order(order_id))
+
+    def _update_from_entity(self, order_entity):
+        self.update(order_entity.id, order_entity.status,
+                    getattr(order_entity, 'filled_qty', None),
+                    getattr(order_entity, 'filled_avg_price', None))
+
+
+class localTradeUpdateStream:
+    """Local stand-in for the alpaca trade_updates stream, for running the
+    order filler without the broker. Events are published with publish()
+    and delivered to the subscribed handler on the stream's own event loop.
+    """
+
+    def __init__(self):
+        self._handler = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self.running = False
+
+    def subscribe_trade_updates(self, handler):
+        self._handler = handler
+
+    def run(self):
+        asyncio.run(self._run())
+
+    async def _run(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self.running = True
+        try:
+            while True:
+                data = await self._queue.get()
+                if data is None:
+                    break
+                if self._handler is not None:
+                    await self._handler(data)
+        finally:
+            self.running = False
+
+    def publish(self, order: Dict[str, Any], event: Optional[str] = None):
+        """Publish a trade update for an order. Dropped if the stream is not running.
+
+        Args:
+            order (Dict[str, Any]): raw order, with at least 'id' and 'status'
+            event (str, optional): event name. Defaults to the order status.
+        """
+        if not self.running:
+            return
+        data = SimpleNamespace(event=event or order['status'], order=order)
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, data)  # type: ignore
+
+    def stop(self):
+        if self.running:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, None)  # type: ignore
@@ -0,0 +1,60 @@
+from typing import Optional, Sequence
+from .order import OrderBatch
+import numpy as np
+
+
+def plan_orders(tickers: Sequence[str],
+                current_equity: Sequence[float],
+                target_weights: Sequence[float],
+                account_equity: float,
+                prices: Optional[Sequence[float]] = None,
+                planned_prices: Optional[Sequence[float]] = None) -> OrderBatch:
+    """Plan the orders that take every position from its current equity to its
+    target weight of the account, in one vectorized pass.
+
+    Without prices, notional (equity) orders are planned, as the market trader uses.
+    With prices, whole share quantity orders are planned, as the limit trader uses,
+    and orders that round down to 0 shares are dropped unless they close a position.
+
+    Args:
+        tickers (Sequence[str]): ticker symbols
+        current_equity (Sequence[float]): current position equity of each ticker
+        target_weights (Sequence[float]): desired proportion of the account (0-1)
+        account_equity (float): account equity
+        prices (Sequence[float], optional): price of each ticker. Defaults to None.
+        planned_prices (Sequence[float], optional): quote of each ticker, kept as
+        the price of its order to measure the fill against. Defaults to prices.
+
+    Returns:
+        OrderBatch: orders to place, in input order. Tickers already at their
+        target have no order.
+    """
+    tickers = np.asarray(tickers, dtype=object)
+    if planned_prices is None:
+        planned_prices = prices if prices is not None else np.full(len(tickers), np.nan)
+    planned_prices = np.asarray(planned_prices, dtype=float)
+    current_equity = np.asarray(current_equity, dtype=float)
+    desired_equity = np.asarray(target_weights, dtype=float) * account_equity
+
+    equity_diff = desired_equity - current_equity
+    is_sell = equity_diff < 0
+    side = np.where(is_sell, 'sell', 'buy').astype(object)
+    close_position = is_sell & (desired_equity == 0)
+
+    if prices is None:
+        equity = np.abs(equity_diff)
+        quantity = np.full(len(tickers), np.nan)
+        keep = equity_diff != 0
+    else:
+        quantity = np.floor(np.abs(equity_diff) / np.asarray(prices, dtype=float))
+        equity = np.full(len(tickers), np.nan)
+        keep = (equity_diff != 0) & ((quantity != 0) | close_position)
+
+    return OrderBatch(
+        ticker=tickers[keep],
+        side=side[keep],
+        equity=equity[keep],
+        quantity=quantity[keep],
+        close_position=close_position[keep],
+        price=planned_prices[keep]
+    )
@@ -0,0 +1,144 @@
+from TinyTitans.src.trading.utils import alpaca_get_last_close
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple, TYPE_CHECKING
+import math
+import re
+import threading
+import time
+
+if TYPE_CHECKING:
+    from alpaca_trade_api.rest import REST
+
+
+def bar_time(bar: Any) -> float:
+    """Get the time of a bar, as a unix timestamp.
+
+    Args:
+        bar (Any): bar entity, whose 't' is an RFC 3339 string (nanoseconds allowed)
+        or a datetime.
+
+    Returns:
+        float: seconds since the epoch, nan if the bar has no time.
+    """
+    raw = getattr(bar, '_raw', None)
+    value = raw.get('t') if isinstance(raw, dict) else getattr(bar, 't', None)
+    if value is None:
+        return math.nan
+    if not isinstance(value, str):
+        return value.timestamp()
+    # fromisoformat takes at most microseconds.
+    match = re.match(r'(.*T[\d:]+)(\.\d+)?(.*)$', value)
+    if match is None:
+        return math.nan
+    head, fraction, zone = match.groups()
+    zone = '+00:00' if zone in ('', 'Z') else zone
+    return datetime.fromisoformat(head + (fraction or '')[:7] + zone).timestamp()
+
+
+class quoteCache:
+    """Last close cache shared by the trader and the order filler, so a ticker's
+    price is fetched once per rebalance rather than once per call site.
+    Entries expire after <ttl> seconds and the least recently used entries
+    are evicted past <maxsize>. The time of the bar each close came from is
+    kept too, to tell how recent the quote is (see quote_time).
+    """
+
+    def __init__(self, api: 'REST', ttl: float = 30.0, maxsize: int = 2048):
+        self.api = api
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+
+        # ticker to expiry, last close and bar time.
+        self._entries: 'OrderedDict[str, Tuple[float, float, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_last_close(self, ticker: str) -> float:
+        """Get the last minute close of a ticker, from the cache if fresh.
+
+        Args:
+            ticker (str): ticker symbol
+
+        Returns:
+            float: last close
+        """
+        with self._lock:
+            entry = self._entries.get(ticker)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(ticker)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        last = alpaca_get_last_close(ticker, self.api)
+        self.put(ticker, last)
+        return last
+
+    def load_latest_bar(self, ticker: str) -> Tuple[float, float]:
+        """Fetch the latest bar of a ticker into the cache.
+
+        Returns:
+            Tuple[float, float]: its close and time (see bar_time).
+        """
+        bar = self.api.get_latest_bar(ticker)
+        last, at = float(bar.c), bar_time(bar)
+        self.put(ticker, last, at)
+        return last, at
+
+    def quote_time(self, ticker: str) -> float:
+        """Get the time of the bar the cached close of a ticker came from,
+        nan if unknown.
+        """
+        with self._lock:
+            entry = self._entries.get(ticker)
+        return math.nan if entry is None else entry[2]
+
+    def peek(self, ticker: str) -> Optional[float]:
+        """Get the cached last close of a ticker, even if stale, without fetching it."""
+        with self._lock:
+            entry = self._entries.get(ticker)
+        return None if entry is None else entry[1]
+
+    def put(self, ticker: str, last: float, at: float = math.nan):
+        with self._lock:
+            self._entries[ticker] = (time.monotonic() + self.ttl, last, at)
+            self._entries.move_to_end(ticker)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def prefetch(self, tickers: Iterable[str]) -> Dict[str, float]:
+        """Load the last close of every ticker with one multi-symbol snapshot request.
+        Tickers without a minute bar are left to be fetched individually.
+
+        Args:
+            tickers (Iterable[str]): ticker symbols
+
+        Returns:
+            Dict[str, float]: ticker to last close, for the tickers loaded.
+        """
+        tickers = list(tickers)
+        if not tickers:
+            return {}
+
+        snapshots = self.api.get_snapshots(tickers)
+        closes = {}
+        for ticker, snapshot in snapshots.items():
+            if snapshot is None or snapshot.minute_bar is None:
+                continue
+            closes[ticker] = float(snapshot.minute_bar.c)
+            self.put(ticker, closes[ticker], bar_time(snapshot.minute_bar))
+        return closes
+
+    def invalidate(self, ticker: str):
+        with self._lock:
+            self._entries.pop(ticker, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
@@ -0,0 +1,170 @@
+from .instrumentation import nullSink
+from concurrent.futures import Future
+from itertools import count
+from typing import Any, Dict, Optional
+import heapq
+import threading
+import time
+
+
+# lower goes first: order changes, then status polls, then everything else.
+PRIORITIES = {
+    'submit_order': 0,
+    'replace_order': 0,
+    'cancel_order': 0,
+    'cancel_all_orders': 0,
+    'close_position': 0,
+    'close_all_positions': 0,
+    'get_order': 1,
+    'list_orders': 1,
+}
+DEFAULT_PRIORITY = 2
+
+# reads that can share the result of an identical call already in flight.
+COALESCED = {'get_order', 'list_orders', 'get_account', 'list_positions',
+             'get_position', 'get_latest_bar', 'get_snapshots', 'list_assets',
+             'get_calendar'}
+
+
+def is_rate_limited(e: Exception) -> bool:
+    status_code = getattr(e, 'status_code', None)
+    if status_code is None and getattr(e, 'response', None) is not None:
+        status_code = getattr(e.response, 'status_code', None)  # type: ignore
+    return status_code == 429
+
+
+class tokenBucket:
+    """Token bucket handing out tokens by priority, then arrival order."""
+
+    def __init__(self, rate: float, capacity: float):
+        """Create a full bucket.
+
+        Args:
+            rate (float): tokens added per second.
+            capacity (float): max tokens held, i.e. the largest burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters: list = []
+        self._seq = count()
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority: int = DEFAULT_PRIORITY):
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if self._waiters[0] == ticket:
+                    if now >= self._paused_until and self.tokens >= 1:
+                        heapq.heappop(self._waiters)
+                        self.tokens -= 1
+                        self._cond.notify_all()
+                        return
+                    wait = max(self._paused_until - now, (1 - self.tokens) / self.rate)
+                    self._cond.wait(timeout=max(wait, 0.001))
+                else:
+                    self._cond.wait()
+
+    def pause(self, seconds: float):
+        """Hand out no tokens for <seconds>, and empty the bucket."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self.tokens = 0
+            self._cond.notify_all()
+
+
+class rateLimitedAPI:
+    """Proxy over a broker api that keeps requests within the broker's request budget.
+
+    Every call takes a token from a shared bucket, with order submissions and
+    cancels served before status polls, and status polls before other reads.
+    Identical reads already in flight are coalesced into one request, and a 429
+    response pauses the bucket and retries the call with exponential backoff.
+    """
+
+    def __init__(self, api: Any,
+                 requests_per_minute: float = 200,
+                 burst: Optional[float] = None,
+                 max_retries: int = 5,
+                 backoff: float = 1.0,
+                 sink: Any = None):
+        """Wrap an api.
+
+        Args:
+            api (Any): broker api
+            requests_per_minute (float, optional): sustained request budget. Defaults
+            to 200, alpaca's limit.
+            burst (float, optional): max requests made at once after being idle.
+            Defaults to a tenth of a minute's budget.
+            max_retries (int, optional): retries of a rate limited call. Defaults to 5.
+            backoff (float, optional): seconds paused after the first 429, doubling
+            per retry. Defaults to 1.
+            sink (Any, optional): instrumentation sink, 'rest.retries' is recorded
+            for each retry. Defaults to nullSink.
+        """
+        self._api = api
+        self.bucket = tokenBucket(
+            requests_per_minute / 60,
+            burst if burst is not None else max(1.0, requests_per_minute / 10))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sink = sink if sink is not None else nullSink()
+        self._in_flight: Dict[Any, Future] = {}
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+
+        def scheduled(*args, **kwargs):
+            if name not in COALESCED:
+                return self._call(name, attr, args, kwargs)
+            try:
+                key = (name, args, frozenset(kwargs.items()))
+                hash(key)
+            except TypeError:
+                return self._call(name, attr, args, kwargs)
+            return self._coalesced(key, name, attr, args, kwargs)
+        return scheduled
+
+    def _coalesced(self, key, name: str, attr, args, kwargs):
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+        if not owner:
+            return future.result()  # type: ignore
+
+        try:
+            result = self._call(name, attr, args, kwargs)
+            future.set_result(result)  # type: ignore
+            return result
+        except Exception as e:
+            future.set_exception(e)  # type: ignore
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _call(self, name: str, attr, args, kwargs):
+        priority = PRIORITIES.get(name, DEFAULT_PRIORITY)
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire(priority)
+            try:
+                return attr(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limited(e) or attempt == self.max_retries:
+                    raise
+                self.sink.record('rest.retries', 1, endpoint=name)
+                self.bucket.pause(self.backoff * 2 ** attempt)
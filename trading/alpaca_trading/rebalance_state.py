@@ -0,0 +1,119 @@
+from .snapshot import PortfolioSnapshot
+from dataclasses import asdict
+from typing import Any, Dict, Iterable, Optional, TYPE_CHECKING
+import json
+import os
+import time
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+class rebalanceState:
+    """Last applied targets and positions, persisted between rebalances so a
+    rebalance only has to plan orders for what changed.
+
+    A ticker is rebalanced if its target changed since the last applied targets,
+    or if its position has drifted from its target by more than <drift_tolerance>
+    of the account equity. Everything is rebalanced when there is no saved state.
+    """
+
+    def __init__(self, path: str, drift_tolerance: float = 0.0,
+                 snapshot_max_age: float = 0.0):
+        """Load the state saved at <path>, if any.
+
+        Args:
+            path (str): json file the state is saved to.
+            drift_tolerance (float, optional): max |current - target| weight of an
+            unchanged ticker before it is rebalanced. Defaults to 0.
+            snapshot_max_age (float, optional): seconds for which the saved
+            account equity can be used in place of fetching the account
+            (see cached_snapshot). Defaults to 0 (always fetch).
+        """
+        self.path = path
+        self.drift_tolerance = drift_tolerance
+        self.snapshot_max_age = snapshot_max_age
+
+        self.targets: Dict[str, float] = {}
+        self.snapshot: Optional[PortfolioSnapshot] = None
+        self.saved_at = 0.0
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.targets = state['targets']
+            self.snapshot = PortfolioSnapshot(**state['snapshot'])
+            self.saved_at = state['saved_at']
+
+    def cached_snapshot(self, positions: Iterable[Any]) -> Optional[PortfolioSnapshot]:
+        """Get a snapshot from the saved account equity and the current positions,
+        if the saved snapshot is within snapshot_max_age and holds the same tickers.
+
+        The saved positions are the ones expected after the last rebalance, so
+        they are only trusted to tell that nothing was traded since. The cash is
+        the saved equity less the current positions' market value.
+
+        Args:
+            positions: position entities, from one list_positions call
+
+        Returns:
+            Optional[PortfolioSnapshot]: the snapshot, None if the saved one is
+            missing, too old, or its tickers differ from the positions.
+        """
+        if self.snapshot is None or time.time() - self.saved_at > self.snapshot_max_age:
+            return None
+        position_equity = {p.symbol: float(p.market_value) for p in positions}
+        if position_equity.keys() != self.snapshot.position_equity.keys():
+            return None
+        account_equity = self.snapshot.account_equity
+        return PortfolioSnapshot(account_equity, position_equity,
+                                 account_equity - sum(position_equity.values()))
+
+    def select(self, df: 'pd.DataFrame', account_equity: float) -> 'pd.DataFrame':
+        """Get the rows of a position equity df that need to be rebalanced.
+
+        Args:
+            df (pd.DataFrame): position equity df
+            account_equity (float): account equity the df was computed with
+
+        Returns:
+            pd.DataFrame: rows whose target changed or whose drift is past the tolerance.
+        """
+        if self.snapshot is None:
+            return df
+
+        last_pct = df['ticker'].map(self.targets)
+        changed = last_pct.isna() | ((last_pct - df['portfolio_pct']).abs() > 1e-9)
+        drift = (df['desired_position_equity'] - df['current_position_equity']).abs() \
+            / account_equity
+        return df[changed | (drift > self.drift_tolerance)]
+
+    def save(self, portfolio_dict: Dict[str, float], snapshot: PortfolioSnapshot,
+             df: 'pd.DataFrame', ticker_results: Dict[str, bool]):
+        """Save the applied targets, and the positions expected after the rebalance:
+        the desired equity for filled tickers and the snapshot equity otherwise.
+
+        Args:
+            portfolio_dict (Dict[str, float]): applied ticker to equity % dictionary
+            snapshot (PortfolioSnapshot): snapshot the rebalance was planned from
+            df (pd.DataFrame): rebalanced rows of the position equity df
+            ticker_results (Dict[str, bool]): results of the rebalance
+        """
+        position_equity = dict(snapshot.position_equity)
+        for ticker, desired in zip(df['ticker'], df['desired_position_equity']):
+            if not ticker_results.get(ticker):
+                continue
+            if desired == 0:
+                position_equity.pop(ticker, None)
+            else:
+                position_equity[ticker] = float(desired)
+
+        self.targets = {ticker: float(pct) for ticker, pct in portfolio_dict.items()}
+        self.snapshot = PortfolioSnapshot(snapshot.account_equity, position_equity)
+        self.saved_at = time.time()
+
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'targets': self.targets,
+                       'snapshot': asdict(self.snapshot),
+                       'saved_at': self.saved_at}, f)
+        os.replace(tmp_path, self.path)
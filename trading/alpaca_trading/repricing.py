@@ -0,0 +1,232 @@
+from .instrumentation import nullSink
+from .journal import nullJournal
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+import time
+
+if TYPE_CHECKING:
+    from alpaca_trade_api.entity import Order as orderEntity
+    from alpaca_trade_api.rest import REST
+
+
+def get_new_limit_price(order_entity: 'orderEntity', current_scaler: float) -> str:
+    """Get an adjusted limit price for an order entity, increased or decreased depending
+    on the order side.
+
+    Args:
+        order_entity (orderEntity): limit order entity
+        current_scaler (float): current scaler for an increase or decrease.
+
+    Returns:
+        str: a string of the new limit price
+    """
+    limit_price = float(order_entity.limit_price)
+
+    delta = (
+        limit_price * current_scaler  # type: ignore
+        if order_entity.side == 'buy'
+        else - limit_price * current_scaler  # type: ignore
+    )
+
+    new_limit_price = str(round(limit_price + delta, 2))  # type: ignore
+    return new_limit_price
+
+
+@dataclass
+class workingLimitOrder:
+    """A limit order being repriced. <order_entity> is the latest replacement,
+    <order_id> the id of the order as first added.
+    """
+    order_id: str
+    order_entity: 'orderEntity'
+    deadline: Optional[float] = None
+    submitted: Optional[float] = None
+    current_scaler: float = 0
+    reprice_steps: int = 0
+    is_filled: Optional[bool] = None
+    filled_at: Optional[float] = None
+
+
+class limitRepricer:
+    """Reprice every working limit order of a rebalance together.
+
+    Each tick refreshes the status of all the working orders with one
+    list_orders call, then replaces only the orders that are still open,
+    stepping each limit price by <increase_increment> up to <max_limit_scaler>.
+    Orders that run out of steps or pass their deadline are cancelled.
+
+    The rules (next_action, next_limit_price, replaced) make no broker call,
+    so asyncOrderFiller works its orders with them too, awaiting the calls.
+    """
+
+    def __init__(self, api: 'REST',
+                 max_limit_scaler: float = 0.04,
+                 increase_increment: float = 0.005,
+                 jitter: float = 10,
+                 timeout: Optional[float] = None,
+                 cancel_on_fail: bool = True,
+                 sink: Any = None,
+                 journal: Any = None):
+        """Create the repricer.
+
+        Args:
+            api (REST): alpaca api
+            max_limit_scaler (float, optional): max increase to the limit price
+            while attempting to fill, before giving up. Defaults to 0.04.
+            increase_increment (float, optional): proportion by which to
+            incrementally increase the limit. Defaults to 0.005.
+            jitter (float, optional): Time between ticks. Defaults to 10.
+            timeout (float, optional): default seconds an order is worked before
+            giving up. Defaults to None (until max_limit_scaler is reached).
+            cancel_on_fail (bool, optional): Cancel order if unsuccessful in filling.
+            Defaults to True.
+            sink (Any, optional): instrumentation sink for time to fill and reprice
+            steps. Defaults to nullSink.
+            journal (Any, optional): executionJournal the replacements and cancels
+            are written to. Defaults to nullJournal.
+        """
+        self.api = api
+        self.max_limit_scaler = max_limit_scaler
+        self.increase_increment = increase_increment
+        self.jitter = jitter
+        self.timeout = timeout
+        self.cancel_on_fail = cancel_on_fail
+        self.sink = sink if sink is not None else nullSink()
+        self.journal = journal if journal is not None else nullJournal()
+        self.working: Dict[str, workingLimitOrder] = {}
+
+    def add(self, order_entity: 'orderEntity', deadline: Optional[float] = None,
+            submitted: Optional[float] = None, order_id: Optional[str] = None):
+        """Add a submitted limit order to be worked.
+
+        Args:
+            order_entity (orderEntity): submitted limit order
+            deadline (float, optional): time.monotonic() after which the order is
+            given up on. Defaults to now + timeout.
+            submitted (float, optional): time.perf_counter() the order was submitted at,
+            for recording time to fill. Defaults to now.
+            order_id (str, optional): id the order is worked and reported under.
+            Defaults to the entity's id, e.g. a journaled order resumed from one
+            of its replacements keeps its journaled id.
+        """
+        if deadline is None and self.timeout is not None:
+            deadline = time.monotonic() + self.timeout
+        if submitted is None:
+            submitted = time.perf_counter()
+        order_id = order_id or order_entity.id
+        self.working[order_id] = workingLimitOrder(  # type: ignore
+            order_id, order_entity, deadline, submitted)  # type: ignore
+
+    def run(self) -> Dict[str, bool]:
+        """Work the orders until each is filled or given up on.
+
+        Returns:
+            Dict[str, bool]: id of each order as added to True if it filled.
+        """
+        while self._pending():
+            self.tick()
+            if self._pending():
+                time.sleep(self.jitter)
+        return {order_id: bool(w.is_filled) for order_id, w in self.working.items()}
+
+    def _pending(self) -> List[workingLimitOrder]:
+        return [w for w in self.working.values() if w.is_filled is None]
+
+    def tick(self):
+        """Refresh the statuses of the pending orders and reprice the open ones."""
+        pending = self._pending()
+        self._refresh(pending)
+
+        for w in pending:
+            action = self.next_action(w, w.order_entity.status)  # type: ignore
+            if action == 'give_up':
+                self._give_up(w)
+            elif action == 'reprice':
+                self._reprice(w)
+
+            if w.is_filled is not None:
+                self._record(w)
+
+    def next_action(self, w: workingLimitOrder, status: Optional[str]) -> str:
+        """Decide what to do with a working order given its latest status. Filled
+        and cancelled orders are settled here.
+
+        Returns:
+            str: 'filled', 'canceled', 'give_up' (cancel it) or 'reprice'.
+        """
+        if status == 'filled':
+            w.is_filled = True
+            return 'filled'
+        if status in ('canceled', 'expired', 'rejected'):
+            w.is_filled = False
+            self.journal.cancel(w.order_entity.id)  # type: ignore
+            return 'canceled'
+        if self._out_of_steps(w):
+            return 'give_up'
+        return 'reprice'
+
+    def next_limit_price(self, w: workingLimitOrder) -> str:
+        """Step the order's scaler until the limit price changes, and get the new price."""
+        new_limit_price = w.order_entity.limit_price
+        while new_limit_price == w.order_entity.limit_price:
+            # continue if increase resulted in no change to limit.
+            w.current_scaler += self.increase_increment
+            new_limit_price = get_new_limit_price(w.order_entity, w.current_scaler)
+        return new_limit_price  # type: ignore
+
+    def replaced(self, w: workingLimitOrder, order_entity: 'orderEntity',
+                 limit_price: str):
+        """Record the replacement of a working order."""
+        replaced_id = w.order_entity.id
+        w.order_entity = order_entity
+        self.journal.replace(order_entity.id, replaced_id, float(limit_price))  # type: ignore
+        w.reprice_steps += 1
+
+    def _record(self, w: workingLimitOrder):
+        self.sink.record('order.reprice_steps', w.reprice_steps, filled=w.is_filled)
+        if w.is_filled:
+            w.filled_at = time.perf_counter()
+            self.sink.record('order.time_to_fill',
+                             w.filled_at - w.submitted, type='limit')  # type: ignore
+
+    def _refresh(self, pending: List[workingLimitOrder]):
+        by_id = {w.order_entity.id: w for w in pending}
+        for order_entity in self.api.list_orders(status='all', limit=500, direction='desc'):
+            w = by_id.pop(order_entity.id, None)
+            if w is not None:
+                w.order_entity = order_entity
+        for order_id, w in by_id.items():
+            w.order_entity = self.api.get_order(order_id)
+
+    def _out_of_steps(self, w: workingLimitOrder) -> bool:
+        past_deadline = w.deadline is not None and time.monotonic() > w.deadline
+        return past_deadline or w.current_scaler > self.max_limit_scaler
+
+    def _reprice(self, w: workingLimitOrder):
+        new_limit_price = self.next_limit_price(w)
+        try:
+            order_entity = self.api.replace_order(
+                order_id=w.order_entity.id,  # type: ignore
+                limit_price=new_limit_price
+            )
+            self.replaced(w, order_entity, new_limit_price)
+        except Exception as e:
+            if 'order is not open' in str(e):
+                w.is_filled = True
+            else:
+                raise e
+
+    def _give_up(self, w: workingLimitOrder):
+        if not self.cancel_on_fail:
+            w.is_filled = False
+            return
+        try:
+            self.api.cancel_order(w.order_entity.id)  # type: ignore
+            self.journal.cancel(w.order_entity.id)  # type: ignore
+            w.is_filled = False
+        except Exception as e:
+            if 'order is not open' in str(e):
+                w.order_entity = self.api.get_order(w.order_entity.id)  # type: ignore
+                w.is_filled = w.order_entity.status == 'filled'
+            else:
+                raise e
@@ -0,0 +1,200 @@
+from datetime import date, datetime, time as dt_time, timedelta
+from typing import Any, Dict, Optional, Tuple
+from zoneinfo import ZoneInfo
+import json
+import logging
+import os
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+MARKET_TZ = ZoneInfo('America/New_York')
+
+# days past a time searched for the next open, longer than any market closure.
+NEXT_OPEN_DAYS = 14
+
+
+class MarketClosedError(Exception):
+    """Raised when a rebalance is started outside a market session."""
+
+
+class marketCalendar:
+    """Market sessions from the broker's calendar, kept in a json file so that
+    checking whether the market is open needs no network call.
+
+    The calendar is fetched with one get_calendar call covering <days_ahead>
+    days, and fetched again once it is older than <max_age>. A lookup outside
+    the fetched range widens it to cover the date asked about (and <days_ahead>
+    days past it, when later), so walking forward does not fetch per day.
+    """
+
+    def __init__(self, api: Any, path: str, days_ahead: int = 90,
+                 max_age: float = 7 * 24 * 60 * 60):
+        """Create the calendar. The file is read, or refreshed, on first use.
+
+        Args:
+            api (Any): broker api
+            path (str): json file the calendar is kept in.
+            days_ahead (int, optional): days fetched past today. Defaults to 90.
+            max_age (float, optional): seconds before the calendar is fetched again.
+            Defaults to a week.
+        """
+        self.api = api
+        self.path = path
+        self.days_ahead = days_ahead
+        self.max_age = max_age
+        self.sessions: Optional[Dict[str, Tuple[str, str]]] = None
+        self.start = ''
+        self.end = ''
+        self.updated_at = 0.0
+
+    def _load_file(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            state = json.load(f)
+        self.sessions = {day: tuple(session) for day, session in state['sessions'].items()}
+        self.start, self.end = state['start'], state['end']
+        self.updated_at = state['updated_at']
+
+    def refresh(self, start: Optional[date] = None, end: Optional[date] = None):
+        """Fetch the sessions from <start> (default today) to <end> (default
+        <days_ahead> days after <start>), and save them.
+        """
+        start = start or datetime.now(MARKET_TZ).date()
+        end = end or start + timedelta(days=self.days_ahead)
+        self.sessions = {
+            str(day.date)[:10]: (str(day.open)[:5], str(day.close)[:5])
+            for day in self.api.get_calendar(start.isoformat(), end.isoformat())
+        }
+        self.start, self.end = start.isoformat(), end.isoformat()
+        self.updated_at = time.time()
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'start': self.start, 'end': self.end, 'updated_at': self.updated_at,
+                       'sessions': self.sessions}, f)
+        os.replace(tmp_path, self.path)
+        logger.info("fetched %d market sessions from %s to %s",
+                    len(self.sessions), self.start, self.end)
+
+    def _cover(self, first: date, last: date):
+        """Make sure the sessions from <first> to <last> are fetched, with at most
+        one get_calendar call.
+        """
+        if self.sessions is None:
+            self._load_file()
+        today = datetime.now(MARKET_TZ).date()
+        ahead = timedelta(days=self.days_ahead)
+        if self.sessions is None or time.time() - self.updated_at > self.max_age:
+            self.refresh(min(first, today), max(last, today + ahead))
+        elif first.isoformat() < self.start or last.isoformat() > self.end:
+            end = date.fromisoformat(self.end)
+            self.refresh(min(first, date.fromisoformat(self.start)),
+                         last + ahead if last > end else end)
+
+    def session(self, day: date) -> Optional[Tuple[datetime, datetime]]:
+        """Get the open and close of the session on a day.
+
+        Args:
+            day (date): day, in market time
+
+        Returns:
+            Optional[Tuple[datetime, datetime]]: open and close in market time,
+            None if the market is closed that day.
+        """
+        self._cover(day, day)
+        session = self.sessions.get(day.isoformat())  # type: ignore
+        if session is None:
+            return None
+        return tuple(  # type: ignore
+            datetime.combine(day, dt_time.fromisoformat(t), MARKET_TZ) for t in session)
+
+    def is_open(self, at: Optional[datetime] = None) -> bool:
+        """Whether the market is in session at a time (default now)."""
+        at = (at or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+        session = self.session(at.date())
+        return session is not None and session[0] <= at < session[1]
+
+    def next_open(self, after: Optional[datetime] = None) -> datetime:
+        """Get the first session open after a time (default now).
+
+        Raises:
+            ValueError: if the calendar has no session in the <NEXT_OPEN_DAYS>
+            days after the time.
+        """
+        after = (after or datetime.now(MARKET_TZ)).astimezone(MARKET_TZ)
+        day = after.date()
+        self._cover(day, day + timedelta(days=NEXT_OPEN_DAYS))
+        for key in sorted(key for key in self.sessions if key >= day.isoformat()):  # type: ignore
+            opens = datetime.combine(date.fromisoformat(key),
+                                     dt_time.fromisoformat(self.sessions[key][0]),  # type: ignore
+                                     MARKET_TZ)
+            if opens > after:
+                return opens
+        raise ValueError(f"no market session in the calendar after {after.isoformat()}")
+
+
+def sleep_until(target: float, spin: float = 0.002):
+    """Sleep until time.time() reaches <target>, spinning for the last <spin>
+    seconds so the wake up is not late by the scheduler's granularity.
+    """
+    while True:
+        remaining = target - time.time()
+        if remaining <= 0:
+            return
+        if remaining > spin:
+            time.sleep(remaining - spin)
+
+
+class rebalanceScheduler:
+    """Run a trader's rebalance at a target time, inside a market session.
+
+    <warm_up_seconds> before the target, the trader is warmed up (account
+    snapshot, asset metadata, quotes and connections, see alpacaTrader.warm_up),
+    so that at the target only planning and the orders are left to do.
+    """
+
+    def __init__(self, trader: Any, calendar: marketCalendar,
+                 warm_up_seconds: float = 30.0, sink: Any = None):
+        """Create the scheduler.
+
+        Args:
+            trader (alpacaTrader): trader to rebalance with
+            calendar (marketCalendar): market sessions
+            warm_up_seconds (float, optional): seconds before the target the trader
+            is warmed up. Defaults to 30.
+            sink (Any, optional): instrumentation sink, 'schedule.start_delay' is
+            recorded for each rebalance. Defaults to the trader's sink.
+        """
+        self.trader = trader
+        self.calendar = calendar
+        self.warm_up_seconds = warm_up_seconds
+        self.sink = sink if sink is not None else trader.sink
+
+    def run_at(self, target: datetime, portfolio_dict: Dict[str, float]) -> Dict[str, bool]:
+        """Wait for <target>, then change the state of the portfolio to reflect
+        the given portfolio dict.
+
+        Args:
+            target (datetime): timezone aware time to rebalance at
+            portfolio_dict (Dict[str, float]): ticker to equity % dictionary
+
+        Raises:
+            MarketClosedError: if the market is not in session at the target.
+            Raised before waiting.
+
+        Returns:
+            Dict[str, bool]: the results of have_portfolio.
+        """
+        if not self.calendar.is_open(target):
+            raise MarketClosedError(f"market is closed at {target.isoformat()}")
+
+        target_time = target.timestamp()
+        sleep_until(target_time - self.warm_up_seconds)
+        self.trader.warm_up(portfolio_dict.keys())
+
+        sleep_until(target_time)
+        self.sink.record('schedule.start_delay', time.time() - target_time)
+        return self.trader.have_portfolio(portfolio_dict)
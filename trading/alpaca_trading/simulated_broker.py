@@ -0,0 +1,392 @@
+from .broker import brokerAPI
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+import threading
+import time
+import uuid
+
+
+OPEN_STATUSES = ('new', 'accepted', 'partially_filled')
+
+
+class simEntity:
+    """Attribute access over a raw dict, like alpaca_trade_api.entity.Entity."""
+
+    def __init__(self, raw: Dict[str, Any]):
+        self._raw = raw
+
+    def __getattr__(self, key):
+        if key in self._raw:
+            return self._raw[key]
+        raise AttributeError(key)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self._raw})'
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class simulatedBroker(brokerAPI):
+    """In-process broker backend for dry runs and load tests.
+
+    Orders are matched against a supplied price path on every call, and
+    every <match_interval> seconds in the background when publishing to a stream:
+    market orders fill at the current price, buy limits fill when the price
+    is at or below the limit and sell limits when it is at or above it.
+    Each match fills <fill_ratio> of an order's remaining quantity, so
+    fill_ratio < 1 produces partial fills. Like alpaca, a buy costing more than
+    the buying power (cash, including the proceeds of filled sells, less what
+    open buys hold) is rejected.
+    """
+
+    def __init__(self, prices: Dict[str, Sequence[float]],
+                 cash: float = 100000.0,
+                 latency: float = 0.0,
+                 fill_delay: float = 0.0,
+                 fill_ratio: float = 1.0,
+                 step_seconds: Optional[float] = None,
+                 stream: Any = None,
+                 match_interval: float = 0.01,
+                 assets: Optional[Dict[str, Dict[str, Any]]] = None,
+                 volumes: Optional[Dict[str, float]] = None,
+                 bar_ages: Optional[Dict[str, float]] = None):
+        """Create the simulated account.
+
+        Args:
+            prices (Dict[str, Sequence[float]]): price path of each tradable ticker.
+            cash (float, optional): starting cash. Defaults to 100000.
+            latency (float, optional): seconds each call takes. Defaults to 0.
+            fill_delay (float, optional): seconds before a submitted order can fill.
+            Defaults to 0.
+            fill_ratio (float, optional): proportion of the remaining quantity filled
+            per match. Defaults to 1 (fill completely).
+            step_seconds (float, optional): seconds per step of the price path. Defaults
+            to None, in which case the path is stepped with advance().
+            stream (Any, optional): localTradeUpdateStream to publish order updates to.
+            match_interval (float, optional): seconds between background matches when
+            publishing to a stream. Defaults to 0.01.
+            assets (Dict[str, Dict[str, Any]], optional): asset fields overriding the
+            defaults of a ticker, e.g. {'XYZ': {'fractionable': False}}. Every
+            ticker with a price path is a tradable, fractionable, shortable asset
+            by default.
+            volumes (Dict[str, float], optional): shares traded per minute of a
+            ticker, as reported in its snapshot minute bar. Defaults to 10000.
+            bar_ages (Dict[str, float], optional): seconds since the latest bar of a
+            ticker, for tickers that last traded a while ago. Defaults to 0.
+        """
+        self.prices = {ticker: list(path) for ticker, path in prices.items()}
+        self.cash = cash
+        self.latency = latency
+        self.fill_delay = fill_delay
+        self.fill_ratio = fill_ratio
+        self.step_seconds = step_seconds
+        self.stream = stream
+        self.assets = assets or {}
+        self.volumes = volumes or {}
+        self.bar_ages = bar_ages or {}
+
+        self.positions: Dict[str, float] = {}
+        self.cost_basis: Dict[str, float] = {}
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self._submitted: Dict[str, float] = {}
+        self._step = 0
+        self._start = time.monotonic()
+        self._lock = threading.RLock()
+
+        self.match_interval = match_interval
+        self._closed = threading.Event()
+        if stream is not None:
+            threading.Thread(target=self._match_loop, daemon=True).start()
+
+    def _match_loop(self):
+        while not self._closed.wait(self.match_interval):
+            self._match()
+
+    def close(self):
+        """Stop background matching."""
+        self._closed.set()
+
+    def advance(self, steps: int = 1):
+        """Move every price path forward."""
+        with self._lock:
+            self._step += steps
+
+    def price(self, ticker: str) -> float:
+        path = self.prices[ticker]
+        step = self._step if self.step_seconds is None \
+            else int((time.monotonic() - self._start) / self.step_seconds)
+        return path[min(step, len(path) - 1)]
+
+    def _bar_time(self, ticker: str) -> str:
+        at = time.time() - self.bar_ages.get(ticker, 0.0)
+        return datetime.fromtimestamp(at, timezone.utc).isoformat()
+
+    def _call(self):
+        if self.latency:
+            time.sleep(self.latency)
+        self._match()
+
+    def _match(self):
+        with self._lock:
+            now = time.monotonic()
+            for order in self.orders.values():
+                if order['status'] not in OPEN_STATUSES:
+                    continue
+                if now - self._submitted[order['id']] < self.fill_delay:
+                    continue
+                price = self.price(order['symbol'])
+                if order['type'] == 'limit':
+                    limit = float(order['limit_price'])
+                    if (order['side'] == 'buy' and price > limit) or \
+                            (order['side'] == 'sell' and price < limit):
+                        continue
+                self._fill(order, price)
+
+    def _fill(self, order: Dict[str, Any], price: float):
+        if order['qty'] is None:
+            order['qty'] = str(float(order['notional']) / price)
+        qty = float(order['qty'])
+        filled = float(order['filled_qty'])
+        fill_qty = (qty - filled) * self.fill_ratio
+        if self.fill_ratio < 1 and (qty - filled - fill_qty) * price < 0.01:
+            fill_qty = qty - filled
+
+        avg_price = float(order['filled_avg_price'] or 0)
+        order['filled_avg_price'] = str(
+            (avg_price * filled + price * fill_qty) / (filled + fill_qty))
+        order['filled_qty'] = str(filled + fill_qty)
+
+        signed_qty = fill_qty if order['side'] == 'buy' else -fill_qty
+        ticker = order['symbol']
+        self.cash -= signed_qty * price
+        position = self.positions.get(ticker, 0.0) + signed_qty
+        if signed_qty > 0:
+            self.cost_basis[ticker] = self.cost_basis.get(ticker, 0.0) + signed_qty * price
+        elif ticker in self.cost_basis and self.positions.get(ticker):
+            self.cost_basis[ticker] *= position / self.positions[ticker]
+        if abs(position) < 1e-9:
+            self.positions.pop(ticker, None)
+            self.cost_basis.pop(ticker, None)
+        else:
+            self.positions[ticker] = position
+
+        if fill_qty >= qty - filled:
+            order['status'] = 'filled'
+            order['filled_at'] = _now()
+            self._publish(order, 'fill')
+        else:
+            order['status'] = 'partially_filled'
+            self._publish(order, 'partial_fill')
+
+    def _publish(self, order: Dict[str, Any], event: str):
+        if self.stream is not None:
+            self.stream.publish(dict(order), event)
+
+    def get_account(self):
+        self._call()
+        with self._lock:
+            equity = self.cash + sum(
+                qty * self.price(ticker) for ticker, qty in self.positions.items())
+            return simEntity({
+                'status': 'ACTIVE',
+                'cash': str(self.cash),
+                'equity': str(equity),
+                'buying_power': str(self._buying_power()),
+            })
+
+    def _buy_cost(self, symbol: str, qty, limit_price, notional) -> float:
+        # cash a buy takes when it fills: limits fill at the price once it is at or below them.
+        if notional is not None:
+            return float(notional)
+        price = self.price(symbol)
+        return float(qty) * (min(price, float(limit_price)) if limit_price is not None else price)
+
+    def _buying_power(self) -> float:
+        # cash (which includes the proceeds of filled sells) less what open buys hold.
+        held = sum(
+            self._buy_cost(order['symbol'], order['qty'], order['limit_price'], order['notional'])
+            * (1 - float(order['filled_qty']) / float(order['qty']) if order['qty'] else 1)
+            for order in self.orders.values()
+            if order['side'] == 'buy' and order['status'] in OPEN_STATUSES)
+        return max(self.cash - held, 0.0)
+
+    def _position(self, ticker: str):
+        qty = self.positions[ticker]
+        price = self.price(ticker)
+        cost_basis = self.cost_basis.get(ticker, 0.0)
+        return simEntity({
+            'symbol': ticker,
+            'qty': str(qty),
+            'side': 'long' if qty > 0 else 'short',
+            'current_price': str(price),
+            'market_value': str(qty * price),
+            'cost_basis': str(cost_basis),
+            'avg_entry_price': str(cost_basis / qty),
+            'unrealized_intraday_plpc': str(
+                (qty * price - cost_basis) / cost_basis if cost_basis else 0.0),
+        })
+
+    def list_positions(self):
+        self._call()
+        with self._lock:
+            return [self._position(ticker) for ticker in self.positions]
+
+    def get_position(self, symbol: str):
+        self._call()
+        with self._lock:
+            if symbol not in self.positions:
+                raise Exception("position does not exist")
+            return self._position(symbol)
+
+    def submit_order(self, symbol: str, qty=None, side=None, type='market',
+                     time_in_force='day', limit_price=None, notional=None, **kwargs):
+        self._call()
+        return self._submit(symbol, qty, side, type, time_in_force,
+                            limit_price, notional, **kwargs)
+
+    def _submit(self, symbol: str, qty=None, side=None, type='market',
+                time_in_force='day', limit_price=None, notional=None, **kwargs):
+        if symbol not in self.prices:
+            raise Exception(f"asset {symbol} not found")
+        with self._lock:
+            if side == 'buy' and self._buy_cost(symbol, qty, limit_price, notional) \
+                    > self._buying_power() + 1e-6:
+                raise Exception("insufficient buying power")
+            order = {
+                'id': str(uuid.uuid4()),
+                'client_order_id': kwargs.get('client_order_id') or str(uuid.uuid4()),
+                'symbol': symbol,
+                'side': side,
+                'type': type,
+                'time_in_force': time_in_force,
+                'qty': None if qty is None else str(qty),
+                'notional': None if notional is None else str(notional),
+                'limit_price': None if limit_price is None else str(limit_price),
+                'filled_qty': '0',
+                'filled_avg_price': None,
+                'status': 'new',
+                'submitted_at': _now(),
+                'filled_at': None,
+                'replaced_by': None,
+                'replaces': kwargs.get('replaces'),
+            }
+            self.orders[order['id']] = order
+            self._submitted[order['id']] = time.monotonic()
+            self._publish(order, 'new')
+        self._match()
+        return simEntity(dict(self.orders[order['id']]))
+
+    def replace_order(self, order_id: str, qty=None, limit_price=None, **kwargs):
+        self._call()
+        with self._lock:
+            order = self.orders[order_id]
+            if order['status'] not in OPEN_STATUSES:
+                raise Exception("order is not open")
+            remaining = float(order['qty']) - float(order['filled_qty'])
+            order['status'] = 'replaced'
+            self._publish(order, 'replaced')
+            new_order = self._submit(
+                order['symbol'],
+                qty=qty if qty is not None else remaining,
+                side=order['side'],
+                type=order['type'],
+                time_in_force=order['time_in_force'],
+                limit_price=limit_price if limit_price is not None else order['limit_price'],
+                replaces=order_id)
+            order['replaced_by'] = new_order.id
+            return new_order
+
+    def get_order(self, order_id: str):
+        self._call()
+        with self._lock:
+            return simEntity(dict(self.orders[order_id]))
+
+    def list_orders(self, status=None, limit=None, direction='desc', **kwargs) -> List[simEntity]:
+        self._call()
+        with self._lock:
+            orders = list(self.orders.values())
+            if status in (None, 'open'):
+                orders = [o for o in orders if o['status'] in OPEN_STATUSES]
+            elif status == 'closed':
+                orders = [o for o in orders if o['status'] not in OPEN_STATUSES]
+            if direction == 'desc':
+                orders.reverse()
+            return [simEntity(dict(o)) for o in orders[:limit or 50]]
+
+    def cancel_order(self, order_id: str):
+        self._call()
+        with self._lock:
+            order = self.orders[order_id]
+            if order['status'] not in OPEN_STATUSES:
+                raise Exception("order is not open")
+            order['status'] = 'canceled'
+            self._publish(order, 'canceled')
+
+    def close_position(self, symbol: str, **kwargs):
+        self._call()
+        with self._lock:
+            if symbol not in self.positions:
+                raise Exception("position does not exist")
+            qty = self.positions[symbol]
+            return self._submit(
+                symbol, qty=abs(qty), side='sell' if qty > 0 else 'buy', type='market')
+
+    def cancel_all_orders(self):
+        self._call()
+        with self._lock:
+            for order in self.orders.values():
+                if order['status'] in OPEN_STATUSES:
+                    order['status'] = 'canceled'
+                    self._publish(order, 'canceled')
+
+    def close_all_positions(self) -> List[simEntity]:
+        # like alpaca, one response per position with the close order as its body.
+        self._call()
+        with self._lock:
+            responses = []
+            for symbol, qty in list(self.positions.items()):
+                order_entity = self._submit(
+                    symbol, qty=abs(qty), side='sell' if qty > 0 else 'buy', type='market')
+                responses.append(simEntity({'symbol': symbol, 'status': 200,
+                                            'body': dict(order_entity._raw)}))
+            return responses
+
+    def get_latest_bar(self, symbol: str):
+        self._call()
+        with self._lock:
+            return simEntity({'c': self.price(symbol), 't': self._bar_time(symbol)})
+
+    def list_assets(self, status=None, asset_class=None) -> List[simEntity]:
+        self._call()
+        return [
+            simEntity({'symbol': ticker, 'status': 'active', 'class': 'us_equity',
+                       'tradable': True, 'fractionable': True, 'shortable': True,
+                       'easy_to_borrow': True, **self.assets.get(ticker, {})})
+            for ticker in self.prices
+        ]
+
+    def get_calendar(self, start=None, end=None) -> List[simEntity]:
+        # every weekday is a regular session, no holidays or early closes.
+        self._call()
+        day = date.fromisoformat(start) if start else datetime.now(timezone.utc).date()
+        end_day = date.fromisoformat(end) if end else day + timedelta(days=30)
+        sessions = []
+        while day <= end_day:
+            if day.weekday() < 5:
+                sessions.append(simEntity({'date': day.isoformat(), 'open': '09:30',
+                                           'close': '16:00'}))
+            day += timedelta(days=1)
+        return sessions
+
+    def get_snapshots(self, symbols):
+        self._call()
+        with self._lock:
+            return {
+                symbol: simEntity({'minute_bar': simEntity({
+                    'c': self.price(symbol), 'v': self.volumes.get(symbol, 10000.0),
+                    't': self._bar_time(symbol)})})
+                if symbol in self.prices else None
+                for symbol in symbols
+            }
@@ -0,0 +1,395 @@
+from .order import Order, OrderBatch
+from .order_filling import get_limit, orderFiller
+from .order_updates import FINAL_STATUSES
+from .schedule import sleep_until
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Union
+import logging
+import math
+import numpy as np
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class timerWheel:
+    """Hashed timer wheel. Items are scheduled into one of <slots> buckets of
+    <tick> seconds, so scheduling an item and advancing the wheel cost the same
+    however many items are waiting. Items further out than one turn of the
+    wheel sit out the extra turns in their bucket.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 256):
+        self.tick = tick
+        self.slots: List[List[list]] = [[] for _ in range(slots)]
+        self.cursor = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def schedule(self, item: Any, delay: float):
+        """Schedule <item> to come due <delay> seconds from the current tick,
+        rounded up to a whole tick (at least one).
+        """
+        ticks = max(1, math.ceil(delay / self.tick))
+        turns = (ticks - 1) // len(self.slots)
+        self.slots[(self.cursor + ticks) % len(self.slots)].append([turns, item])
+        self._count += 1
+
+    def advance(self) -> List[Any]:
+        """Move to the next tick and get the items due on it, in scheduling order."""
+        self.cursor = (self.cursor + 1) % len(self.slots)
+        bucket = self.slots[self.cursor]
+        due = [item for turns, item in bucket if turns == 0]
+        self.slots[self.cursor] = [[turns - 1, item] for turns, item in bucket if turns > 0]
+        self._count -= len(due)
+        return due
+
+
+class twapSlicer:
+    """Time weighted slicing: <slices> child orders, one every <duration> / <slices>
+    seconds. Each child is the remaining amount over the slices left, so the
+    unfilled part of a cancelled child is spread over the later slices.
+    """
+    needs_volume = False
+
+    def __init__(self, duration: float = 300.0, slices: int = 10):
+        self.duration = duration
+        self.slices = slices
+        self.interval = duration / slices
+
+    def child_size(self, parent: 'slicedOrder', volume: float, price: float) -> float:
+        return parent.remaining / max(self.slices - parent.slices_sent, 1)
+
+    def finished(self, parent: 'slicedOrder') -> bool:
+        return parent.slices_sent >= self.slices
+
+
+class participationSlicer:
+    """Participation capped slicing: every <interval> seconds, a child order of at
+    most <rate> of the ticker's volume over the interval, estimated from its latest
+    minute bar. No child is sent while there is no volume. Slicing stops after
+    <max_duration> seconds, leaving the rest unfilled.
+    """
+    needs_volume = True
+
+    def __init__(self, rate: float = 0.1, interval: float = 60.0,
+                 max_duration: float = 1800.0):
+        self.rate = rate
+        self.interval = interval
+        self.max_duration = max_duration
+
+    def child_size(self, parent: 'slicedOrder', volume: float, price: float) -> float:
+        if math.isnan(volume):
+            return 0.0
+        shares = self.rate * volume * self.interval / 60
+        return shares if parent.order.equity is None else shares * price
+
+    def finished(self, parent: 'slicedOrder') -> bool:
+        return time.monotonic() - parent.started >= self.max_duration
+
+
+@dataclass
+class slicedOrder:
+    """A base order being filled with child orders. Amounts are in dollars for
+    equity orders and shares for quantity orders.
+    """
+    order: Order
+    price: float  # planned price, or last close when added, to value the order
+    started: float  # time.monotonic() when added
+    submitted_at: float  # time.time() of the first child
+    remaining: float  # amount not yet sent in a child order
+    order_type: str  # of the children, 'market' or 'limit'
+    slices_sent: int = 0
+    filled_quantity: float = 0.0
+    filled_cost: float = 0.0
+    children: Dict[str, float] = field(default_factory=dict)  # open child id to its amount
+    last_child_id: str = ''
+    filled_at: Optional[float] = None
+    done: bool = False
+    filled: bool = False  # completely, once done
+
+    @property
+    def amount(self) -> float:
+        return self.order.equity if self.order.equity is not None else self.order.quantity  # type: ignore
+
+    @property
+    def filled_amount(self) -> float:
+        return self.filled_cost if self.order.equity is not None else self.filled_quantity
+
+    @property
+    def value(self) -> float:
+        return self.amount if self.order.equity is not None else self.amount * self.price
+
+    @property
+    def filled_value(self) -> float:
+        return self.filled_cost if self.order.equity is not None \
+            else self.filled_quantity * self.price
+
+
+class sliceScheduler:
+    """Fill base orders as time or volume sliced child orders (see twapSlicer and
+    participationSlicer), all on one timer wheel on the calling thread.
+
+    Each tick, the children of every order are settled from the status tracker,
+    the quotes and volumes of the orders due a slice are loaded with one snapshot
+    request, and each due order cancels its unfilled child and sends the next one.
+    Notional closes are not sliced, they are one close_position each.
+    """
+
+    def __init__(self, order_filler: orderFiller, slicer: Any, tick: float = 1.0,
+                 min_notional: float = 1.0):
+        """Create the scheduler.
+
+        Args:
+            order_filler (orderFiller): filler whose api, tracker, quote cache, sink
+            and journal the children go through, and which collects the fill records.
+            slicer (Any): twapSlicer or participationSlicer
+            tick (float, optional): seconds per tick of the wheel. Defaults to 1.
+            min_notional (float, optional): smallest notional child. Defaults to 1.
+        """
+        self.order_filler = order_filler
+        self.api = order_filler.api
+        self.status_tracker = order_filler.status_tracker
+        self.quote_cache = order_filler.quote_cache
+        self.sink = order_filler.sink
+        self.journal = order_filler.journal
+        self.slicer = slicer
+        self.min_notional = min_notional
+        self.wheel = timerWheel(tick)
+        self.working: List[slicedOrder] = []
+        self._children: Dict[str, slicedOrder] = {}
+        self._cancelled = set()
+        self._ready: List[slicedOrder] = []
+
+    def fill_orders(self, orders: Union[OrderBatch, List[Union[Order, None]]]) -> List[bool]:
+        """Fill orders in two phases, closes/sells and then buys, slicing every
+        order of a phase at once.
+
+        Args:
+            orders (Union[OrderBatch, List[Union[Order, None]]]): orders to fill,
+            as a batch (validated first) or a list with None for no order.
+
+        Returns:
+            List[bool]: True for each order that was completely filled (or None).
+        """
+        results = [True] * len(orders)
+        if isinstance(orders, OrderBatch):
+            orders.validate()
+            phases = [np.flatnonzero(orders.phase_mask('closes', 'sells')).tolist(),
+                      np.flatnonzero(orders.phase_mask('buys')).tolist()]
+        else:
+            phases = [[i for i, order in enumerate(orders)
+                       if order is not None and order.side == side] for side in ('sell', 'buy')]
+
+        for phase in phases:
+            sliced = {}
+            for i in phase:
+                order = orders[i]
+                if (order.equity is not None and order.close_position) or \
+                        (order.equity is None and not order.quantity):  # type: ignore
+                    results[i] = self.order_filler.fill_order(order)  # type: ignore
+                else:
+                    sliced[i] = order
+            parents = self.add(list(sliced.values()))
+            self.run()
+            for i, parent in zip(sliced, parents):
+                results[i] = parent.filled
+        return results
+
+    def add(self, orders: List[Order]) -> List[slicedOrder]:
+        """Add orders to be sliced from the next run, loading their quotes with
+        one snapshot request.
+        """
+        self.quote_cache.prefetch([order.ticker for order in orders])
+        parents = []
+        for order in orders:
+            price = order.price if order.price is not None \
+                else self.quote_cache.peek(order.ticker)
+            parent = slicedOrder(
+                order, math.nan if price is None else price, time.monotonic(), time.time(),
+                order.equity if order.equity is not None else order.quantity,  # type: ignore
+                'market' if order.equity is not None else 'limit')
+            parents.append(parent)
+        self.working.extend(parents)
+        self._ready.extend(parents)
+        return parents
+
+    def run(self) -> List[slicedOrder]:
+        """Work the added orders until each is done, ticking the wheel on time.
+
+        Returns:
+            List[slicedOrder]: every order worked by the scheduler.
+        """
+        due, self._ready = self._ready, []
+        next_tick = time.time()
+        while True:
+            self._settle()
+            self._slice(due)
+            progress = self.progress()
+            self.sink.record('slicing.filled', progress['filled'] / progress['requested']
+                             if progress['requested'] else 1.0)
+            if progress['done'] == progress['orders']:
+                return self.working
+
+            next_tick += self.wheel.tick
+            sleep_until(next_tick)
+            if not self.status_tracker.stream_connected:
+                self.status_tracker.poll()
+            due = self.wheel.advance()
+
+    def progress(self) -> Dict[str, float]:
+        """Get the aggregate progress of every order, valued at the prices when added.
+
+        Returns:
+            Dict[str, float]: 'orders' and 'done' counts, 'requested' and 'filled'
+            dollars, and 'working' dollars in open children.
+        """
+        working = 0.0
+        for parent in self.working:
+            sent = sum(parent.children.values())
+            working += sent if parent.order.equity is not None else sent * parent.price
+        return {
+            'orders': len(self.working),
+            'done': sum(parent.done for parent in self.working),
+            'requested': sum(parent.value for parent in self.working),
+            'filled': sum(parent.filled_value for parent in self.working),
+            'working': working,
+        }
+
+    def _settle(self):
+        """Account the fills of the children that reached a final status."""
+        for child_id, parent in list(self._children.items()):
+            status = self.status_tracker.get_status(child_id)
+            if status not in FINAL_STATUSES:
+                continue
+            del self._children[child_id]
+            self._cancelled.discard(child_id)
+            amount = parent.children.pop(child_id)
+            quantity, price = self.status_tracker.get_fill(child_id)
+            self.status_tracker.forget(child_id)
+            quantity = 0.0 if math.isnan(quantity) else quantity
+            cost = 0.0 if math.isnan(price) else quantity * price
+            parent.filled_quantity += quantity
+            parent.filled_cost += cost
+            if quantity:
+                parent.filled_at = time.monotonic()
+                self.journal.fill(child_id, quantity, price)
+            if status != 'filled':
+                filled = cost if parent.order.equity is not None else quantity
+                parent.remaining += max(amount - filled, 0.0)
+
+    def _slice(self, due: List[slicedOrder]):
+        """Cancel the open children of the due orders and send their next slice."""
+        due = [parent for parent in due if not parent.done]
+        for parent in due:
+            for child_id in parent.children:
+                self._cancel(child_id)
+
+        volumes: Dict[str, float] = {}
+        tickers = [parent.order.ticker for parent in due if not self._finished(parent)]
+        if tickers:
+            snapshots = self.api.get_snapshots(list(dict.fromkeys(tickers)))
+            for ticker, snapshot in snapshots.items():
+                if snapshot is None or snapshot.minute_bar is None:
+                    continue
+                self.quote_cache.put(ticker, float(snapshot.minute_bar.c))
+                volumes[ticker] = float(getattr(snapshot.minute_bar, 'v', math.nan))
+
+        for parent in due:
+            if self._finished(parent):
+                if parent.children:
+                    # the cancelled children settle within the next ticks.
+                    self.wheel.schedule(parent, self.wheel.tick)
+                else:
+                    self._finish(parent)
+                continue
+
+            price = self.quote_cache.peek(parent.order.ticker)
+            size = self._child_size(
+                parent, volumes.get(parent.order.ticker, math.nan),
+                parent.price if price is None else price)
+            if size > 0:
+                self._submit_child(parent, size)
+            self.wheel.schedule(parent, self.slicer.interval)
+
+    def _finished(self, parent: slicedOrder) -> bool:
+        return parent.remaining < self._min_size(parent) or self.slicer.finished(parent)
+
+    def _min_size(self, parent: slicedOrder) -> float:
+        return self.min_notional if parent.order.equity is not None else 1.0
+
+    def _child_size(self, parent: slicedOrder, volume: float, price: float) -> float:
+        size = self.slicer.child_size(parent, volume, price)
+        if parent.order.equity is None:
+            size = math.floor(size)
+        min_size = self._min_size(parent)
+        if size < min_size:
+            if self.slicer.needs_volume:
+                return 0.0
+            size = min_size
+        if parent.remaining - size < min_size:
+            # no child too small to send is left behind.
+            size = parent.remaining
+        return min(size, parent.remaining)
+
+    def _submit_child(self, parent: slicedOrder, size: float):
+        # a child rejected for lack of buying power is sent again at the next interval.
+        order = parent.order
+        if order.equity is not None:
+            order_entity = self.order_filler._submit_order(
+                order,
+                notional=round(size, 2),
+                type='market'
+            )
+            if order_entity is None:
+                return
+            self.journal.submit(order_entity.id, order.ticker, order.side, 'market',  # type: ignore
+                                notional=size)
+        else:
+            limit_price = get_limit(order.ticker, order.side, self.quote_cache)
+            order_entity = self.order_filler._submit_order(
+                order,
+                type='limit',
+                limit_price=str(limit_price),
+                qty=size
+            )
+            if order_entity is None:
+                return
+            self.journal.submit(order_entity.id, order.ticker, order.side, 'limit',  # type: ignore
+                                quantity=size, price=limit_price)
+        self.status_tracker.track(order_entity)
+        parent.slices_sent += 1
+        parent.remaining -= size
+        parent.children[order_entity.id] = size  # type: ignore
+        parent.last_child_id = order_entity.id  # type: ignore
+        self._children[order_entity.id] = parent  # type: ignore
+
+    def _cancel(self, child_id: str):
+        if child_id in self._cancelled or \
+                self.status_tracker.get_status(child_id) in FINAL_STATUSES:
+            return
+        try:
+            self.api.cancel_order(child_id)
+            self.journal.cancel(child_id)
+        except Exception as e:
+            if 'order is not open' not in str(e):
+                raise e
+        self._cancelled.add(child_id)
+
+    def _finish(self, parent: slicedOrder):
+        parent.done = True
+        parent.filled = filled = \
+            parent.remaining < self._min_size(parent) and parent.filled_amount > 0
+        latency = None if parent.filled_at is None else parent.filled_at - parent.started
+        if filled:
+            self.sink.record('order.time_to_fill', latency, type='sliced')
+        self.sink.record('slicing.children', parent.slices_sent, filled=filled)
+        average_price = parent.filled_cost / parent.filled_quantity \
+            if parent.filled_quantity else math.nan
+        self.order_filler._record_fill(
+            parent.order, parent.last_child_id, parent.order_type, parent.submitted_at,
+            filled, (parent.filled_quantity, average_price), latency, journal=False,
+            planned_price=parent.price)
@@ -0,0 +1,66 @@
+from dataclasses import dataclass, field
+from typing import Dict, TYPE_CHECKING
+import math
+
+if TYPE_CHECKING:
+    from alpaca_trade_api.rest import REST
+
+
+@dataclass
+class PortfolioSnapshot:
+    """Point in time view of the account, loaded once per rebalance
+    so that planning does not need a request per ticker.
+    """
+    account_equity: float
+    position_equity: Dict[str, float] = field(default_factory=dict)
+    cash: float = math.nan  # nan when unknown, e.g. for snapshots saved after a rebalance
+
+    @classmethod
+    def load(cls, api: 'REST') -> 'PortfolioSnapshot':
+        """Load the snapshot with one list_positions and one get_account call.
+
+        Args:
+            api (REST): alpaca api
+
+        Returns:
+            PortfolioSnapshot: snapshot of the account equity and position market values.
+        """
+        return cls.from_entities(api.list_positions(), api.get_account())
+
+    @classmethod
+    def from_entities(cls, positions, account) -> 'PortfolioSnapshot':
+        """Build the snapshot from list_positions and get_account results.
+
+        Args:
+            positions: position entities
+            account: account entity
+
+        Returns:
+            PortfolioSnapshot: snapshot of the account equity and position market values.
+        """
+        assert isinstance(account.equity, str)
+
+        position_equity = {}
+        for p in positions:
+            assert isinstance(p.symbol, str)
+            assert isinstance(p.market_value, str)
+            position_equity[p.symbol] = float(p.market_value)
+
+        cash = getattr(account, 'cash', None)
+        return cls(float(account.equity), position_equity,
+                   math.nan if cash is None else float(cash))
+
+    @property
+    def tickers(self):
+        return self.position_equity.keys()
+
+    def get_position_equity(self, ticker: str) -> float:
+        """Get the current equity of a ticker. (return 0 if no position)
+
+        Args:
+            ticker (str): ticker symbol
+
+        Returns:
+            float: equity if you have a position with the stock, else 0
+        """
+        return self.position_equity.get(ticker, 0.0)
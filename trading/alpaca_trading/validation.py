@@ -0,0 +1,157 @@
+from .quotes import quoteCache
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import logging
+import math
+import os
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+ASSET_FIELDS = ('tradable', 'fractionable', 'shortable', 'easy_to_borrow')
+
+
+@dataclass(slots=True)
+class Rejection:
+    """A ticker that failed pre-trade validation, and why."""
+    ticker: str
+    # 'unknown asset', 'not tradable', 'not fractionable', 'not shortable', 'no quote'
+    # or 'stale quote'
+    reason: str
+
+
+class assetCache:
+    """Asset metadata of every active asset, kept in a json file and refreshed
+    with one list_assets call once it is older than <max_age>.
+    """
+
+    def __init__(self, api: Any, path: str, max_age: float = 24 * 60 * 60):
+        """Create the cache. The file is read, or refreshed, on first use.
+
+        Args:
+            api (Any): broker api
+            path (str): json file the metadata is kept in.
+            max_age (float, optional): seconds before the metadata is refreshed.
+            Defaults to a day.
+        """
+        self.api = api
+        self.path = path
+        self.max_age = max_age
+        self.assets: Optional[Dict[str, Dict[str, bool]]] = None
+        self.updated_at = 0.0
+
+    def _load_file(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            state = json.load(f)
+        self.assets = state['assets']
+        self.updated_at = state['updated_at']
+
+    def refresh(self):
+        """Reload the metadata of every active asset from the api, and save it."""
+        self.assets = {
+            asset.symbol: {name: bool(getattr(asset, name, False)) for name in ASSET_FIELDS}
+            for asset in self.api.list_assets(status='active')
+        }
+        self.updated_at = time.time()
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'updated_at': self.updated_at, 'assets': self.assets}, f)
+        os.replace(tmp_path, self.path)
+        logger.info("refreshed metadata of %d assets", len(self.assets))
+
+    def get_assets(self) -> Dict[str, Dict[str, bool]]:
+        """Get the metadata of every asset, refreshing it if it is stale.
+
+        Returns:
+            Dict[str, Dict[str, bool]]: symbol to its tradable, fractionable,
+            shortable and easy_to_borrow flags.
+        """
+        if self.assets is None:
+            self._load_file()
+        if self.assets is None or time.time() - self.updated_at > self.max_age:
+            self.refresh()
+        return self.assets  # type: ignore
+
+
+class preTradeValidator:
+    """Check every ticker of a rebalance at once before any order is planned:
+    that it is a tradable asset, fractionable if it will get a notional order,
+    shortable if it will be shorted, and that it has a recent quote.
+    """
+
+    def __init__(self, quote_cache: quoteCache, asset_cache: Optional[assetCache] = None,
+                 max_quote_age: Optional[float] = 60 * 60):
+        """Create the validator.
+
+        Args:
+            quote_cache (quoteCache): cache the quotes are prefetched into.
+            asset_cache (assetCache, optional): asset metadata. Defaults to None,
+            in which case only quotes are checked.
+            max_quote_age (float, optional): seconds since the bar of a ticker's
+            latest quote past which it is rejected as stale. Defaults to an hour.
+            Right after the open, the latest bar of a ticker without pre-market
+            trades is from the previous session. None accepts any quote.
+        """
+        self.quote_cache = quote_cache
+        self.asset_cache = asset_cache
+        self.max_quote_age = max_quote_age
+
+    def validate(self, tickers: Iterable[str],
+                 notional: Optional[Iterable[bool]] = None,
+                 short: Optional[Iterable[bool]] = None) -> List[Rejection]:
+        """Validate the tickers of a rebalance, with one multi-symbol quote request
+        and the cached asset metadata. A ticker is rejected for the first check
+        it fails.
+
+        Args:
+            tickers (Iterable[str]): ticker symbols
+            notional (Iterable[bool], optional): whether each ticker gets a notional
+            order. Defaults to None (none do).
+            short (Iterable[bool], optional): whether each ticker will be held short.
+            Defaults to None (none are).
+
+        Returns:
+            List[Rejection]: the rejected tickers, in input order.
+        """
+        tickers = list(tickers)
+        notional = [False] * len(tickers) if notional is None else list(notional)
+        short = [False] * len(tickers) if short is None else list(short)
+
+        rejected: Dict[str, str] = {}
+        if self.asset_cache is not None:
+            assets = self.asset_cache.get_assets()
+            for ticker, is_notional, is_short in zip(tickers, notional, short):
+                asset = assets.get(ticker)
+                if asset is None:
+                    rejected[ticker] = 'unknown asset'
+                elif not asset['tradable']:
+                    rejected[ticker] = 'not tradable'
+                elif is_notional and not asset['fractionable']:
+                    rejected[ticker] = 'not fractionable'
+                elif is_short and not asset['shortable']:
+                    rejected[ticker] = 'not shortable'
+
+        to_quote = [ticker for ticker in tickers if ticker not in rejected]
+        quoted = self.quote_cache.prefetch(to_quote)
+        now = time.time()
+        for ticker in to_quote:
+            if ticker not in quoted:
+                # no minute bar in the snapshot, try the latest bar on its own.
+                try:
+                    self.quote_cache.load_latest_bar(ticker)
+                except Exception as e:
+                    logger.warning("no last close for %s: %s", ticker, e)
+                    rejected[ticker] = 'no quote'
+                    continue
+            quoted_at = self.quote_cache.quote_time(ticker)
+            if self.max_quote_age is not None and not math.isnan(quoted_at) and \
+                    now - quoted_at > self.max_quote_age:
+                logger.warning("last quote of %s is %.0fs old", ticker, now - quoted_at)
+                rejected[ticker] = 'stale quote'
+
+        return [Rejection(ticker, rejected[ticker]) for ticker in tickers if ticker in rejected]
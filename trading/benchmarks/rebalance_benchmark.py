@@ -0,0 +1,203 @@
+"""Benchmark how have_portfolio scales with portfolio size, broker latency and fill delay.
+
+Each run seeds a simulated account with an equal weight portfolio, then times
+a rebalance that rotates half of the names out, so that both the sell and the
+buy phase are exercised. Results are written as JSON so runs from different
+commits can be compared:
+
+    python -m TinyTitans.src.trading.benchmarks.rebalance_benchmark --output new.json
+    python -m TinyTitans.src.trading.benchmarks.rebalance_benchmark --compare old.json new.json
+"""
+from TinyTitans.src.trading.alpaca_trading import alpacaLimitTrader, alpacaMarketTrader
+from TinyTitans.src.trading.alpaca_trading.order_updates import localTradeUpdateStream
+from TinyTitans.src.trading.alpaca_trading.simulated_broker import simulatedBroker
+from collections import defaultdict
+from datetime import datetime
+from itertools import product
+from typing import Any, Dict, List
+import argparse
+import contextlib
+import io
+import json
+import platform
+import subprocess
+import threading
+import time
+import tracemalloc
+
+
+TRADERS = {'market': alpacaMarketTrader, 'limit': alpacaLimitTrader}
+
+
+class countingAPI:
+    """Proxy over a broker that counts calls per endpoint and per phase.
+
+    The phase is the current_phase of <trader> (see alpacaTrader.phase):
+    'liquidate' while cancelling orders and closing positions, 'fill' while
+    filling the orders, and 'plan' otherwise.
+    """
+
+    def __init__(self, api: Any):
+        self._api = api
+        self._lock = threading.Lock()
+        self.trader: Any = None
+        self.calls: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def reset(self):
+        self.calls.clear()
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._api, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            phase = 'plan' if self.trader is None else self.trader.current_phase
+            with self._lock:
+                self.calls[phase][name] += 1
+            return attr(*args, **kwargs)
+        return call
+
+
+def _targets(tickers: List[str]) -> Dict[str, float]:
+    return {ticker: 1 / len(tickers) for ticker in tickers}
+
+
+def _make_trader(trader: str, size: int, latency: float, fill_delay: float,
+                 max_workers: int, stream: bool, poll_interval: float):
+    tickers = [f'T{i:04d}' for i in range(size * 2)]
+    prices = {ticker: [10.0 + i % 90] for i, ticker in enumerate(tickers)}
+    trade_updates = localTradeUpdateStream() if stream else None
+    broker = simulatedBroker(prices, cash=10_000_000.0, latency=latency,
+                             fill_delay=fill_delay, stream=trade_updates)
+    api = countingAPI(broker)
+    instance = TRADERS[trader](max_workers=max_workers,
+                               trade_update_stream=trade_updates, api=api)  # type: ignore
+    api.trader = instance
+    instance.status_tracker.poll_interval = poll_interval
+    return instance, api, broker, tickers
+
+
+def run_once(trader: str, size: int, latency: float, fill_delay: float,
+             max_workers: int = 1, stream: bool = False,
+             poll_interval: float = 0.05, memory: bool = True) -> Dict[str, Any]:
+    """Time one rebalance of <size> names, half of them rotated out.
+
+    Returns:
+        Dict[str, Any]: the run parameters, 'wall_time' (s), 'calls' per phase and
+        endpoint, 'filled' (proportion of orders filled) and 'peak_memory' (bytes).
+    """
+    def rebalance(measure_memory: bool):
+        with contextlib.redirect_stdout(io.StringIO()):
+            instance, api, broker, tickers = _make_trader(
+                trader, size, latency, fill_delay, max_workers, stream, poll_interval)
+            if stream:
+                time.sleep(0.05)  # let the stream start
+            instance.have_portfolio(_targets(tickers[:size]))
+            api.reset()
+            rotated = tickers[:size // 2] + tickers[size:size + size - size // 2]
+
+            if measure_memory:
+                tracemalloc.start()
+            start = time.perf_counter()
+            results = instance.have_portfolio(_targets(rotated))
+            wall_time = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] if measure_memory else None
+            if measure_memory:
+                tracemalloc.stop()
+        instance.status_tracker.stop()
+        broker.close()
+        return wall_time, results, api.calls, peak
+
+    wall_time, results, calls, _ = rebalance(measure_memory=False)
+    peak = rebalance(measure_memory=True)[3] if memory else None
+    return {
+        'trader': trader,
+        'size': size,
+        'latency': latency,
+        'fill_delay': fill_delay,
+        'max_workers': max_workers,
+        'stream': stream,
+        'wall_time': wall_time,
+        'calls': {phase: dict(endpoints) for phase, endpoints in calls.items()},
+        'total_calls': sum(sum(endpoints.values()) for endpoints in calls.values()),
+        'filled': sum(results.values()) / len(results),
+        'peak_memory': peak,
+    }
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def run(traders: List[str], sizes: List[int], latencies: List[float],
+        fill_delays: List[float], **kwargs) -> Dict[str, Any]:
+    """Run the full sweep."""
+    results = []
+    for trader, size, latency, fill_delay in product(traders, sizes, latencies, fill_delays):
+        result = run_once(trader, size, latency, fill_delay, **kwargs)
+        print(f"{trader:>6} size={size:<5} latency={latency:<6} fill_delay={fill_delay:<6} "
+              f"wall={result['wall_time']:.3f}s calls={result['total_calls']} "
+              f"peak={result['peak_memory']}")
+        results.append(result)
+    return {
+        'commit': _commit(),
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'results': results,
+    }
+
+
+def compare(old_path: str, new_path: str):
+    """Print the wall time and call count ratio (new / old) of matching runs."""
+    def key(r):
+        return (r['trader'], r['size'], r['latency'], r['fill_delay'],
+                r['max_workers'], r['stream'])
+
+    with open(old_path) as f:
+        old = {key(r): r for r in json.load(f)['results']}
+    with open(new_path) as f:
+        new = json.load(f)['results']
+
+    for r in new:
+        o = old.get(key(r))
+        if o is None:
+            continue
+        print(f"{r['trader']:>6} size={r['size']:<5} latency={r['latency']:<6} "
+              f"fill_delay={r['fill_delay']:<6} "
+              f"wall x{r['wall_time'] / max(o['wall_time'], 1e-9):.2f} "
+              f"calls x{r['total_calls'] / max(o['total_calls'], 1):.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--traders', nargs='+', default=list(TRADERS), choices=list(TRADERS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 1000])
+    parser.add_argument('--latencies', nargs='+', type=float, default=[0.0, 0.002])
+    parser.add_argument('--fill-delays', nargs='+', type=float, default=[0.0, 0.02])
+    parser.add_argument('--max-workers', type=int, default=1)
+    parser.add_argument('--stream', action='store_true',
+                        help='detect fills from a local trade update stream instead of polling')
+    parser.add_argument('--poll-interval', type=float, default=0.05)
+    parser.add_argument('--no-memory', action='store_true', help='skip the peak memory run')
+    parser.add_argument('--output', default='rebalance_benchmark.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run(args.traders, args.sizes, args.latencies, args.fill_delays,
+                 max_workers=args.max_workers, stream=args.stream,
+                 poll_interval=args.poll_interval, memory=not args.no_memory)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark the cold start of a trader: importing the package and constructing a trader.
+
+Each repeat runs in a fresh interpreter, so the import is measured cold. The
+trader is constructed over a simulated broker with a per call latency, which
+shows any broker call made at construction. Results are written as JSON so
+runs from different commits can be compared:
+
+    python -m TinyTitans.src.trading.benchmarks.startup_benchmark --output new.json
+"""
+from datetime import datetime
+from statistics import median
+from typing import Any, Dict, List
+import argparse
+import json
+import platform
+import subprocess
+import sys
+
+
+PACKAGE = 'TinyTitans.src.trading.alpaca_trading'
+HEAVY_MODULES = ['pandas', 'numpy', 'alpaca_trade_api', 'requests']
+
+_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import {package} as package
+import_time = time.perf_counter() - start
+loaded = {{m: m in sys.modules for m in {heavy!r}}}
+
+broker = package.simulatedBroker({{'A': [10.0]}}, latency={latency!r})
+start = time.perf_counter()
+trader = package.{trader}(api=broker)
+construct_time = time.perf_counter() - start
+trader.status_tracker.stop()
+broker.close()
+print(json.dumps({{'import_time': import_time, 'construct_time': construct_time,
+                  'loaded': loaded}}))
+'''
+
+
+def run_once(trader: str, latency: float) -> Dict[str, Any]:
+    """Time the import and a construction in a fresh interpreter.
+
+    Returns:
+        Dict[str, Any]: 'import_time' (s), 'construct_time' (s) and whether each
+        heavy module was 'loaded' by the import.
+    """
+    script = _SCRIPT.format(package=PACKAGE, heavy=HEAVY_MODULES,
+                            latency=latency, trader=trader)
+    output = subprocess.run([sys.executable, '-c', script], capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return 'unknown'
+
+
+def run(traders: List[str], latency: float, repeats: int) -> Dict[str, Any]:
+    """Run <repeats> cold starts of each trader and report the medians."""
+    results = []
+    for trader in traders:
+        runs = [run_once(trader, latency) for _ in range(repeats)]
+        result = {
+            'trader': trader,
+            'latency': latency,
+            'import_time': median(r['import_time'] for r in runs),
+            'construct_time': median(r['construct_time'] for r in runs),
+            'loaded': runs[-1]['loaded'],
+        }
+        print(f"{trader:>18} import={result['import_time']:.3f}s "
+              f"construct={result['construct_time']:.4f}s "
+              f"loaded={[m for m, loaded in result['loaded'].items() if loaded]}")
+        results.append(result)
+    return {
+        'commit': _commit(),
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--traders', nargs='+',
+                        default=['alpacaMarketTrader', 'alpacaLimitTrader'])
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--output', default='startup_benchmark.json')
+    args = parser.parse_args()
+
+    report = run(args.traders, args.latency, args.repeats)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
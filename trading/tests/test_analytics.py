@@ -0,0 +1,36 @@
+from TinyTitans.src.trading.alpaca_trading import alpacaMarketTrader
+from TinyTitans.src.trading.alpaca_trading.simulated_broker import simulatedBroker
+from TinyTitans.src.trading.alpaca_trading.slicing import twapSlicer
+import pytest
+
+
+def test_market_slippage_against_the_planning_quote():
+    broker = simulatedBroker({'A': [10.0], 'B': [5.0]})
+    trader = alpacaMarketTrader(api=broker)
+    results = trader.have_portfolio({'A': 0.5, 'B': 0.5})
+
+    df = trader.get_slippage(results)
+    assert df['planned_price'].tolist() == [10.0, 5.0]
+    assert df['slippage'].tolist() == [0.0, 0.0]
+
+
+def test_sliced_slippage_against_the_planning_quote():
+    # the price rises from 10 to 11.5 while the buy is sliced.
+    broker = simulatedBroker({'A': [10.0, 10.0, 11.5]})
+    trader = alpacaMarketTrader(api=broker, slicer=twapSlicer(duration=0.2, slices=2),
+                                slice_tick=0.1)
+    trader.status_tracker.poll_interval = 0.05
+    real_get_snapshots = broker.get_snapshots
+
+    def get_snapshots(tickers):
+        snapshots = real_get_snapshots(tickers)
+        broker.advance()
+        return snapshots
+    broker.get_snapshots = get_snapshots
+
+    results = trader.have_portfolio({'A': 1.0})
+
+    df = trader.get_slippage(results)
+    assert df['planned_price'].tolist() == [10.0]
+    assert df['fill_price'].iloc[0] > 10.0
+    assert df['slippage'].iloc[0] == pytest.approx(df['fill_price'].iloc[0] / 10.0 - 1)
@@ -0,0 +1,67 @@
+from TinyTitans.src.trading.alpaca_trading import alpacaLimitTrader
+from TinyTitans.src.trading.alpaca_trading.journal import executionJournal, read_journal
+from TinyTitans.src.trading.alpaca_trading.simulated_broker import simulatedBroker
+
+
+def test_replay_in_flight_orders(tmp_path):
+    path = str(tmp_path / 'journal.bin')
+    journal = executionJournal(path, chunk_records=4)
+    journal.begin()
+    journal.submit('1', 'A', 'buy', 'limit', quantity=10, price=5.0)
+    journal.submit('2', 'B', 'sell', 'market', notional=100.0)
+    journal.submit('3', 'C', 'sell', 'close')
+    journal.replace('4', '1', 5.1)
+    journal.fill('2', 20, 5.0)
+    journal.cancel('3')
+    journal.close()
+
+    # reopened as after a crash, past the first chunk.
+    journal = executionJournal(path, chunk_records=4)
+    assert len(journal) == 7
+    assert journal.interrupted()
+    # the replaced limit buy, at its latest id and price.
+    assert [(o.order_id, o.ticker, o.side, o.order_type, o.quantity, o.price)
+            for o in journal.in_flight()] == [('4', 'A', 'buy', 'limit', 10.0, 5.1)]
+
+    journal.end()
+    assert not journal.interrupted()
+    assert journal.in_flight() == []
+    journal.close()
+    assert len(read_journal(path)) == 8
+
+
+def test_only_the_last_rebalance_is_replayed(tmp_path):
+    journal = executionJournal(str(tmp_path / 'journal.bin'))
+    journal.begin()
+    journal.submit('1', 'A', 'buy', 'market', notional=100.0)
+    journal.end()
+    journal.begin()
+    journal.submit('2', 'B', 'buy', 'market', notional=100.0)
+
+    assert [order.order_id for order in journal.in_flight()] == ['2']
+    journal.close()
+
+
+
+def test_resume_from_an_unjournaled_replacement(tmp_path):
+    path = str(tmp_path / 'journal.bin')
+    journal = executionJournal(path)
+    broker = simulatedBroker({'A': [10.0]})
+    journal.begin()
+    order = broker.submit_order(symbol='A', qty=10, side='buy', type='limit',
+                                limit_price='9.0', time_in_force='day')
+    journal.submit(order.id, 'A', 'buy', 'limit', quantity=10, price=9.0)
+    # interrupted after replace_order, before the replacement was journaled.
+    broker.replace_order(order.id, limit_price='9.8')
+    journal.close()
+
+    journal = executionJournal(path)
+    trader = alpacaLimitTrader(api=broker, journal=journal)
+    trader.order_filler.resume(journal.in_flight(), jitter=0)
+    assert broker.positions == {'A': 10.0}
+    assert journal.in_flight() == []
+
+    # the next rebalance does not resume it again.
+    trader.have_portfolio({'A': 1.0})
+    assert not journal.interrupted()
+    journal.close()
@@ -0,0 +1,41 @@
+from TinyTitans.src.trading.alpaca_trading.journal import executionJournal, read_journal
+from TinyTitans.src.trading.alpaca_trading.multi_account import AccountCredentials, \
+    multiAccountRebalancer
+from TinyTitans.src.trading.alpaca_trading.rebalance_state import rebalanceState
+from TinyTitans.src.trading.alpaca_trading.simulated_broker import simulatedBroker
+import pytest
+
+
+CREDENTIALS = [AccountCredentials('key-a', 'secret', name='a'),
+               AccountCredentials('key-b', 'secret', name='b')]
+
+
+def test_accounts_keep_their_own_journal_and_state(tmp_path):
+    brokers = {'a': simulatedBroker({'A': [10.0], 'B': [20.0]}, cash=1000.0),
+               'b': simulatedBroker({'A': [10.0], 'B': [20.0]}, cash=5000.0)}
+    journals = {}
+
+    def trader_kwargs(credentials):
+        journals[credentials.name] = executionJournal(str(tmp_path / f'{credentials.name}.bin'))
+        return {'journal': journals[credentials.name],
+                'rebalance_state': rebalanceState(str(tmp_path / f'{credentials.name}.json'))}
+
+    rebalancer = multiAccountRebalancer(
+        CREDENTIALS, api_factory=lambda credentials: brokers[credentials.name],
+        trader_kwargs_factory=trader_kwargs)
+    result = rebalancer.have_portfolio({'A': 0.5, 'B': 0.5})
+
+    assert result.errors == {}
+    for name, broker in brokers.items():
+        journals[name].close()
+        records = read_journal(str(tmp_path / f'{name}.bin'))
+        order_ids = {order_id.decode() for order_id in records['order_id']} - {''}
+        assert order_ids and order_ids <= set(broker.orders)
+        state = rebalanceState(str(tmp_path / f'{name}.json'))
+        assert state.snapshot.account_equity == float(broker.get_account().equity)
+    assert rebalancer.traders['a'].journal is not rebalancer.traders['b'].journal
+
+
+def test_shared_account_state_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        multiAccountRebalancer(CREDENTIALS, journal=executionJournal(str(tmp_path / 'j.bin')))
@@ -0,0 +1,96 @@
+from TinyTitans.src.trading.alpaca_trading.order_updates import localTradeUpdateStream, \
+    orderStatusTracker
+from TinyTitans.src.trading.alpaca_trading.simulated_broker import simulatedBroker
+from collections import Counter
+import threading
+import time
+
+
+TICKERS = 'ABCDEFGHIJ'
+
+
+class countingAPI:
+    def __init__(self, api):
+        self._api = api
+        self.calls = Counter()
+
+    def __getattr__(self, name):
+        attr = getattr(self._api, name)
+
+        def call(*args, **kwargs):
+            self.calls[name] += 1
+            return attr(*args, **kwargs)
+        return call
+
+
+def _tracker(**kwargs):
+    stream = localTradeUpdateStream()
+    broker = simulatedBroker({ticker: [10.0 * (i + 1)] for i, ticker in enumerate(TICKERS)},
+                             fill_delay=0.2, stream=stream)
+    api = countingAPI(broker)
+    tracker = orderStatusTracker(api, stream, poll_interval=0.05, **kwargs)
+    tracker.start()
+    deadline = time.monotonic() + 2
+    while not stream.running and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return tracker, broker, stream, api
+
+
+def _wait_all(tracker, orders):
+    statuses = {}
+
+    def wait(order_id):
+        statuses[order_id] = tracker.wait(order_id, timeout=5)
+    threads = [threading.Thread(target=wait, args=(order.id,)) for order in orders]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+
+def test_fills_from_the_stream_without_polling():
+    tracker, broker, stream, api = _tracker()
+    orders = [broker.submit_order(symbol=ticker, qty=1, side='buy', type='market',
+                                  time_in_force='day') for ticker in TICKERS]
+
+    assert set(_wait_all(tracker, orders).values()) == {'filled'}
+    assert api.calls['list_orders'] == 0 and api.calls['get_order'] == 0
+    assert tracker.get_fill(orders[0].id) == (1.0, 10.0)
+    tracker.stop()
+    broker.close()
+
+
+def test_stopped_stream_falls_back_to_batched_polling():
+    tracker, broker, stream, api = _tracker()
+    stream.stop()
+    orders = [broker.submit_order(symbol=ticker, qty=1, side='buy', type='market',
+                                  time_in_force='day') for ticker in TICKERS]
+
+    assert set(_wait_all(tracker, orders).values()) == {'filled'}
+    assert not tracker.stream_connected
+    # one list_orders call refreshes every waiting order, instead of a call per
+    # order every poll interval of the fill delay.
+    assert 0 < api.calls['list_orders'] < len(orders) * 0.2 / 0.05 / 2
+    assert api.calls['get_order'] == 0
+    assert tracker.get_fill(orders[2].id) == (1.0, 30.0)
+    broker.close()
+
+
+def test_silent_stream_falls_back_after_the_grace_period():
+    tracker, broker, stream, api = _tracker(stream_grace=0.1)
+    # the stream stays up but stops delivering updates.
+    stream.subscribe_trade_updates(_drop)
+    order = broker.submit_order(symbol='A', qty=1, side='buy', type='market',
+                                time_in_force='day')
+
+    start = time.monotonic()
+    assert tracker.wait(order.id, timeout=5) == 'filled'
+    assert time.monotonic() - start < 1
+    assert api.calls['list_orders'] > 0
+    tracker.stop()
+    broker.close()
+
+
+async def _drop(data):
+    pass
@@ -0,0 +1,33 @@
+from TinyTitans.src.trading.alpaca_trading.planner import plan_orders
+import numpy as np
+
+
+def test_notional_orders():
+    orders = plan_orders(['A', 'B', 'C', 'D'], [500.0, 300.0, 250.0, 0.0],
+                         [0.0, 0.2, 0.25, 0.55], 1000.0)
+
+    # C is already at its target, so it has no order.
+    assert orders.ticker.tolist() == ['A', 'B', 'D']
+    assert orders.side.tolist() == ['sell', 'sell', 'buy']
+    assert orders.equity.tolist() == [500.0, 100.0, 550.0]
+    assert np.isnan(orders.quantity).all()
+    assert orders.close_position.tolist() == [True, False, False]
+
+
+def test_quantity_orders():
+    orders = plan_orders(['A', 'B', 'C'], [500.0, 0.0, 0.0], [0.0, 0.5, 0.001], 1000.0,
+                         prices=[600.0, 30.0, 7.0])
+
+    # A rounds down to 0 shares but closes its position, C rounds down to 0 shares.
+    assert orders.ticker.tolist() == ['A', 'B']
+    assert orders.quantity.tolist() == [0.0, 16.0]
+    assert np.isnan(orders.equity).all()
+    assert orders.close_position.tolist() == [True, False]
+
+
+def test_phases():
+    orders = plan_orders(['A', 'B', 'C'], [500.0, 500.0, 0.0], [0.0, 0.3, 0.7], 1000.0)
+
+    assert orders.phase('closes').ticker.tolist() == ['A']
+    assert orders.phase('sells').ticker.tolist() == ['B']
+    assert orders.phase('buys').ticker.tolist() == ['C']
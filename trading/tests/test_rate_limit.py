@@ -0,0 +1,143 @@
+from TinyTitans.src.trading.alpaca_trading.rate_limit import rateLimitedAPI
+from collections import Counter
+import threading
+import time
+
+
+class rateLimitError(Exception):
+    status_code = 429
+
+
+class fakeAPI:
+    def __init__(self, delay=0.0, fail_first=0):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.calls = []
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def _call(self, name, *args):
+        with self._lock:
+            self.calls.append((name, time.monotonic()) + args)
+            self.counts[name] += 1
+            fail = self.counts[name] <= self.fail_first
+        if fail:
+            raise rateLimitError('too many requests')
+        time.sleep(self.delay)
+        return (name,) + args
+
+    def get_order(self, order_id):
+        return self._call('get_order', order_id)
+
+    def get_position(self, symbol):
+        return self._call('get_position', symbol)
+
+    def submit_order(self, symbol):
+        return self._call('submit_order', symbol)
+
+
+class recordingSink:
+    def __init__(self):
+        self.records = []
+
+    def record(self, metric, value, **tags):
+        self.records.append((metric, value, tags))
+
+
+def _run(*targets):
+    threads = []
+    for target, args in targets:
+        thread = threading.Thread(target=target, args=args)
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)
+    return threads
+
+
+def test_burst_then_refill_at_the_set_rate():
+    api = fakeAPI()
+    limited = rateLimitedAPI(api, requests_per_minute=600, burst=5)
+
+    start = time.monotonic()
+    for i in range(10):
+        limited.get_position(str(i))
+    times = [called - start for _, called, _ in api.calls]
+
+    assert times[4] < 0.05
+    # the rest wait for the bucket to refill at 10 requests a second.
+    gaps = [later - earlier for earlier, later in zip(times[4:], times[5:])]
+    assert all(0.07 < gap < 0.2 for gap in gaps)
+    assert 0.4 < times[-1] < 0.7
+
+
+def test_writes_go_ahead_of_waiting_reads():
+    api = fakeAPI()
+    limited = rateLimitedAPI(api, requests_per_minute=300, burst=1)
+    limited.get_position('drain')
+
+    threads = _run((limited.get_position, ('A',)),
+                   (limited.get_position, ('B',)),
+                   (limited.submit_order, ('C',)))
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert [call[0] for call in api.calls] == \
+        ['get_position', 'submit_order', 'get_position', 'get_position']
+
+
+def test_rate_limited_call_is_retried_until_it_succeeds():
+    api = fakeAPI(fail_first=2)
+    sink = recordingSink()
+    limited = rateLimitedAPI(api, requests_per_minute=6000, backoff=0.05, sink=sink)
+
+    start = time.monotonic()
+    assert limited.submit_order('A') == ('submit_order', 'A')
+
+    assert api.counts['submit_order'] == 3
+    assert sink.records == [('rest.retries', 1, {'endpoint': 'submit_order'})] * 2
+    # paused 0.05s, then 0.1s.
+    assert time.monotonic() - start >= 0.15
+
+
+def test_rate_limited_call_gives_up_after_max_retries():
+    api = fakeAPI(fail_first=10)
+    limited = rateLimitedAPI(api, requests_per_minute=6000, max_retries=2, backoff=0.01)
+
+    try:
+        limited.submit_order('A')
+        assert False, 'expected the 429 to be raised'
+    except rateLimitError:
+        pass
+    assert api.counts['submit_order'] == 3
+
+
+def test_identical_reads_in_flight_are_coalesced():
+    api = fakeAPI(delay=0.2)
+    limited = rateLimitedAPI(api, requests_per_minute=6000)
+    results = []
+
+    def read(order_id):
+        results.append(limited.get_order(order_id))
+
+    threads = [threading.Thread(target=read, args=('1',)) for _ in range(5)]
+    threads.append(threading.Thread(target=read, args=('2',)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert api.counts['get_order'] == 2
+    assert sorted(results) == [('get_order', '1')] * 5 + [('get_order', '2')]
+
+
+def test_writes_are_not_coalesced():
+    api = fakeAPI(delay=0.1)
+    limited = rateLimitedAPI(api, requests_per_minute=6000)
+
+    threads = [threading.Thread(target=limited.submit_order, args=('A',)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert api.counts['submit_order'] == 3
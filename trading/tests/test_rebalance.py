@@ -0,0 +1,64 @@
+from TinyTitans.src.trading.alpaca_trading import alpacaLimitTrader, alpacaMarketTrader
+from TinyTitans.src.trading.alpaca_trading.journal import executionJournal
+from TinyTitans.src.trading.alpaca_trading.simulated_broker import simulatedBroker
+import pytest
+import time
+
+
+PRICES = {'T0': [10.0], 'T1': [20.0], 'T2': [25.0], 'T3': [50.0], 'X': [5.0]}
+
+
+def _seeded(trader_class, **kwargs):
+    broker = simulatedBroker(PRICES, cash=100000.0)
+    trader = trader_class(api=broker, **kwargs)
+    trader.status_tracker.poll_interval = 0.05
+    assert all(trader.have_portfolio({'T0': 0.3, 'T1': 0.4, 'T2': 0.3}).values())
+    return trader, broker
+
+
+def _new_orders(broker, seen):
+    return [order for order_id, order in broker.orders.items() if order_id not in seen]
+
+
+@pytest.mark.parametrize('trader_class', [alpacaMarketTrader, alpacaLimitTrader])
+def test_liquidate_then_sell_then_buy(trader_class, tmp_path):
+    journal = executionJournal(str(tmp_path / 'journal.bin'))
+    trader, broker = _seeded(trader_class, journal=journal)
+    seen = set(broker.orders)
+
+    results = trader.have_portfolio({'T1': 0.2, 'T2': 0.3, 'T3': 0.5})
+
+    assert results == {'T0': True, 'T1': True, 'T2': True, 'T3': True}
+    assert 'T0' not in broker.positions
+    equity = float(broker.get_account().equity)
+    for ticker, weight in (('T1', 0.2), ('T2', 0.3), ('T3', 0.5)):
+        value = broker.positions.get(ticker, 0.0) * PRICES[ticker][0]
+        assert value == pytest.approx(weight * equity, abs=PRICES[ticker][0] + 1)
+    # T0 is closed before T1 is sold, and T3 is bought last.
+    orders = [(order['symbol'], order['side']) for order in _new_orders(broker, seen)]
+    assert orders == [('T0', 'sell'), ('T1', 'sell'), ('T3', 'buy')]
+    assert not journal.interrupted()
+    journal.close()
+
+
+def test_delayed_close_is_not_sold_again():
+    trader, broker = _seeded(alpacaMarketTrader)
+    # the account is fully invested, so the unrelated open order is a sell.
+    broker.submit_order(symbol='X', qty=1, side='sell', type='limit',
+                        limit_price='100.0', time_in_force='day')
+    seen = set(broker.orders)
+    # closes are waited on for 10 seconds.
+    broker.fill_delay = 10.5
+
+    results = trader.have_portfolio({'T1': 0.4, 'T2': 0.3, 'T3': 0.3})
+
+    assert results['T0'] is False
+    # the buy funded by the close is rejected for lack of buying power.
+    assert results['T3'] is False and 'T3' not in broker.positions
+    t0_orders = [order for order in _new_orders(broker, seen) if order['symbol'] == 'T0']
+    assert len(t0_orders) == 1
+    time.sleep(0.6)
+    broker.list_positions()  # matches the orders past their delay
+    assert 'T0' not in broker.positions
+    # open orders of tickers outside the rebalance are left alone.
+    assert 'X' in [order.symbol for order in broker.list_orders(status='open')]
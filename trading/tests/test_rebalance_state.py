@@ -0,0 +1,61 @@
+from TinyTitans.src.trading.alpaca_trading.rebalance_state import rebalanceState
+from TinyTitans.src.trading.alpaca_trading.snapshot import PortfolioSnapshot
+from types import SimpleNamespace
+import pandas as pd
+
+
+def _df(current, targets, account_equity=1000.0):
+    tickers = list(targets)
+    return pd.DataFrame({
+        'ticker': tickers,
+        'portfolio_pct': [targets[t] for t in tickers],
+        'current_position_equity': [current.get(t, 0.0) for t in tickers],
+        'desired_position_equity': [targets[t] * account_equity for t in tickers],
+    })
+
+
+def _position(symbol, market_value):
+    return SimpleNamespace(symbol=symbol, market_value=str(market_value))
+
+
+def test_select_everything_without_state(tmp_path):
+    state = rebalanceState(str(tmp_path / 'state.json'))
+    df = _df({'A': 500.0}, {'A': 0.5, 'B': 0.5})
+
+    assert state.select(df, 1000.0)['ticker'].tolist() == ['A', 'B']
+
+
+def test_select_changed_and_drifted(tmp_path):
+    path = str(tmp_path / 'state.json')
+    targets = {'A': 0.5, 'B': 0.3, 'C': 0.2}
+    state = rebalanceState(path, drift_tolerance=0.01)
+    state.save(targets, PortfolioSnapshot(1000.0, {}), _df({}, targets),
+               {'A': True, 'B': True, 'C': True})
+
+    # reloaded from the file: B's target changed and C drifted past the tolerance.
+    state = rebalanceState(path, drift_tolerance=0.01)
+    df = _df({'A': 505.0, 'B': 300.0, 'C': 150.0}, {'A': 0.5, 'B': 0.35, 'C': 0.2})
+    assert state.select(df, 1000.0)['ticker'].tolist() == ['B', 'C']
+
+
+def test_save_keeps_unfilled_positions(tmp_path):
+    targets = {'A': 0.5, 'B': 0.5}
+    state = rebalanceState(str(tmp_path / 'state.json'))
+    state.save(targets, PortfolioSnapshot(1000.0, {'A': 100.0, 'B': 100.0}),
+               _df({'A': 100.0, 'B': 100.0}, targets), {'A': True, 'B': False})
+
+    assert state.snapshot.position_equity == {'A': 500.0, 'B': 100.0}
+
+
+def test_cached_snapshot_checks_positions(tmp_path):
+    targets = {'A': 0.5, 'B': 0.5}
+    state = rebalanceState(str(tmp_path / 'state.json'), snapshot_max_age=60)
+    state.save(targets, PortfolioSnapshot(1000.0, {}), _df({}, targets),
+               {'A': True, 'B': True})
+
+    snapshot = state.cached_snapshot([_position('A', 490.0), _position('B', 500.0)])
+    assert snapshot == PortfolioSnapshot(1000.0, {'A': 490.0, 'B': 500.0}, 10.0)
+    assert state.cached_snapshot([_position('A', 490.0)]) is None
+
+    state.snapshot_max_age = 0
+    assert state.cached_snapshot([_position('A', 490.0), _position('B', 500.0)]) is None
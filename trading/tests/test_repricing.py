@@ -0,0 +1,50 @@
+from TinyTitans.src.trading.alpaca_trading.order import Order
+from TinyTitans.src.trading.alpaca_trading.order_filling import orderFiller
+from TinyTitans.src.trading.alpaca_trading.simulated_broker import simulatedBroker
+
+
+def _filler(prices):
+    broker = simulatedBroker(prices)
+    filler = orderFiller(broker)
+    filler.status_tracker.poll_interval = 0.05
+    return filler, broker
+
+
+def test_sequential_fill_works_a_phase_of_limits_together():
+    filler, broker = _filler({'A': [10.0], 'B': [20.0], 'C': [5.0]})
+    broker.submit_order(symbol='C', qty=100, side='buy', type='market', time_in_force='day')
+    batches = []
+    fill_limit_orders = filler.fill_limit_orders
+
+    def spy(orders, **kwargs):
+        batches.append([order.ticker for order in orders])
+        return fill_limit_orders(orders, **kwargs)
+    filler.fill_limit_orders = spy
+
+    results = filler.fill_orders([Order('C', 'sell', quantity=100), Order('A', 'buy', quantity=10),
+                                  Order('B', 'buy', quantity=10)], max_workers=1)
+
+    assert results == [True, True, True]
+    assert batches == [['C'], ['A', 'B']]
+
+
+def test_attempt_to_fill_reprices_with_the_repricer():
+    filler, broker = _filler({'A': [10.0]})
+    order = broker.submit_order(symbol='A', qty=10, side='buy', type='limit',
+                                limit_price='9.8', time_in_force='day')
+
+    assert filler.attempt_to_fill_limit_order(order, jitter=0)
+    # each step raises the last limit by 0.5% more than the step before.
+    limits = [float(o['limit_price']) for o in broker.orders.values()]
+    assert limits == [9.8, 9.85, 9.95, 10.1]
+    assert broker.positions == {'A': 10.0}
+
+
+def test_attempt_to_fill_gives_up_at_the_max_limit():
+    filler, broker = _filler({'A': [10.0]})
+    order = broker.submit_order(symbol='A', qty=10, side='buy', type='limit',
+                                limit_price='9.0', time_in_force='day')
+
+    assert not filler.attempt_to_fill_limit_order(order, max_limit_scaler=0.01, jitter=0)
+    assert broker.list_orders(status='open') == []
+    assert broker.positions == {}
@@ -0,0 +1,92 @@
+from TinyTitans.src.trading.alpaca_trading.schedule import MARKET_TZ, marketCalendar
+from TinyTitans.src.trading.alpaca_trading.simulated_broker import simulatedBroker
+from datetime import datetime, timedelta
+
+
+class countingCalendarAPI:
+    def __init__(self):
+        self._api = simulatedBroker({'A': [10.0]})
+        self.ranges = []
+
+    def get_calendar(self, start=None, end=None):
+        self.ranges.append((start, end))
+        return self._api.get_calendar(start, end)
+
+
+def _calendar(tmp_path, days_ahead=30):
+    api = countingCalendarAPI()
+    return marketCalendar(api, str(tmp_path / 'calendar.json'), days_ahead=days_ahead), api
+
+
+def _today():
+    return datetime.now(MARKET_TZ).date()
+
+
+def test_lookups_in_range_fetch_once(tmp_path):
+    calendar, api = _calendar(tmp_path)
+
+    for days in range(30):
+        calendar.session(_today() + timedelta(days=days))
+
+    assert len(api.ranges) == 1
+
+
+def test_lookup_past_the_range_widens_it(tmp_path):
+    calendar, api = _calendar(tmp_path)
+    calendar.session(_today())
+    far = _today() + timedelta(days=100)
+
+    for days in range(20):
+        calendar.session(far + timedelta(days=days))
+    calendar.session(_today())
+
+    # one fetch for the default range, one widening it past <far>.
+    assert len(api.ranges) == 2
+    assert api.ranges[1] == (_today().isoformat(), (far + timedelta(days=30)).isoformat())
+
+
+def test_lookup_before_the_range_widens_it(tmp_path):
+    calendar, api = _calendar(tmp_path)
+    calendar.session(_today())
+    past = _today() - timedelta(days=60)
+
+    calendar.session(past)
+    calendar.session(_today() + timedelta(days=10))
+
+    assert len(api.ranges) == 2
+    assert calendar.start == past.isoformat()
+
+
+def test_calendar_is_read_from_the_file(tmp_path):
+    calendar, api = _calendar(tmp_path)
+    calendar.session(_today())
+
+    reloaded = marketCalendar(api, calendar.path, days_ahead=30)
+    reloaded.session(_today())
+
+    assert len(api.ranges) == 1
+
+
+def test_next_open_uses_one_calendar_range(tmp_path):
+    calendar, api = _calendar(tmp_path)
+    # a friday evening past the cached range.
+    friday = _today() + timedelta(days=200)
+    friday += timedelta(days=(4 - friday.weekday()) % 7)
+    after = datetime.combine(friday, datetime.min.time(), MARKET_TZ).replace(hour=18)
+
+    opens = calendar.next_open(after)
+
+    assert opens == datetime.combine(friday + timedelta(days=3), datetime.min.time(),
+                                     MARKET_TZ).replace(hour=9, minute=30)
+    assert len(api.ranges) == 1
+
+
+def test_next_open_before_the_open_is_the_same_day(tmp_path):
+    calendar, api = _calendar(tmp_path)
+    monday = _today() + timedelta(days=7 - _today().weekday())
+    after = datetime.combine(monday, datetime.min.time(), MARKET_TZ).replace(hour=8)
+
+    assert calendar.next_open(after) == after.replace(hour=9, minute=30)
+    assert calendar.next_open(after.replace(hour=10)) == \
+        after.replace(hour=9, minute=30) + timedelta(days=1)
+    assert len(api.ranges) == 1
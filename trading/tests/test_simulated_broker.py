@@ -0,0 +1,64 @@
+from TinyTitans.src.trading.alpaca_trading.simulated_broker import simulatedBroker
+import pytest
+
+
+def _submit(broker, symbol, side, **kwargs):
+    return broker.submit_order(symbol=symbol, side=side, time_in_force='day', **kwargs)
+
+
+def test_buy_beyond_cash_is_rejected():
+    broker = simulatedBroker({'A': [10.0]}, cash=1000.0)
+
+    with pytest.raises(Exception, match='insufficient buying power'):
+        _submit(broker, 'A', 'buy', notional=1000.01)
+    with pytest.raises(Exception, match='insufficient buying power'):
+        _submit(broker, 'A', 'buy', qty=101, type='market')
+
+    _submit(broker, 'A', 'buy', qty=100, type='market')
+    assert broker.positions == {'A': 100.0}
+    assert broker.cash == 0.0
+    assert not [order for order in broker.orders.values() if order['qty'] == '101']
+
+
+def test_filled_sell_proceeds_fund_buys():
+    broker = simulatedBroker({'A': [10.0], 'B': [20.0]}, cash=1000.0)
+    _submit(broker, 'A', 'buy', notional=1000.0)
+
+    with pytest.raises(Exception, match='insufficient buying power'):
+        _submit(broker, 'B', 'buy', notional=500.0)
+    _submit(broker, 'A', 'sell', qty=50, type='market')
+    _submit(broker, 'B', 'buy', notional=500.0)
+
+    assert broker.positions == {'A': 50.0, 'B': 25.0}
+
+
+def test_unfilled_sell_proceeds_do_not_fund_buys():
+    broker = simulatedBroker({'A': [10.0], 'B': [20.0]}, cash=1000.0)
+    _submit(broker, 'A', 'buy', notional=1000.0)
+    broker.fill_delay = 60
+
+    _submit(broker, 'A', 'sell', qty=50, type='market')
+    with pytest.raises(Exception, match='insufficient buying power'):
+        _submit(broker, 'B', 'buy', notional=500.0)
+
+
+def test_open_buys_hold_buying_power():
+    broker = simulatedBroker({'A': [10.0]}, cash=1000.0)
+    # rests below the price, holding 60 * 9.
+    _submit(broker, 'A', 'buy', qty=60, type='limit', limit_price='9.0')
+    assert float(broker.get_account().buying_power) == pytest.approx(460.0)
+
+    with pytest.raises(Exception, match='insufficient buying power'):
+        _submit(broker, 'A', 'buy', qty=50, type='market')
+    # a limit above the price fills at the price.
+    _submit(broker, 'A', 'buy', qty=46, type='limit', limit_price='10.5')
+    assert broker.positions == {'A': 46.0}
+
+
+def test_sells_need_no_buying_power():
+    broker = simulatedBroker({'A': [10.0]}, cash=0.0)
+
+    _submit(broker, 'A', 'sell', qty=5, type='market')
+
+    assert broker.positions == {'A': -5.0}
+    assert broker.cash == 50.0
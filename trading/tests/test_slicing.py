@@ -0,0 +1,36 @@
+from TinyTitans.src.trading.alpaca_trading import alpacaMarketTrader
+from TinyTitans.src.trading.alpaca_trading.order import Order
+from TinyTitans.src.trading.alpaca_trading.simulated_broker import simulatedBroker
+from TinyTitans.src.trading.alpaca_trading.slicing import sliceScheduler, twapSlicer
+
+
+def test_rejected_child_is_sent_again_at_the_next_interval():
+    broker = simulatedBroker({'A': [10.0]}, cash=60.0)
+    trader = alpacaMarketTrader(api=broker)
+    trader.status_tracker.poll_interval = 0.05
+    scheduler = sliceScheduler(trader.order_filler, twapSlicer(duration=0.2, slices=2), tick=0.1)
+    real_submit_order = broker.submit_order
+    real_get_snapshots = broker.get_snapshots
+    rejected = []
+
+    def submit_order(**kwargs):
+        try:
+            return real_submit_order(**kwargs)
+        except Exception as e:
+            rejected.append(str(e))
+            raise
+
+    def get_snapshots(tickers):
+        if rejected and broker.cash < 50.0:
+            # the proceeds of a sell come in after the second child was rejected.
+            broker.cash += 50.0
+        return real_get_snapshots(tickers)
+    broker.submit_order = submit_order
+    broker.get_snapshots = get_snapshots
+
+    results = scheduler.fill_orders([Order('A', 'buy', equity=100.0)])
+
+    assert results == [True]
+    assert rejected == ['insufficient buying power']
+    assert broker.positions['A'] == 10.0
+    assert [order['notional'] for order in broker.orders.values()] == ['50.0', '50.0']
@@ -0,0 +1,147 @@
+from TinyTitans.src.trading.utils import httpClient, minuteBarStore, get_last_closes
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import json
+import os
+import threading
+import pytest
+
+
+DATE = '2024-03-05'
+DAY_START = 1709649000000  # 09:30 ET on DATE, in ms.
+
+
+class polygonStub:
+    """Serves minute aggregates for the bars in <bars>, recording each request path."""
+
+    def __init__(self):
+        self.bars = {}
+        self.requests = []
+        stub = self
+
+        class handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = urlparse(self.path).path
+                stub.requests.append(path)
+                # /v2/aggs/ticker/<ticker>/range/1/minute/<start>/<date>
+                parts = path.split('/')
+                ticker, start = parts[4], parts[8]
+                bars = stub.bars.get(ticker, [])
+                if start.isdigit():
+                    bars = [bar for bar in bars if bar['t'] >= int(start)]
+                body = json.dumps({'results': bars} if bars else {}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def add_bars(self, ticker, closes):
+        bars = self.bars.setdefault(ticker, [])
+        for close in closes:
+            t = DAY_START + 60000 * len(bars)
+            bars.append({'t': t, 'o': close, 'h': close, 'l': close, 'c': close, 'v': 100.0})
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    stub = polygonStub()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def client(stub):
+    client = httpClient(base_url=stub.url, max_workers=4, retries=0)
+    yield client
+    client.close()
+
+
+def test_update_appends_only_the_new_bars(tmp_path, stub, client):
+    store = minuteBarStore(str(tmp_path), client=client)
+    stub.add_bars('A', [10.0, 10.5, 11.0])
+
+    assert store.update('A', DATE) == 3
+    assert store.bars('A', DATE)['c'].tolist() == [10.0, 10.5, 11.0]
+
+    stub.add_bars('A', [11.5, 12.0])
+    assert store.update('A', DATE) == 2
+    bars = store.bars('A', DATE)
+    assert bars['c'].tolist() == [10.0, 10.5, 11.0, 11.5, 12.0]
+    assert (bars['t'][1:] - bars['t'][:-1] == 60000).all()
+    # the second request starts after the last stored bar.
+    assert stub.requests[-1].endswith(f'/{DAY_START + 2 * 60000 + 1}/{DATE}')
+
+    assert store.update('A', DATE) == 0
+    assert len(store.bars('A', DATE)['t']) == 5
+
+
+def test_bars_are_read_back_from_disk(tmp_path, stub, client):
+    stub.add_bars('A', [10.0, 10.5])
+    minuteBarStore(str(tmp_path), client=client).update('A', DATE)
+
+    store = minuteBarStore(str(tmp_path), client=client)
+    assert store.bars('A', DATE)['c'].tolist() == [10.0, 10.5]
+    assert store.last_close('A', DATE) == 10.5
+    assert len(stub.requests) == 2
+
+
+def test_last_close_only_updates_once_per_refresh_interval(tmp_path, stub, client):
+    store = minuteBarStore(str(tmp_path), client=client, refresh_interval=60)
+    stub.add_bars('A', [10.0])
+
+    assert store.last_close('A', DATE) == 10.0
+    stub.add_bars('A', [11.0])
+    assert store.last_close('A', DATE) == 10.0
+    assert len(stub.requests) == 1
+
+    store.refresh_interval = 0
+    assert store.last_close('A', DATE) == 11.0
+
+
+def test_get_last_closes(tmp_path, stub, client):
+    store = minuteBarStore(str(tmp_path), client=client, max_age_days=None)
+    stub.add_bars('A', [10.0, 10.5])
+    stub.add_bars('B', [20.0])
+
+    closes = get_last_closes(['A', 'B', 'C'], client=client, store=store)
+
+    # C has no bars, so it is left out.
+    assert closes == {'A': 10.5, 'B': 20.0}
+    assert os.listdir(tmp_path / 'A') and not (tmp_path / 'C').exists()
+
+
+def test_update_trims_old_days(tmp_path, stub, client):
+    store = minuteBarStore(str(tmp_path), client=client, max_age_days=7)
+    for day in ('2024-02-20', '2024-02-27', '2024-02-28'):
+        (tmp_path / 'A' / day).mkdir(parents=True)
+    (tmp_path / 'B' / '2024-02-20').mkdir(parents=True)
+    stub.add_bars('A', [10.0])
+
+    store.update('A', DATE)
+
+    assert sorted(os.listdir(tmp_path / 'A')) == ['2024-02-27', '2024-02-28', DATE]
+    # only the updated ticker is trimmed.
+    assert os.listdir(tmp_path / 'B') == ['2024-02-20']
+
+
+def test_update_keeps_every_day_without_max_age(tmp_path, stub, client):
+    store = minuteBarStore(str(tmp_path), client=client, max_age_days=None)
+    (tmp_path / 'A' / '2020-01-02').mkdir(parents=True)
+    stub.add_bars('A', [10.0])
+
+    store.update('A', DATE)
+
+    assert sorted(os.listdir(tmp_path / 'A')) == ['2020-01-02', DATE]
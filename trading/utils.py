@@ -1,19 +1,308 @@
 from TinyTitans.src.backtesting.polygon_api.polygon_api_credentials import api_key
-import requests
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional, TYPE_CHECKING
+import numpy as np
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
 
+if TYPE_CHECKING:
+    from alpaca_trade_api.rest import REST
 
-def get_last_close(ticker: str) -> float:
-    """ Get the last minute close
+
+POLYGON_BASE_URL = 'https://api.polygon.io'
+
+
+class httpClient:
+    """Keep-alive http session with a bounded connection pool, retries with
+    exponential backoff, and a worker pool for fanning out many requests.
+    """
+
+    def __init__(self, base_url: str = POLYGON_BASE_URL,
+                 max_workers: int = 8,
+                 retries: int = 3,
+                 backoff_factor: float = 0.5,
+                 timeout: float = 10):
+        """Create the session and worker pool.
+
+        Args:
+            base_url (str, optional): url requests are made relative to. Defaults to polygon.
+            max_workers (int, optional): max concurrent requests (and pooled connections).
+            Defaults to 8.
+            retries (int, optional): retries on connection errors, 429 and 5xx. Defaults to 3.
+            backoff_factor (float, optional): backoff between retries. Defaults to 0.5.
+            timeout (float, optional): request timeout in seconds. Defaults to 10.
+        """
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        import requests
+
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        retry = Retry(total=retries, backoff_factor=backoff_factor,
+                      status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=frozenset(['GET']))
+        adapter = HTTPAdapter(pool_connections=max_workers,
+                              pool_maxsize=max_workers,
+                              max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def get_json(self, path: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        response = self.session.get(
+            f'{self.base_url}{path}', params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def map(self, fn, items: Iterable) -> list:
+        """Apply fn to every item over the worker pool, keeping the item order."""
+        return list(self._executor.map(fn, items))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+_client: Optional[httpClient] = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> httpClient:
+    """Get the http client shared by the price lookups, created on first use."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpClient()
+        return _client
+
+
+# minute bar columns: start time (ms since epoch), open, high, low, close, volume.
+BAR_COLUMNS = {'t': np.int64, 'o': np.float64, 'h': np.float64,
+               'l': np.float64, 'c': np.float64, 'v': np.float64}
+
+
+class minuteBarStore:
+    """Local store of polygon minute bars, one directory per ticker and day
+    holding one binary file per column, read through memory maps.
+
+    A day is filled incrementally: an update only requests the bars after the
+    last stored one, and lookups are served from the local files, updating
+    first only if the day was last updated more than <refresh_interval> ago.
+    Days older than <max_age_days> are deleted when their ticker is updated.
+    """
+
+    def __init__(self, root: str, client: Optional[httpClient] = None,
+                 refresh_interval: float = 60.0, max_age_days: Optional[int] = 7):
+        """Create the store.
+
+        Args:
+            root (str): directory the bars are stored in.
+            client (httpClient, optional): client to request bars with. Defaults to
+            the shared client.
+            refresh_interval (float, optional): min seconds between updates of a day
+            from lookups. Defaults to 60, a minute bar.
+            max_age_days (int, optional): days kept before the day being updated.
+            Defaults to 7. None keeps every day.
+        """
+        self.root = root
+        self.client = client
+        self.refresh_interval = refresh_interval
+        self.max_age_days = max_age_days
+        self._updated: Dict[tuple, float] = {}
+        self._maps: Dict[tuple, Dict[str, np.ndarray]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, ticker: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(ticker, threading.Lock())
+
+    def _dir(self, ticker: str, date: str) -> str:
+        return os.path.join(self.root, ticker, date)
+
+    def _open(self, ticker: str, date: str) -> Dict[str, np.ndarray]:
+        directory = self._dir(ticker, date)
+        path = os.path.join(directory, 't')
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return {name: np.empty(0, dtype) for name, dtype in BAR_COLUMNS.items()}
+        # 't' is written last, so its length is the number of complete bars.
+        n = os.path.getsize(path) // 8
+        return {name: np.memmap(os.path.join(directory, name), dtype=dtype, mode='r', shape=(n,))
+                for name, dtype in BAR_COLUMNS.items()}
+
+    def bars(self, ticker: str, date: Optional[str] = None) -> Dict[str, np.ndarray]:
+        """Get the stored bars of a ticker and day, without updating them.
+
+        Args:
+            ticker (str): ticker
+            date (str, optional): 'YYYY-MM-DD'. Defaults to today.
+
+        Returns:
+            Dict[str, np.ndarray]: column name (see BAR_COLUMNS) to its read-only
+            memory mapped values, in time order.
+        """
+        key = (ticker, date or str(datetime.today().date()))
+        columns = self._maps.get(key)
+        if columns is None:
+            columns = self._maps[key] = self._open(*key)
+        return columns
+
+    def update(self, ticker: str, date: Optional[str] = None,
+               client: Optional[httpClient] = None) -> int:
+        """Request the bars after the last stored bar of a ticker and day, and append them.
+
+        Args:
+            ticker (str): ticker
+            date (str, optional): 'YYYY-MM-DD'. Defaults to today.
+            client (httpClient, optional): client to request with. Defaults to the store's.
+
+        Returns:
+            int: number of bars appended.
+        """
+        date = date or str(datetime.today().date())
+        key = (ticker, date)
+        with self._lock(ticker):
+            stored = self.bars(ticker, date)
+            start = int(stored['t'][-1]) + 1 if len(stored['t']) else date
+            client = client or self.client or get_http_client()
+            response = client.get_json(
+                f'/v2/aggs/ticker/{ticker}/range/1/minute/{start}/{date}',
+                params={'adjusted': 'false', 'sort': 'asc', 'limit': 50000, 'apiKey': api_key})
+            results = response.get('results') or []
+            self._updated[key] = time.monotonic()
+            self._trim(ticker, date)
+            if not results:
+                return 0
+
+            directory = self._dir(ticker, date)
+            os.makedirs(directory, exist_ok=True)
+            n = len(stored['t'])
+            # 't' last, so a partly written append is truncated away by the next one.
+            for name in (*[c for c in BAR_COLUMNS if c != 't'], 't'):
+                with open(os.path.join(directory, name), 'ab') as f:
+                    f.truncate(n * 8)
+                    f.write(np.array([bar.get(name, np.nan) for bar in results],
+                                     dtype=BAR_COLUMNS[name]).tobytes())
+            self._maps[key] = self._open(ticker, date)
+            return len(results)
+
+    def _trim(self, ticker: str, date: str):
+        """Delete the days of a ticker more than max_age_days before <date>."""
+        if self.max_age_days is None:
+            return
+        cutoff = str(datetime.fromisoformat(date).date() - timedelta(days=self.max_age_days))
+        directory = os.path.join(self.root, ticker)
+        if not os.path.isdir(directory):
+            return
+        # days are 'YYYY-MM-DD', so they compare as dates.
+        for day in os.listdir(directory):
+            if day < cutoff:
+                self._maps.pop((ticker, day), None)
+                self._updated.pop((ticker, day), None)
+                shutil.rmtree(os.path.join(directory, day), ignore_errors=True)
+
+    def _refresh(self, ticker: str, date: Optional[str], client: Optional[httpClient]):
+        key = (ticker, date or str(datetime.today().date()))
+        if time.monotonic() - self._updated.get(key, -np.inf) > self.refresh_interval:
+            self.update(*key, client=client)
+
+    def recent_bars(self, ticker: str, n: int, date: Optional[str] = None,
+                    client: Optional[httpClient] = None) -> Dict[str, np.ndarray]:
+        """Get the last <n> bars of a ticker and day, updating them if due.
+
+        Returns:
+            Dict[str, np.ndarray]: column name to its last n values.
+        """
+        self._refresh(ticker, date, client)
+        return {name: values[-n:] for name, values in self.bars(ticker, date).items()}
+
+    def last_close(self, ticker: str, date: Optional[str] = None,
+                   client: Optional[httpClient] = None) -> float:
+        """Get the close of the last minute bar of a ticker and day, updating them if due.
+
+        Raises:
+            IndexError: if there is no bar.
+        """
+        self._refresh(ticker, date, client)
+        return float(self.bars(ticker, date)['c'][-1])
+
+
+_store: Optional[minuteBarStore] = None
+
+
+def get_bar_store() -> minuteBarStore:
+    """Get the minute bar store shared by the price lookups, created on first use
+    in $MINUTE_BAR_STORE, or ~/.cache/minute_bars.
+    """
+    global _store
+    with _client_lock:
+        if _store is None:
+            _store = minuteBarStore(os.environ.get(
+                'MINUTE_BAR_STORE', os.path.join(os.path.expanduser('~'), '.cache', 'minute_bars')))
+        return _store
+
+
+def get_last_close(ticker: str, client: Optional[httpClient] = None,
+                   store: Optional[minuteBarStore] = None) -> float:
+    """ Get the last minute close, from the local minute bar store (which
+    only requests the bars it does not have yet).
+
+    Args:
+        ticker (str): ticker
+        client (httpClient, optional): client to make the request with. Defaults to
+        the shared client.
+        store (minuteBarStore, optional): store to read from. Defaults to the shared store.
+
+    Returns:
+        float: close of the last minute bar
+    """
+    store = store if store is not None else get_bar_store()
+    return store.last_close(ticker, client=client)
+
+
+def get_last_closes(tickers: Iterable[str], client: Optional[httpClient] = None,
+                    store: Optional[minuteBarStore] = None) -> Dict[str, float]:
+    """ Get the last minute close of many tickers at once, with the requests
+    fanned out over the client's connection pool.
+
+    Args:
+        tickers (Iterable[str]): tickers
+        client (httpClient, optional): client to make the requests with. Defaults to
+        the shared client.
+        store (minuteBarStore, optional): store to read from. Defaults to the shared store.
+
+    Returns:
+        Dict[str, float]: ticker to close, for the tickers that have a bar today.
+    """
+    client = client or get_http_client()
+    store = store if store is not None else get_bar_store()
+
+    def _get(ticker: str) -> Optional[float]:
+        try:
+            return store.last_close(ticker, client=client)  # type: ignore
+        except (KeyError, IndexError):
+            return None
+
+    tickers = list(tickers)
+    closes = client.map(_get, tickers)
+    return {ticker: close for ticker, close in zip(tickers, closes) if close is not None}
+
+
+def alpaca_get_last_close(ticker: str, api: 'REST') -> float:
+    """ Get the last minute close from alpaca
 
     Args:
         ticker (str): ticker
+        api (REST): alpaca api
 
     Returns:
-        Dict[str, float]: A dictionary with the last bid and ask prices of the ticker.
+        float: close of the latest minute bar
     """
-    date = str(datetime.today().date())
-    endpoint = f'https://api.polygon.io/v2/aggs/ticker/{ticker}/range/1/minute/{date}/{date}?adjusted=false&sort=asc&limit=1&apiKey={api_key}'
-    response = requests.get(endpoint)
-    assert response.status_code == 200
-    return response.json()['results'][0]['c']
+    bar = api.get_latest_bar(ticker)
+    return float(bar.c)